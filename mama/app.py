@@ -2,21 +2,29 @@
 Module used by Gunicorn to start the server
 """
 
+import atexit
 import os
-import sys
-from threading import Event
 
 from flask import Flask
+from flask import request
+from flask_socketio import emit
+from flask_socketio import join_room
+from flask_socketio import leave_room
 from flask_socketio import SocketIO
 
 from mama.config import config
+from mama.config import ConfigSnapshot
+from mama.models.database import db_connection
 from mama.routes.api import api_bp
 from mama.routes.main import main_bp
 from mama.routes.settings import settings_bp
 from mama.routes.system import system_bp
-from mama.sensors.lamda_sensor import LambdaSensor
-from mama.sensors.temp_sensor import TypKTemperaturSensor
+from mama.sensors.readings import create_sensors
 from mama.tasks import background
+from mama.tasks.acquisition import AcquisitionProcess
+from mama.tasks.hub import acquisition_hub
+from mama.tasks.scope import scope_streamer
+from mama.utils.systemd import write_to_systemd
 
 app = Flask(__name__)
 app.config["SECRET_KEY"] = "secret!"
@@ -29,39 +37,19 @@ app.register_blueprint(settings_bp)
 app.register_blueprint(system_bp)
 
 # Initialize sensors
-LAMDA_SENSOR0 = LambdaSensor(channel=getattr(config, "LAMDA0_CHANNEL"), correction_factor_key="KORREKTURFAKTOR_BANK_1")
-LAMDA_SENSOR1 = LambdaSensor(channel=getattr(config, "LAMDA1_CHANNEL"), correction_factor_key="KORREKTURFAKTOR_BANK_2")
-TEMP_SENSOR0 = TypKTemperaturSensor(channel=getattr(config, "TEMPERATUR0_CHANNEL"))
-TEMP_SENSOR1 = TypKTemperaturSensor(channel=getattr(config, "TEMPERATUR1_CHANNEL"))
-
-SENSORS = {
-    "lamda0": LAMDA_SENSOR0,
-    "lamda1": LAMDA_SENSOR1,
-    "temp0": TEMP_SENSOR0,
-    "temp1": TEMP_SENSOR1,
-}
+SENSORS = create_sensors()
+
+# Sensors are sampled in a separate process if ACQUISITION_PROCESS is enabled, started on the first connection
+ACQUISITION: AcquisitionProcess | None = None
 
 # Thread management
-UPDATE_DATA_THREAD = None
-SENOR_LIFETIME_THREAD = None
-SENSOR_OVERHEAD_THREAD = None
-SENSOR_CHECK_ERROR_THREAD = None
-THREAD_STOP_EVENT = Event()
+# The hub is the only reader of the sensors, it keeps running without clients for the overheating checks
+HUB_THREAD = None
 
 CONNECTIONS_COUNTER = 0
 IS_RECORDING = False
 
 
-def write_to_systemd(message: str):
-    """print message and flush stdout to force the system to write the log immediately
-
-    Args:
-        message (str): Message to be printed
-    """
-    print(message)
-    sys.stdout.flush()
-
-
 def is_task_running(task) -> bool:
     """Check if a background task is still running.
 
@@ -92,21 +80,49 @@ def get_is_recording():
     return IS_RECORDING
 
 
+LIVE_EMITTER = background.subscribe_consumers(acquisition_hub, socketio, get_is_recording)
+# Raw lambda samples for the clients in scope mode
+scope_streamer.socketio = socketio
+
+
+def restart_acquisition(settings: ConfigSnapshot):
+    """The acquisition process reads the settings only on start, restart it if a sampling setting changed.
+    Sampling in the web process picks up changes at the next tick by itself.
+
+    Args:
+        settings: New settings
+    """
+    if ACQUISITION is not None and ACQUISITION.is_alive() and ACQUISITION.settings_changed(settings):
+        write_to_systemd("Sampling settings changed, restarting acquisition process")
+        ACQUISITION.stop()
+        ACQUISITION.start()
+
+
+config.subscribe(restart_acquisition)
+
+# The retention job runs from start-up, also when no client ever connects
+DELETE_OLD_VALUES_THREAD = socketio.start_background_task(background.delete_old_values, socketio)
+# Writes buffered values that are due even when no new values arrive
+FLUSH_THREAD = socketio.start_background_task(background.flush_buffered_values, socketio)
+
+
 @socketio.on("connected")
 def connected(json: dict):
     """When a socket connection is established this handler starts the data update thread.
     It also sets the system time to the browser time so recorded data uses correct timestamps.
 
+    The client chooses the live values it gets with the optional keys of the subscribe event. A reconnecting
+    client gets the ticks it missed from the live buffer in a backfill event, without a query against SQLite.
+
     Args:
-        json (dict): Key ["data"] containing the time as an ISO 8601 string
+        json (dict): Key ["data"] containing the time as an ISO 8601 string, optional keys ["format"] and
+            ["subscriptions"] (see subscribe), optional keys ["sequence"] and ["buffer"] with the last sequence
+            number and the buffer id of the newValues events received before the connection was lost
     """
 
-    global UPDATE_DATA_THREAD
-    global SENOR_LIFETIME_THREAD
-    global SENSOR_OVERHEAD_THREAD
-    global SENSOR_CHECK_ERROR_THREAD
-    global THREAD_STOP_EVENT
+    global HUB_THREAD
     global CONNECTIONS_COUNTER
+    global ACQUISITION
 
     date_string = json["data"]
 
@@ -119,49 +135,95 @@ def connected(json: dict):
     write_to_systemd("Client connected")
     CONNECTIONS_COUNTER += 1
 
-    if not is_task_running(UPDATE_DATA_THREAD):
+    subscribe(json)
+    backfill = LIVE_EMITTER.backfill(request.sid, json.get("sequence", 0), json.get("buffer"))
+    if backfill is not None:
+        emit("backfill", backfill)
+
+    # The acquisition process keeps running without clients, like the hub relaying its ticks
+    if getattr(config, "ACQUISITION_PROCESS") and ACQUISITION is None:
+        ACQUISITION = AcquisitionProcess(cpu=getattr(config, "ACQUISITION_CPU"))
+        atexit.register(ACQUISITION.stop)
+
+    if ACQUISITION is not None and not ACQUISITION.is_alive():
+        write_to_systemd("Starting acquisition process")
+        ACQUISITION.stop()
+        ACQUISITION.start()
+
+    if not is_task_running(HUB_THREAD):
         write_to_systemd("Starting Thread")
-        THREAD_STOP_EVENT.clear()
-        UPDATE_DATA_THREAD = socketio.start_background_task(
-            background.update_data,
-            socketio,
-            THREAD_STOP_EVENT,
-            get_is_recording,
-            SENSORS,
-            getattr(config, "UPDATE_INTERVAL"),
-            getattr(config, "MESSURE_INTERVAL"),
-        )
+        if ACQUISITION is not None:
+            ticks = background.relay_acquisition(socketio, ACQUISITION)
+        else:
+            ticks = background.sample_sensors(SENSORS, scope_streamer)
+        HUB_THREAD = socketio.start_background_task(background.run_hub, socketio, acquisition_hub, ticks)
+
+
+@socketio.on("subscribe")
+def subscribe(json: dict):
+    """Replaces the live value subscriptions of the client. Clients with the same subscription share a room,
+    so every payload is encoded once per subscription. The negotiated format and the streams (id, field order
+    and rate) are sent back in a liveFormat event, every newValues event carries the id of its stream.
 
-    if not is_task_running(SENOR_LIFETIME_THREAD):
-        SENOR_LIFETIME_THREAD = socketio.start_background_task(background.update_lifetime, socketio, SENSORS)
+    Args:
+        json (dict): Optional key ["format"] (see live.LIVE_FORMATS, default json) and ["subscriptions"], a list of
+            {"channels": [...], "rate": Hz} (fields or groups like "lambda"/"temps", rate 0 = every tick)
+    """
+    left, live_format = LIVE_EMITTER.subscribe(request.sid, json.get("format", "json"), json.get("subscriptions"))
+    for room in left:
+        leave_room(room)
+    for stream in live_format["streams"]:
+        join_room(stream["id"])
+    emit("liveFormat", live_format)
+
+
+@socketio.on("scope")
+def scope(json: dict):
+    """Starts or stops streaming the raw lambda samples of every update window to the client (scopeFrame events).
+    Every frame has to be acknowledged, a client falling behind gets fewer frames (see tasks.scope).
+    The client gets the state in a scopeState event.
+
+    Args:
+        json (dict): Key ["enabled"] with true or false
+    """
+    if not json.get("enabled"):
+        scope_streamer.remove_client(request.sid)
+        emit("scopeState", {"enabled": False})
+        return
 
-    if not is_task_running(SENSOR_OVERHEAD_THREAD):
-        SENSOR_OVERHEAD_THREAD = socketio.start_background_task(background.check_overheating, socketio, SENSORS)
+    # The raw samples stay in the acquisition process, only the ticks are shared with the web process
+    if getattr(config, "ACQUISITION_PROCESS"):
+        emit("scopeState", {"enabled": False, "reason": "The scope is not available with ACQUISITION_PROCESS"})
+        return
 
-    if not is_task_running(SENSOR_CHECK_ERROR_THREAD):
-        SENSOR_CHECK_ERROR_THREAD = socketio.start_background_task(background.check_tmp_sensor_error_state, socketio)
+    scope_format = scope_streamer.add_client(request.sid)
+    if scope_format is None:
+        emit("scopeState", {"enabled": False, "reason": "Too many clients in scope mode"})
+        return
+    emit("scopeState", {"enabled": True, **scope_format})
 
 
 @socketio.on("disconnect")
 def disconnect():
-    """When no one is connected to the socket anymore,
-    all threads (update data and recording) are stopped
+    """When no one is connected to the socket anymore, the recording is stopped.
+    The hub keeps sampling for the overheating and lifetime checks.
     """
     global CONNECTIONS_COUNTER
 
     write_to_systemd("Client disconnected")
     CONNECTIONS_COUNTER -= 1
+    LIVE_EMITTER.remove_client(request.sid)
+    scope_streamer.remove_client(request.sid)
 
     if CONNECTIONS_COUNTER == 0:
-        # Stop Thread
         # Stop Recording
-        global THREAD_STOP_EVENT
         global IS_RECORDING
 
-        THREAD_STOP_EVENT.set()
         IS_RECORDING = False
+        db_connection.stop_recording()
+        db_connection.flush()
 
-        write_to_systemd("Stopped thread")
+        write_to_systemd("Stopped recording")
 
 
 @socketio.on("recording")
@@ -174,11 +236,13 @@ def recording(json: dict):
     global IS_RECORDING
 
     if json["recording"]:
+        recording_id = db_connection.start_recording()
         IS_RECORDING = True
-        write_to_systemd("start recording")
+        write_to_systemd(f"start recording {recording_id}")
     else:
         # stop
         IS_RECORDING = False
+        db_connection.stop_recording()
         write_to_systemd("stop recording")
 
 
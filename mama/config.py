@@ -1,14 +1,23 @@
 """
 Configuration settings for MAMA application.
 Settings are loaded from JSON file and can be updated at runtime.
+
+Hot paths do not read the live ``config`` object but take a ``ConfigSnapshot`` once per loop iteration:
+an immutable copy of all settings with a version number that changes with every update. Comparing the
+version is enough to detect changes, subscribers are notified with the new snapshot.
 """
 
+import copy
 import json
 import os
 import threading
+import traceback
 from dataclasses import dataclass, field, fields
 from pathlib import Path
-from typing import Any
+from types import MappingProxyType
+from typing import Any, Callable, Mapping
+
+from mama.utils.systemd import write_to_systemd
 
 # Get the project root directory
 _project_root = Path(__file__).parent.parent
@@ -19,6 +28,10 @@ setting_path = (
 )
 
 
+# Settings the sampling loop divides by or waits for, they have to be greater than 0
+POSITIVE_SETTINGS = ("MESSURE_INTERVAL", "UPDATE_INTERVAL")
+
+
 def _read_settings(file_path: Path) -> dict:
     with file_path.open(mode="r", encoding="utf8") as file:
         return json.load(file)
@@ -29,6 +42,20 @@ def _save_settings(file_path: Path, values: dict) -> None:
         json.dump(values, file, indent=4, sort_keys=True)
 
 
+@dataclass(frozen=True)
+class ConfigSnapshot:
+    """Immutable view of all settings at one version, settings are read as attributes"""
+
+    version: int
+    values: Mapping[str, Any]
+
+    def __getattr__(self, name: str) -> Any:
+        try:
+            return self.values[name]
+        except KeyError:
+            raise AttributeError(name) from None
+
+
 @dataclass
 class Config:
     """Thread-safe configuration container for MAMA settings."""
@@ -43,6 +70,8 @@ class Config:
     # Temperature sensor settings
     TEMPERATUR0_CHANNEL: int = 2
     TEMPERATUR1_CHANNEL: int = 3
+    # Voltage to temperature curve of the EGT channels, see mama.sensors.calibration
+    TEMP_CURVE: dict = field(default_factory=dict)
 
     # Display settings
     ANZEIGEN_BANK_1: bool = True
@@ -51,16 +80,39 @@ class Config:
     ANZEIGEN_TEMP_2: bool = True
     NACHKOMMASTELLEN: int = 2
     WARNUNG_BLINKEN: bool = True
+    # Seconds of ticks sent together in one binary newValues frame, 0 = every tick
+    LIVE_BATCH_INTERVAL: float = 0.0
 
     # Timing settings
     MESSURE_INTERVAL: float = 0.01
     UPDATE_INTERVAL: float = 1.5
+    # Samples per second by channel (lamda1, lamda2, temp1, temp2), overriding the intervals above
+    CHANNEL_RATES: dict = field(default_factory=dict)
+
+    # Sample filters by sensor, see mama.utils.filters
+    SENSOR_FILTER: dict = field(default_factory=dict)
+
+    # Acquisition process settings (sample the sensors in a separate process, -1 = no CPU pinning)
+    ACQUISITION_PROCESS: bool = False
+    ACQUISITION_CPU: int = -1
+
+    # Live buffer settings (number of update ticks kept in memory)
+    LIVE_BUFFER_SIZE: int = 2400
+    # Seconds of buffered ticks replayed to a (re)connecting client, 0 = none
+    LIVE_BACKFILL_SECONDS: float = 60.0
 
     # Database settings
     DB_DELETE_AELTER_ALS: int = 180
+    DB_ARCHIVE_AELTER_ALS: int = 14
+    DB_FLUSH_ROWS: int = 50
+    DB_FLUSH_INTERVAL: float = 10.0
+    DB_SYNCHRONOUS: str = "NORMAL"
+    DB_READ_POOL_SIZE: int = 2
 
-    # Internal lock (excluded from serialization)
+    # Internal state (excluded from serialization)
     _lock: threading.Lock = field(default_factory=threading.Lock, repr=False, compare=False)
+    _snapshot: ConfigSnapshot | None = field(default=None, repr=False, compare=False)
+    _subscribers: list = field(default_factory=list, repr=False, compare=False)
 
     def __post_init__(self) -> None:
         """Load settings from file after initialization."""
@@ -69,9 +121,43 @@ class Config:
     def _reload_from_file(self) -> None:
         """Reload all settings from the JSON file."""
         settings = _read_settings(setting_path)
-        for key, value in settings.items():
-            if hasattr(self, key) and not key.startswith("_"):
-                setattr(self, key, value)
+        with self._lock:
+            for key, value in settings.items():
+                if hasattr(self, key) and not key.startswith("_"):
+                    setattr(self, key, value)
+            snapshot = self._publish()
+        self._notify(snapshot)
+
+    def _publish(self) -> ConfigSnapshot:
+        """Creates the snapshot of the current settings with the next version, the lock must be held"""
+        values = {f.name: copy.deepcopy(getattr(self, f.name)) for f in fields(self) if not f.name.startswith("_")}
+        version = self._snapshot.version + 1 if self._snapshot is not None else 1
+        self._snapshot = ConfigSnapshot(version=version, values=MappingProxyType(values))
+        return self._snapshot
+
+    def _notify(self, snapshot: ConfigSnapshot) -> None:
+        for callback in list(self._subscribers):
+            try:
+                callback(snapshot)
+            except Exception:
+                write_to_systemd(f"Config subscriber failed:\n{traceback.format_exc()}")
+
+    def snapshot(self) -> ConfigSnapshot:
+        """Returns the current settings as an immutable snapshot
+
+        Returns:
+            Snapshot of the latest version.
+        """
+        return self._snapshot
+
+    def subscribe(self, callback: Callable[[ConfigSnapshot], None]) -> None:
+        """Registers a function that is called with the new snapshot after every change.
+
+        Args:
+            callback: Called in the thread that changed the settings, must not block
+        """
+        with self._lock:
+            self._subscribers.append(callback)
 
     def update_setting(self, name: str, value: str) -> None:
         """Update a single setting and persist to file.
@@ -80,14 +166,35 @@ class Config:
             name: Setting name (must be a valid config attribute)
             value: JSON-encoded value string
         """
-        if not hasattr(self, name) or name.startswith("_"):
-            raise ValueError(f"Unknown setting: {name}")
+        self.update_settings({name: value})
+
+    def update_settings(self, values: Mapping[str, str]) -> None:
+        """Update several settings at once, persist them and publish one new snapshot.
+
+        Args:
+            values: JSON-encoded value string by setting name (each must be a valid config attribute)
+
+        Raises:
+            ValueError: For unknown settings or a POSITIVE_SETTINGS value that is not greater than 0,
+                nothing is persisted then
+        """
+        for name in values:
+            if not hasattr(self, name) or name.startswith("_"):
+                raise ValueError(f"Unknown setting: {name}")
+        decoded = {name: json.loads(value) for name, value in values.items()}
+        for name in POSITIVE_SETTINGS:
+            value = decoded.get(name, 1)
+            if isinstance(value, bool) or not isinstance(value, (int, float)) or value <= 0:
+                raise ValueError(f"{name} must be a number greater than 0")
 
         with self._lock:
             settings = _read_settings(setting_path)
-            settings[name] = json.loads(value)
+            settings.update(decoded)
             _save_settings(setting_path, settings)
-            setattr(self, name, settings[name])
+            for name, value in decoded.items():
+                setattr(self, name, value)
+            snapshot = self._publish()
+        self._notify(snapshot)
 
     def get_settings(self) -> dict[str, Any]:
         """Get all settings as a dictionary.
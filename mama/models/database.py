@@ -1,30 +1,194 @@
+import atexit
+import json
 import sqlite3
+import threading
 from datetime import datetime
 from datetime import timedelta
 from datetime import timezone
+from operator import itemgetter
 from pathlib import Path
 from typing import Any
+from typing import Iterator
+
+from mama.config import config
+from mama.models.pool import ReadConnectionPool
+from mama.models.ring_buffer import CHANNELS
+from mama.models.writer import BufferedWriter
+from mama.utils.archive_format import decode_block
+from mama.utils.archive_format import encode_block
+from mama.utils.systemd import write_to_systemd
+
+# Julian day of the unix epoch, used to convert legacy ISO timestamps inside SQLite
+_JULIANDAY_UNIX_EPOCH = 2440587.5
+_MS_PER_DAY = 86400000
+
+SYNCHRONOUS_MODES = ("OFF", "NORMAL", "FULL", "EXTRA")
+
+# Tables holding raw per-sensor values (written before the ticks table existed)
+VALUE_TABLES = ("temps", "lambda")
+
+# One row per update tick with every channel
+TICKS_TABLE = "ticks"
+TICK_COLUMNS = ("timestamp", "recording_id", *CHANNELS)
+
+# Columns of the ticks table that continue the per-sensor tables, indexed by sensor id
+TICK_SENSOR_COLUMNS = {
+    "temps": ("temp1", "temp2"),
+    "lambda": ("lamda1", "lamda2"),
+}
+
+# Compressed blocks of values older than DB_ARCHIVE_AELTER_ALS days, see archive_format
+ARCHIVE_TABLE = "archive_blocks"
+ARCHIVE_BLOCK_ROWS = 1024
+
+# Bucket sizes of the rollup tables, e.g. lambda_rollup_10s
+ROLLUP_RESOLUTIONS_MS = (1000, 10000, 60000)
+
+
+def rollup_table(table: str, resolution_ms: int) -> str:
+    """Returns the name of the rollup table of a raw table for a bucket size
+
+    :param table: Raw table (temps or lambda)
+    :param resolution_ms: Bucket size in milliseconds
+    :return: Table name, e.g. ``lambda_rollup_10s``
+    """
+    return f"{table}_rollup_{resolution_ms // 1000}s"
+
+
+# Bucket size of every rollup table
+ROLLUP_TABLES = {
+    rollup_table(table, resolution_ms): resolution_ms
+    for table in VALUE_TABLES
+    for resolution_ms in ROLLUP_RESOLUTIONS_MS
+}
+
+# Tables cleaned up by the retention job
+RETENTION_TABLES = (*VALUE_TABLES, TICKS_TABLE, ARCHIVE_TABLE, *ROLLUP_TABLES)
+
+
+def rollup_retention_days(resolution_ms: int) -> int:
+    """Returns how many days the buckets of a rollup resolution are kept
+
+    The 1 s buckets are about as many rows as the raw values, they are only kept until the raw values are archived.
+    The 10 s buckets follow the raw values, the 60 s buckets outlive them twice as long for long-term views.
+
+    :param resolution_ms: Bucket size in milliseconds
+    :return: Age in days
+    """
+    if resolution_ms == ROLLUP_RESOLUTIONS_MS[0]:
+        return getattr(config, "DB_ARCHIVE_AELTER_ALS")
+    if resolution_ms == ROLLUP_RESOLUTIONS_MS[-1]:
+        return 2 * getattr(config, "DB_DELETE_AELTER_ALS")
+    return getattr(config, "DB_DELETE_AELTER_ALS")
+
+
+def retention_days(table: str) -> int:
+    """Returns the age in days after which the retention job deletes the rows of a table
+
+    :param table: Table (see RETENTION_TABLES)
+    :return: Age in days
+    """
+    if table in ROLLUP_TABLES:
+        return rollup_retention_days(ROLLUP_TABLES[table])
+    return getattr(config, "DB_DELETE_AELTER_ALS")
+
+
+def select_rollup_resolution(start_ms: int, end_ms: int, max_points: int) -> int | None:
+    """Returns the coarsest rollup resolution that still yields ``max_points`` buckets in the range
+
+    Resolutions whose buckets at ``start_ms`` are already deleted by the retention job are skipped.
+
+    :param start_ms: Start of the range in epoch milliseconds
+    :param end_ms: End of the range in epoch milliseconds
+    :param max_points: Requested number of points
+    :return: Bucket size in milliseconds or None if the raw rows are needed
+    """
+    requested_ms = (end_ms - start_ms) / max_points
+    now_ms = now_epoch_ms()
+    candidates = [
+        resolution
+        for resolution in ROLLUP_RESOLUTIONS_MS
+        if resolution <= requested_ms and start_ms >= now_ms - rollup_retention_days(resolution) * _MS_PER_DAY
+    ]
+    return max(candidates) if candidates else None
+
+
+def to_epoch_ms(timestamp: datetime) -> int:
+    """Converts a datetime into integer milliseconds since the unix epoch.
+
+    :param timestamp: Timezone aware datetime (naive values are treated as UTC)
+    :return: Milliseconds since 1970-01-01T00:00:00+00:00
+    """
+    if timestamp.tzinfo is None:
+        timestamp = timestamp.replace(tzinfo=timezone.utc)
+    return int(timestamp.timestamp() * 1000)
+
+
+def iso_to_epoch_ms(iso: str) -> int:
+    """Converts an ISO 8601 string into integer milliseconds since the unix epoch.
+
+    :param iso: Timestamp in ISO format
+    :return: Milliseconds since the unix epoch
+    """
+    return to_epoch_ms(datetime.fromisoformat(iso))
+
+
+def now_epoch_ms() -> int:
+    """Returns the current time as integer milliseconds since the unix epoch."""
+    return to_epoch_ms(datetime.now(tz=timezone.utc))
 
 
 class Database:
-    def __init__(self, db_file: Path):
+    def __init__(
+        self,
+        db_file: Path,
+        synchronous: str = "NORMAL",
+        flush_rows: int = 50,
+        flush_interval: float = 10.0,
+        read_pool_size: int = 2,
+    ):
+        """SQLite storage for sensor values and sensor tracking.
+        All writes go through one writer connection, reads borrow a read-only connection from a pool.
+        Streamed range queries hold their connection for the whole response, they get a pool of their own.
+
+        :param db_file: Path to the SQLite file
+        :param synchronous: SQLite ``synchronous`` pragma (OFF, NORMAL, FULL, EXTRA)
+        :param flush_rows: Number of queued sensor rows that trigger a flush
+        :param flush_interval: Maximum age in seconds of a queued sensor row before it is flushed
+        :param read_pool_size: Number of read-only connections, in each of the two pools
+        """
+        synchronous = synchronous.upper()
+        if synchronous not in SYNCHRONOUS_MODES:
+            raise ValueError(f"Invalid synchronous mode: {synchronous}")
+
+        self.db_file = Path(db_file)
         self.conn = sqlite3.connect(db_file, check_same_thread=False)
+        self.lock = threading.RLock()
+        self.__init_auto_vacuum()
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute(f"PRAGMA synchronous={synchronous}")
+        self.writer = BufferedWriter(self.conn, self.lock, max_rows=flush_rows, max_delay=flush_interval)
+        self.recording_id: int | None = None
+
         self.__init_temp_values()
         self.__init_temp_sensor_tracking()
         self.__init_lambda_values()
+        self.__init_ticks()
+        self.__init_archive()
+        self.__init_recordings()
 
-        self.__clear_temp_values()
-        self.__clear_lambda_values()
+        self.__migrate_iso_timestamps("temps")
+        self.__migrate_iso_timestamps("lambda")
+        self.__migrate_recording_id("temps")
+        self.__migrate_recording_id("lambda")
+        self.__init_indices()
+        self.__close_open_recordings()
+        self.__init_rollups()
+        self.writer.add_flush_listener(self.__update_rollups)
 
-    def insert_temp_value(self, sensor_id: int, value: float):
-        """Fügt einen Temperaturwert in die Datenbank mit dem Zeitstempel ein.
-
-        :param sensor_id: Sensor ID
-        :param value: Temperaturwert
-        """
-        timestamp_int = datetime.now(tz=timezone.utc)
-        timestamp = timestamp_int.isoformat()
-        self.execute("INSERT INTO temps VALUES (?, ?, ?)", (sensor_id, timestamp, value))
+        # Opened last, the read-only connections need the final schema
+        self.readers = ReadConnectionPool(self.db_file, size=read_pool_size)
+        self.stream_readers = ReadConnectionPool(self.db_file, size=read_pool_size)
 
     def insert_temp_sensor_tracking(
         self, sensor_id: int, time_run_in_min: int, error_state: int = 0, error_message: str = ""
@@ -41,15 +205,137 @@ class Database:
             (sensor_id, time_run_in_min, error_state, error_message),
         )
 
-    def insert_lambda_value(self, sensor_id: int, value: float):
-        """Fügt einen Lambda-Wert in die Datenbank mit dem Zeitstempel ein.
+    def insert_tick(self, sample: dict, timestamp_ms: int | None = None):
+        """Adds every channel of an update tick as one row to the write buffer of the database.
 
-        :param sensor_id: Sensor ID
-        :param value: Lambda-Wert
+        :param sample: Values of all channels (see ring_buffer.CHANNELS)
+        :param timestamp_ms: Time of the measurement in ms, default is now
+        """
+        timestamp_ms = timestamp_ms if timestamp_ms is not None else now_epoch_ms()
+        self.writer.add(TICKS_TABLE, (timestamp_ms, self.recording_id, *(sample[channel] for channel in CHANNELS)))
+
+    def get_ticks_between(self, start: str, end: str, columns: tuple[str, ...] = CHANNELS) -> list:
+        """Returns selected channels of all ticks between two points in time.
+
+        :param start: Start time in ISO format
+        :param end: End time in ISO format
+        :param columns: Channels to query
+        :return: Rows as (timestamp in ms, *columns)
+        """
+        unknown = set(columns) - set(CHANNELS)
+        if unknown:
+            raise ValueError(f"Unknown columns {unknown}")
+
+        start_ms, end_ms = iso_to_epoch_ms(start), iso_to_epoch_ms(end)
+        indices = [CHANNELS.index(column) for column in columns]
+        archived = []
+        with self.readers.connection() as conn:
+            for data in Database.__archive_blocks(conn, TICKS_TABLE, None, start_ms, end_ms):
+                timestamps, values = decode_block(data, indices)
+                archived.extend(row for row in zip(timestamps, *values) if start_ms <= row[0] <= end_ms)
+
+            cur = conn.cursor()
+            cur.execute(
+                f"SELECT timestamp, {', '.join(columns)} FROM {TICKS_TABLE} "
+                "WHERE timestamp BETWEEN ? AND ? ORDER BY timestamp",
+                (start_ms, end_ms),
+            )
+            result = cur.fetchall()
+            cur.close()
+
+        if archived:
+            result = sorted(archived + result, key=itemgetter(0))
+        return result
+
+    def start_recording(self) -> int:
+        """Starts a new recording. All following sensor values are tagged with its ID.
+
+        :return: ID of the recording
         """
-        timestamp_int = datetime.now(tz=timezone.utc)
-        timestamp = timestamp_int.isoformat()
-        self.execute("INSERT INTO lambda VALUES (?, ?, ?)", (sensor_id, timestamp, value))
+        if self.recording_id is not None:
+            return self.recording_id
+
+        with self.lock:
+            cur = self.conn.execute("INSERT INTO recordings (start_time) VALUES (?)", (now_epoch_ms(),))
+            self.conn.commit()
+            self.recording_id = cur.lastrowid
+        return self.recording_id
+
+    def stop_recording(self):
+        """Ends the running recording, flushes the buffer and stores the row counts and statistics."""
+        recording_id = self.recording_id
+        if recording_id is None:
+            return
+
+        self.recording_id = None
+        self.flush()
+        self.__finish_recording(recording_id, now_epoch_ms())
+
+    def get_recordings(self) -> list[dict]:
+        """Returns all recordings, newest first.
+
+        :return: Recordings with id, start_time, end_time (ms), temp_rows, lambda_rows and summary
+        """
+        with self.readers.connection() as conn:
+            cur = conn.cursor()
+            cur.execute(
+                "SELECT id, start_time, end_time, temp_rows, lambda_rows, summary FROM recordings ORDER BY id DESC"
+            )
+            result = cur.fetchall()
+            cur.close()
+        return [Database.__recording_to_dict(row) for row in result]
+
+    def get_recording(self, recording_id: int) -> dict | None:
+        """Returns one recording.
+
+        :param recording_id: ID of the recording
+        :return: Recording or None if it does not exist
+        """
+        with self.readers.connection() as conn:
+            cur = conn.cursor()
+            cur.execute(
+                "SELECT id, start_time, end_time, temp_rows, lambda_rows, summary FROM recordings WHERE id = ?",
+                (recording_id,),
+            )
+            result = cur.fetchone()
+            cur.close()
+        return Database.__recording_to_dict(result) if result else None
+
+    def get_recording_values(self, table: str, recording_id: int) -> list:
+        """Returns all values of a recording via the recording_id indexes.
+
+        :param table: Table (temps or lambda)
+        :param recording_id: ID of the recording
+        :return: Values as (sensorid, timestamp in ms, value)
+        """
+        if table not in VALUE_TABLES:
+            raise ValueError(f"Unknown table: {table}")
+
+        query, branches = Database.__sensor_rows_query(table, "recording_id = ?")
+        with self.readers.connection() as conn:
+            cur = conn.cursor()
+            cur.execute(
+                f"SELECT sensorid, timestamp, value FROM ({query}) ORDER BY sensorid, timestamp",
+                (recording_id,) * branches,
+            )
+            result = cur.fetchall()
+            cur.execute("SELECT start_time, end_time FROM recordings WHERE id = ?", (recording_id,))
+            period = cur.fetchone()
+            cur.close()
+
+            # Archived values lost their recording_id, values are only stored while recording,
+            # so everything archived within the period of the recording belongs to it
+            if period is not None:
+                start_ms, end_ms = period[0], period[1] if period[1] is not None else now_epoch_ms()
+                archived = [
+                    row
+                    for sensor_id in range(len(TICK_SENSOR_COLUMNS[table]))
+                    for rows in Database.__iter_archived_rows(conn, table, sensor_id, start_ms, end_ms)
+                    for row in rows
+                ]
+                if archived:
+                    result = sorted(archived + result, key=itemgetter(0, 1))
+        return result
 
     def update_temp_sensor_tracking(self, sensor_id: int, time_run_in_min: int):
         """Aktualisiert die Laufzeit des Sensors.
@@ -76,10 +362,11 @@ class Database:
         :param sensor_id: Sensor ID
         :return: Fehlerzustand
         """
-        cur = self.conn.cursor()
-        cur.execute("SELECT error_state, error_msg FROM temp_sensor_tracking WHERE id = ?", (sensor_id,))
-        result = cur.fetchone()
-        cur.close()
+        with self.readers.connection() as conn:
+            cur = conn.cursor()
+            cur.execute("SELECT error_state, error_msg FROM temp_sensor_tracking WHERE id = ?", (sensor_id,))
+            result = cur.fetchone()
+            cur.close()
         return result
 
     def reset_error_state(self, sensor_id: int):
@@ -94,37 +381,80 @@ class Database:
 
         :return: Temperaturwerte
         """
-        cur = self.conn.cursor()
-        cur.execute("SELECT * FROM temps")
-        result = cur.fetchall()
-        cur.close()
+        with self.readers.connection() as conn:
+            cur = conn.cursor()
+            cur.execute("SELECT * FROM temps")
+            result = cur.fetchall()
+            cur.close()
         return result
 
-    def get_temp_values_between(self, start: str, end: str) -> list:
+    def get_temp_values_between(self, start: str, end: str, sensor_ids: tuple[int, ...] = (0, 1)) -> list:
         """Gibt alle Temperaturwerte aus der Datenbank zwischen zwei Zeitpunkten zurück.
 
         :param start: Startzeitpunkt in ISO-Format
         :param end: Endzeit in ISO-Format
-        :return: Temperaturwerte
+        :param sensor_ids: Sensor IDs to query
+        :return: Temperaturwerte als (sensorid, timestamp in ms, value)
         """
-        start_timestamp = datetime.fromisoformat(start)
-        end_timestamp = datetime.fromisoformat(end)
-        temp_values = self.get_temp_values()  # type: list
-        return [
-            temp_value
-            for temp_value in temp_values
-            if start_timestamp <= datetime.fromisoformat(temp_value[1]) <= end_timestamp
-        ]
+        return self.__select_between("temps", iso_to_epoch_ms(start), iso_to_epoch_ms(end), sensor_ids)
+
+    def iter_temp_values_between(
+        self, start: str, end: str, sensor_ids: tuple[int, ...] = (0, 1), chunk_size: int = 1000
+    ) -> Iterator[list]:
+        """Returns the temperature values between two points in time in chunks, without loading all rows.
+
+        :param start: Start time in ISO format
+        :param end: End time in ISO format
+        :param sensor_ids: Sensor IDs to query
+        :param chunk_size: Number of rows per chunk
+        :return: Iterator over lists of (sensorid, timestamp in ms, value)
+        """
+        return self.__iter_between("temps", iso_to_epoch_ms(start), iso_to_epoch_ms(end), sensor_ids, chunk_size)
+
+    def get_temp_rollup_between(
+        self, start: str, end: str, resolution_ms: int, sensor_ids: tuple[int, ...] = (0, 1)
+    ) -> list:
+        """Returns the aggregated temperature values of a rollup table between two points in time.
+
+        :param start: Start time in ISO format
+        :param end: End time in ISO format
+        :param resolution_ms: Bucket size in ms (see ROLLUP_RESOLUTIONS_MS)
+        :param sensor_ids: Sensor IDs to query
+        :return: Buckets as (sensorid, bucket in ms, count, min, max, sum)
+        """
+        return self.__select_rollup_between(
+            "temps", iso_to_epoch_ms(start), iso_to_epoch_ms(end), resolution_ms, sensor_ids
+        )
+
+    def add_temp_sensor_runtime(self, sensor_id: int, minutes: int) -> int:
+        """Increases the runtime of the sensor in one statement on the write connection,
+        without taking a connection from the read pool.
+
+        :param sensor_id: Sensor ID
+        :param minutes: Additional runtime in minutes
+        :return: New runtime of the sensor in minutes
+        """
+        with self.lock:
+            cur = self.conn.execute(
+                "UPDATE temp_sensor_tracking SET time_run_in_min = time_run_in_min + ? WHERE id = ? "
+                "RETURNING time_run_in_min",
+                (minutes, sensor_id),
+            )
+            result = cur.fetchone()
+            cur.close()
+            self.conn.commit()
+        return result[0]
 
     def get_temp_sensor_tracking(self, sensor_id: int) -> Any:
         """Gibt die Laufzeit des Sensors aus der Datenbank zurück.
 
         :return: Laufzeit des Sensors
         """
-        cur = self.conn.cursor()
-        cur.execute("SELECT time_run_in_min FROM temp_sensor_tracking WHERE id = ?", (sensor_id,))
-        result = cur.fetchone()
-        cur.close()
+        with self.readers.connection() as conn:
+            cur = conn.cursor()
+            cur.execute("SELECT time_run_in_min FROM temp_sensor_tracking WHERE id = ?", (sensor_id,))
+            result = cur.fetchone()
+            cur.close()
         return result[0]
 
     def get_lambda_values(self) -> list:
@@ -132,39 +462,446 @@ class Database:
 
         :return: Lambda-Werte
         """
-        cur = self.conn.cursor()
-        cur.execute("SELECT * FROM lambda")
-        result = cur.fetchall()
-        cur.close()
+        with self.readers.connection() as conn:
+            cur = conn.cursor()
+            cur.execute("SELECT * FROM lambda")
+            result = cur.fetchall()
+            cur.close()
         return result
 
-    def get_lambda_values_between(self, start: str, end: str) -> list:
+    def get_lambda_values_between(self, start: str, end: str, sensor_ids: tuple[int, ...] = (0, 1)) -> list:
         """Gibt alle Lambda-Werte aus der Datenbank zwischen zwei Zeitpunkten zurück.
 
         :param start: Startzeitpunkt in ISO-Format
         :param end: Endzeit in ISO-Format
-        :return: Lambda-Werte
+        :param sensor_ids: Sensor IDs to query
+        :return: Lambda-Werte als (sensorid, timestamp in ms, value)
         """
-        start_timestamp = datetime.fromisoformat(start)
-        end_timestamp = datetime.fromisoformat(end)
-        lambda_values = self.get_lambda_values()
-        return [
-            lambda_value
-            for lambda_value in lambda_values
-            if start_timestamp <= datetime.fromisoformat(lambda_value[1]) <= end_timestamp
-        ]
+        return self.__select_between("lambda", iso_to_epoch_ms(start), iso_to_epoch_ms(end), sensor_ids)
+
+    def iter_lambda_values_between(
+        self, start: str, end: str, sensor_ids: tuple[int, ...] = (0, 1), chunk_size: int = 1000
+    ) -> Iterator[list]:
+        """Returns the lambda values between two points in time in chunks, without loading all rows.
+
+        :param start: Start time in ISO format
+        :param end: End time in ISO format
+        :param sensor_ids: Sensor IDs to query
+        :param chunk_size: Number of rows per chunk
+        :return: Iterator over lists of (sensorid, timestamp in ms, value)
+        """
+        return self.__iter_between("lambda", iso_to_epoch_ms(start), iso_to_epoch_ms(end), sensor_ids, chunk_size)
+
+    def get_lambda_rollup_between(
+        self, start: str, end: str, resolution_ms: int, sensor_ids: tuple[int, ...] = (0, 1)
+    ) -> list:
+        """Returns the aggregated lambda values of a rollup table between two points in time.
+
+        :param start: Start time in ISO format
+        :param end: End time in ISO format
+        :param resolution_ms: Bucket size in ms (see ROLLUP_RESOLUTIONS_MS)
+        :param sensor_ids: Sensor IDs to query
+        :return: Buckets as (sensorid, bucket in ms, count, min, max, sum)
+        """
+        return self.__select_rollup_between(
+            "lambda", iso_to_epoch_ms(start), iso_to_epoch_ms(end), resolution_ms, sensor_ids
+        )
 
     def execute(self, query: str, args: tuple = ()):
-        cur = self.conn.cursor()
-        cur.execute(query, args)
-        self.conn.commit()
+        with self.lock:
+            cur = self.conn.cursor()
+            cur.execute(query, args)
+            self.conn.commit()
+            cur.close()
+
+    def delete_values_older_than(self, table: str, older_than_days: int, chunk_size: int = 500) -> int:
+        """Deletes at most ``chunk_size`` raw values per sensor that are older than ``older_than_days``.
+
+        The delete uses the (sensorid, timestamp) or timestamp index, for the rollup tables the primary key
+        (sensorid, bucket), in a short transaction so inserts are not blocked.
+
+        :param table: Table (see RETENTION_TABLES)
+        :param older_than_days: Age in days
+        :param chunk_size: Maximum number of deleted rows per sensor
+        :return: Number of deleted rows
+        """
+        if table not in RETENTION_TABLES:
+            raise ValueError(f"Unknown table: {table}")
+
+        older_than = to_epoch_ms(datetime.now(tz=timezone.utc) - timedelta(days=older_than_days))
+
+        if table == ARCHIVE_TABLE:
+            with self.lock, self.conn:
+                cur = self.conn.execute(
+                    f"DELETE FROM {ARCHIVE_TABLE} WHERE rowid IN "
+                    f"(SELECT rowid FROM {ARCHIVE_TABLE} WHERE end_time < ? LIMIT ?)",
+                    (older_than, chunk_size),
+                )
+            return cur.rowcount
+
+        if table in ROLLUP_TABLES:
+            deleted = 0
+            with self.lock:
+                sensor_ids = [row[0] for row in self.conn.execute(f"SELECT DISTINCT sensorid FROM {table}")]
+                with self.conn:
+                    for sensor_id in sensor_ids:
+                        cur = self.conn.execute(
+                            f"DELETE FROM {table} WHERE sensorid = ? AND bucket IN "
+                            f"(SELECT bucket FROM {table} WHERE sensorid = ? AND bucket < ? LIMIT ?)",
+                            (sensor_id, sensor_id, older_than, chunk_size),
+                        )
+                        deleted += cur.rowcount
+            return deleted
+
+        if table == TICKS_TABLE:
+            with self.lock, self.conn:
+                cur = self.conn.execute(
+                    f"DELETE FROM {TICKS_TABLE} WHERE rowid IN "
+                    f"(SELECT rowid FROM {TICKS_TABLE} WHERE timestamp < ? LIMIT ?)",
+                    (older_than, chunk_size),
+                )
+            return cur.rowcount
+
+        deleted = 0
+        with self.lock:
+            sensor_ids = [row[0] for row in self.conn.execute(f"SELECT DISTINCT sensorid FROM {table}")]
+            with self.conn:
+                for sensor_id in sensor_ids:
+                    cur = self.conn.execute(
+                        f"DELETE FROM {table} WHERE rowid IN "
+                        f"(SELECT rowid FROM {table} WHERE sensorid = ? AND timestamp < ? LIMIT ?)",
+                        (sensor_id, older_than, chunk_size),
+                    )
+                    deleted += cur.rowcount
+        return deleted
+
+    def archive_values_older_than(self, older_than_days: int, block_rows: int = ARCHIVE_BLOCK_ROWS) -> int:
+        """Moves at most one block per sensor and one block of ticks older than ``older_than_days``
+        compressed into the archive table.
+
+        Timestamps are delta encoded, values XOR encoded, then compressed (see archive_format).
+        Queries over time ranges read the archive transparently, the recording_id is lost.
+        NULL values are kept. The rows are read through the read pool and encoded outside the write lock,
+        the lock is only held for INSERT and DELETE.
+
+        :param older_than_days: Age in days
+        :param block_rows: Maximum number of rows per block
+        :return: Number of archived rows
+        """
+        older_than = to_epoch_ms(datetime.now(tz=timezone.utc) - timedelta(days=older_than_days))
+        archived = 0
+        for table in VALUE_TABLES:
+            for sensor_id in range(len(TICK_SENSOR_COLUMNS[table])):
+                with self.readers.connection() as conn:
+                    rows = conn.execute(
+                        f"SELECT rowid, timestamp, value FROM {table} "
+                        "WHERE sensorid = ? AND timestamp < ? ORDER BY timestamp LIMIT ?",
+                        (sensor_id, older_than, block_rows),
+                    ).fetchall()
+                archived += self.__archive_rows(table, sensor_id, rows)
+
+        with self.readers.connection() as conn:
+            rows = conn.execute(
+                f"SELECT rowid, {', '.join(TICK_COLUMNS)} FROM {TICKS_TABLE} "
+                "WHERE timestamp < ? ORDER BY timestamp LIMIT ?",
+                (older_than, block_rows),
+            ).fetchall()
+        # Drop recording_id, the block holds the timestamp and every channel
+        archived += self.__archive_rows(TICKS_TABLE, None, [(row[0], row[1], *row[3:]) for row in rows])
+        return archived
+
+    def incremental_vacuum(self, pages: int = 100) -> int:
+        """Returns up to ``pages`` free pages to the file system. Does nothing if the file is not in
+        incremental auto vacuum mode, the free pages are reused by later inserts then.
+
+        :param pages: Maximum number of pages
+        :return: Number of free pages left afterwards, 0 without incremental auto vacuum
+        """
+        with self.lock:
+            if not self.__is_incremental_vacuum():
+                return 0
+            self.conn.executescript(f"PRAGMA incremental_vacuum({int(pages)});")
+            return self.conn.execute("PRAGMA freelist_count").fetchone()[0]
+
+    def enable_incremental_vacuum(self):
+        """Switches an existing file to incremental auto vacuum with a full VACUUM.
+        The VACUUM rewrites the whole file and blocks all writes while it runs, it needs about
+        twice the size of the database in free disk space.
+        """
+        if self.__is_incremental_vacuum():
+            return
+
+        self.flush()
+        with self.lock:
+            self.conn.execute("PRAGMA auto_vacuum=INCREMENTAL")
+            self.conn.execute("VACUUM")
+
+    def flush(self):
+        """Writes all buffered sensor values to the database in one transaction."""
+        self.writer.flush()
+
+    def flush_if_due(self) -> bool:
+        """Writes the buffered sensor values if the oldest one waits longer than DB_FLUSH_INTERVAL.
+
+        :return: True if values were written
+        """
+        return self.writer.flush_if_due()
+
+    def get_stats(self) -> dict:
+        """Returns the counters of the write buffer (queue depth, flush latency) and of the read pools
+        (wait time, utilization).
+
+        :return: Statistics of the write buffer and the read pools
+        """
+        return {
+            "writer": self.writer.get_stats(),
+            "read_pool": self.readers.get_stats(),
+            "stream_pool": self.stream_readers.get_stats(),
+        }
+
+    def close(self):
+        """Flushes the buffer and closes all connections."""
+        self.flush()
+        self.readers.close()
+        self.stream_readers.close()
+        self.conn.close()
+
+    def __select_between(self, table: str, start_ms: int, end_ms: int, sensor_ids: tuple[int, ...]) -> list:
+        """Range query served by the timestamp indices of the given table, the ticks table and the archive"""
+        query, branches = Database.__between_query(table, sensor_ids)
+        with self.readers.connection() as conn:
+            archived = [
+                row
+                for sensor_id in sensor_ids
+                for rows in Database.__iter_archived_rows(conn, table, sensor_id, start_ms, end_ms)
+                for row in rows
+            ]
+            cur = conn.cursor()
+            cur.execute(query, (start_ms, end_ms) * branches)
+            result = cur.fetchall()
+            cur.close()
+
+        if archived:
+            result = sorted(archived + result, key=itemgetter(0, 1))
+        return result
+
+    def __iter_between(
+        self, table: str, start_ms: int, end_ms: int, sensor_ids: tuple[int, ...], chunk_size: int
+    ) -> Iterator[list]:
+        """Streams a range query in chunks from a read-only connection of the stream pool, which is held until the
+        generator is closed. Per sensor the archived blocks come first, they are always older than the raw rows.
+
+        :raises TimeoutError: On the first ``next`` if every stream connection is busy
+        """
+        with self.stream_readers.connection() as conn:
+            for sensor_id in sorted(sensor_ids):
+                yield from Database.__iter_archived_rows(conn, table, sensor_id, start_ms, end_ms)
+
+                query, branches = Database.__between_query(table, (sensor_id,))
+                cur = conn.execute(query, (start_ms, end_ms) * branches)
+                while rows := cur.fetchmany(chunk_size):
+                    yield rows
+                cur.close()
+
+    @staticmethod
+    def __archive_blocks(
+        conn: sqlite3.Connection, series: str, sensor_id: int | None, start_ms: int, end_ms: int
+    ) -> Iterator[bytes]:
+        """Yields the archived blocks of a series overlapping the range, oldest first"""
+        cur = conn.execute(
+            f"SELECT data FROM {ARCHIVE_TABLE} WHERE series = ? AND sensorid IS ? AND end_time >= ? "
+            "AND start_time <= ? ORDER BY end_time",
+            (series, sensor_id, start_ms, end_ms),
+        )
+        for (data,) in cur:
+            yield data
         cur.close()
 
+    @staticmethod
+    def __iter_archived_rows(
+        conn: sqlite3.Connection, table: str, sensor_id: int, start_ms: int, end_ms: int
+    ) -> Iterator[list]:
+        """Decodes the archived values of one sensor in the range, one list of (sensorid, timestamp, value) per block.
+
+        Values of a sensor are archived both from its per-sensor table and from its column of the ticks table.
+        """
+        column = TICK_SENSOR_COLUMNS[table][sensor_id]
+        sources = (
+            (Database.__archive_blocks(conn, table, sensor_id, start_ms, end_ms), 0),
+            (Database.__archive_blocks(conn, TICKS_TABLE, None, start_ms, end_ms), CHANNELS.index(column)),
+        )
+        for blocks, index in sources:
+            for data in blocks:
+                timestamps, (values,) = decode_block(data, (index,))
+                rows = [
+                    (sensor_id, timestamp, value)
+                    for timestamp, value in zip(timestamps, values)
+                    if start_ms <= timestamp <= end_ms and value is not None
+                ]
+                if rows:
+                    yield rows
+
+    def __archive_rows(self, series: str, sensor_id: int | None, rows: list[tuple]) -> int:
+        """Stores rows of (rowid, timestamp, *values) as one archive block and deletes them from the series table.
+        The block is encoded before the writer lock is taken, the lock only covers the INSERT and DELETE."""
+        if not rows:
+            return 0
+
+        timestamps = [row[1] for row in rows]
+        columns = [[row[index] for row in rows] for index in range(2, len(rows[0]))]
+        data = encode_block(timestamps, columns)
+
+        with self.lock, self.conn:
+            cur = self.conn.executemany(f"DELETE FROM {series} WHERE rowid = ?", ((row[0],) for row in rows))
+            if cur.rowcount != len(rows):
+                # Some rows were deleted since they were read, the next run archives the remaining ones
+                self.conn.rollback()
+                return 0
+            self.conn.execute(
+                f"INSERT INTO {ARCHIVE_TABLE} (series, sensorid, start_time, end_time, count, data) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (series, sensor_id, timestamps[0], timestamps[-1], len(rows), data),
+            )
+        return len(rows)
+
+    @staticmethod
+    def __between_query(table: str, sensor_ids: tuple[int, ...]) -> tuple[str, int]:
+        query, branches = Database.__sensor_rows_query(table, "timestamp BETWEEN ? AND ?", sensor_ids)
+        return f"SELECT sensorid, timestamp, value FROM ({query}) ORDER BY sensorid, timestamp", branches
+
+    @staticmethod
+    def __sensor_rows_query(table: str, condition: str, sensor_ids: tuple[int, ...] | None = None) -> tuple[str, int]:
+        """Builds a query over the per-sensor table and the matching columns of the ticks table.
+
+        Every branch yields (sensorid, timestamp, value, recording_id) and applies ``condition``,
+        so its parameters have to be passed once per branch. NULL columns of the ticks table are no values of the
+        sensor, like a missing row of the per-sensor table.
+
+        :param table: temps or lambda
+        :param condition: SQL condition on timestamp and/or recording_id
+        :param sensor_ids: Sensor IDs to include, all if None
+        :return: Query and number of branches
+        """
+        sensor_columns = TICK_SENSOR_COLUMNS[table]
+        if sensor_ids is None:
+            sensor_ids = tuple(range(len(sensor_columns)))
+
+        ids = ", ".join(str(int(sensor_id)) for sensor_id in sensor_ids)
+        branches = [
+            f"SELECT sensorid, timestamp, value, recording_id FROM {table} WHERE sensorid IN ({ids}) AND {condition}"
+        ]
+        for sensor_id, column in enumerate(sensor_columns):
+            if sensor_id in sensor_ids:
+                branches.append(
+                    f"SELECT {sensor_id}, timestamp, {column}, recording_id FROM {TICKS_TABLE} "
+                    f"WHERE {column} IS NOT NULL AND {condition}"
+                )
+        return " UNION ALL ".join(branches), len(branches)
+
+    def __select_rollup_between(
+        self, table: str, start_ms: int, end_ms: int, resolution_ms: int, sensor_ids: tuple[int, ...]
+    ) -> list:
+        """Range query on the rollup table of the given raw table"""
+        if resolution_ms not in ROLLUP_RESOLUTIONS_MS:
+            raise ValueError(f"No rollup with resolution {resolution_ms} ms")
+
+        placeholders = ", ".join("?" for _ in sensor_ids)
+        with self.readers.connection() as conn:
+            cur = conn.cursor()
+            cur.execute(
+                f"SELECT sensorid, bucket, count, min, max, sum FROM {rollup_table(table, resolution_ms)} "
+                f"WHERE sensorid IN ({placeholders}) AND bucket BETWEEN ? AND ? "
+                "ORDER BY sensorid, bucket",
+                (*sensor_ids, start_ms - start_ms % resolution_ms, end_ms),
+            )
+            result = cur.fetchall()
+            cur.close()
+        return result
+
+    def __finish_recording(self, recording_id: int, end_time: int):
+        """Stores end time, row counts and per sensor min/max/avg of a recording"""
+        summary = {}
+        rows = {}
+        with self.lock:
+            for table in VALUE_TABLES:
+                query, branches = Database.__sensor_rows_query(table, "recording_id = ?")
+                cur = self.conn.execute(
+                    f"SELECT sensorid, COUNT(*), MIN(value), MAX(value), AVG(value) FROM ({query}) GROUP BY sensorid",
+                    (recording_id,) * branches,
+                )
+                stats = cur.fetchall()
+                rows[table] = sum(row[1] for row in stats)
+                summary[table] = {
+                    str(sensor_id): {"count": count, "min": low, "max": high, "avg": avg}
+                    for sensor_id, count, low, high, avg in stats
+                }
+
+            self.conn.execute(
+                "UPDATE recordings SET end_time = ?, temp_rows = ?, lambda_rows = ?, summary = ? WHERE id = ?",
+                (end_time, rows["temps"], rows["lambda"], json.dumps(summary), recording_id),
+            )
+            self.conn.commit()
+
+    @staticmethod
+    def __recording_to_dict(row: tuple) -> dict:
+        recording_id, start_time, end_time, temp_rows, lambda_rows, summary = row
+        return {
+            "id": recording_id,
+            "start_time": start_time,
+            "end_time": end_time,
+            "temp_rows": temp_rows,
+            "lambda_rows": lambda_rows,
+            "summary": json.loads(summary),
+        }
+
+    def __update_rollups(self, conn: sqlite3.Connection, batches: dict[str, list[tuple]]):
+        """Merges a flushed batch into the rollup tables. Runs inside the flush transaction.
+        NULL values are stored in the raw tables but not counted in the buckets."""
+        rows_by_table = {table: [row for row in batches.get(table, ()) if row[2] is not None] for table in VALUE_TABLES}
+        for table, columns in TICK_SENSOR_COLUMNS.items():
+            for sensor_id, column in enumerate(columns):
+                index = TICK_COLUMNS.index(column)
+                rows_by_table[table].extend(
+                    (sensor_id, tick[0], tick[index])
+                    for tick in batches.get(TICKS_TABLE, ())
+                    if tick[index] is not None
+                )
+
+        for table, rows in rows_by_table.items():
+            if not rows:
+                continue
+
+            for resolution_ms in ROLLUP_RESOLUTIONS_MS:
+                # Aggregate the batch first so every bucket is only upserted once
+                buckets: dict[tuple[int, int], list] = {}
+                for row in rows:
+                    sensor_id, timestamp, value = row[0], row[1], row[2]
+                    key = (sensor_id, timestamp - timestamp % resolution_ms)
+                    bucket = buckets.get(key)
+                    if bucket is None:
+                        buckets[key] = [1, value, value, value]
+                    else:
+                        bucket[0] += 1
+                        bucket[1] = min(bucket[1], value)
+                        bucket[2] = max(bucket[2], value)
+                        bucket[3] += value
+
+                conn.executemany(
+                    f"INSERT INTO {rollup_table(table, resolution_ms)} (sensorid, bucket, count, min, max, sum) "
+                    "VALUES (?, ?, ?, ?, ?, ?) "
+                    "ON CONFLICT (sensorid, bucket) DO UPDATE SET "
+                    "count = count + excluded.count, min = MIN(min, excluded.min), "
+                    "max = MAX(max, excluded.max), sum = sum + excluded.sum",
+                    [(key[0], key[1], *aggregate) for key, aggregate in buckets.items()],
+                )
+
     def __del__(self):
         self.conn.close()
 
     def __init_temp_values(self):
-        self.execute("CREATE TABLE IF NOT EXISTS temps (sensorid integer, timestamp TEXT, value float)")
+        self.execute(
+            "CREATE TABLE IF NOT EXISTS temps (sensorid INTEGER, timestamp INTEGER, value REAL, recording_id INTEGER)"
+        )
 
     def __init_temp_sensor_tracking(self):
         self.execute(
@@ -178,21 +915,154 @@ class Database:
             pass
 
     def __init_lambda_values(self):
-        self.execute("CREATE TABLE IF NOT EXISTS lambda (sensorid integer, timestamp TEXT, value float)")
+        self.execute(
+            "CREATE TABLE IF NOT EXISTS lambda (sensorid INTEGER, timestamp INTEGER, value REAL, recording_id INTEGER)"
+        )
+
+    def __init_ticks(self):
+        channel_columns = ", ".join(f"{channel} REAL" for channel in CHANNELS)
+        self.execute(
+            f"CREATE TABLE IF NOT EXISTS {TICKS_TABLE} (timestamp INTEGER, recording_id INTEGER, {channel_columns})"
+        )
+
+    def __init_archive(self):
+        self.execute(
+            f"CREATE TABLE IF NOT EXISTS {ARCHIVE_TABLE} (series TEXT, sensorid INTEGER, start_time INTEGER, "
+            "end_time INTEGER, count INTEGER, data BLOB)"
+        )
+
+    def __init_recordings(self):
+        self.execute(
+            "CREATE TABLE IF NOT EXISTS recordings (id INTEGER PRIMARY KEY, start_time INTEGER, end_time INTEGER, "
+            "temp_rows INTEGER DEFAULT 0, lambda_rows INTEGER DEFAULT 0, summary TEXT DEFAULT '{}')"
+        )
+
+    def __close_open_recordings(self):
+        """Recordings interrupted by a restart end with their last stored value"""
+        with self.lock:
+            open_recordings = self.conn.execute(
+                "SELECT id, start_time FROM recordings WHERE end_time IS NULL"
+            ).fetchall()
 
-    def __clear_temp_values(self, older_than_days: int = 30):
-        now = datetime.now(tz=timezone.utc)
-        older_than = now - timedelta(days=older_than_days)
-        older_than_str = older_than.isoformat()
-        self.execute("DELETE FROM temps WHERE timestamp < ?", (older_than_str,))
+        for recording_id, start_time in open_recordings:
+            with self.lock:
+                end_time = self.conn.execute(
+                    "SELECT MAX(timestamp) FROM (SELECT MAX(timestamp) AS timestamp FROM temps WHERE recording_id = ? "
+                    "UNION ALL SELECT MAX(timestamp) FROM lambda WHERE recording_id = ? "
+                    f"UNION ALL SELECT MAX(timestamp) FROM {TICKS_TABLE} WHERE recording_id = ?)",
+                    (recording_id,) * 3,
+                ).fetchone()[0]
+            self.__finish_recording(recording_id, end_time or start_time)
 
-    def __clear_lambda_values(self, older_than_days: int = 30):
-        now = datetime.now(tz=timezone.utc)
-        older_than = now - timedelta(days=older_than_days)
-        older_than_str = older_than.isoformat()
-        self.execute("DELETE FROM lambda WHERE timestamp < ?", (older_than_str,))
+    def __init_auto_vacuum(self):
+        """Switches new files to incremental auto vacuum so deleted rows can shrink the file.
+        Existing files keep their mode, the switch needs a full VACUUM (see enable_incremental_vacuum)."""
+        if self.__is_incremental_vacuum():
+            return
+
+        if self.conn.execute("SELECT COUNT(*) FROM sqlite_master").fetchone()[0] == 0:
+            # Takes effect without a VACUUM as long as no table exists
+            self.conn.execute("PRAGMA auto_vacuum=INCREMENTAL")
+        else:
+            write_to_systemd(
+                "Incremental auto vacuum is disabled, run scripts/enable_incremental_vacuum.py once to enable it"
+            )
+
+    def __is_incremental_vacuum(self) -> bool:
+        return self.conn.execute("PRAGMA auto_vacuum").fetchone()[0] == 2
+
+    def __init_indices(self):
+        self.execute("CREATE INDEX IF NOT EXISTS idx_temps_sensor_timestamp ON temps (sensorid, timestamp)")
+        self.execute("CREATE INDEX IF NOT EXISTS idx_lambda_sensor_timestamp ON lambda (sensorid, timestamp)")
+        self.execute(
+            "CREATE INDEX IF NOT EXISTS idx_temps_recording ON temps (recording_id, sensorid, timestamp) "
+            "WHERE recording_id IS NOT NULL"
+        )
+        self.execute(
+            "CREATE INDEX IF NOT EXISTS idx_lambda_recording ON lambda (recording_id, sensorid, timestamp) "
+            "WHERE recording_id IS NOT NULL"
+        )
+        self.execute(f"CREATE INDEX IF NOT EXISTS idx_ticks_timestamp ON {TICKS_TABLE} (timestamp)")
+        self.execute(
+            f"CREATE INDEX IF NOT EXISTS idx_archive_series_end ON {ARCHIVE_TABLE} (series, sensorid, end_time)"
+        )
+        self.execute(
+            f"CREATE INDEX IF NOT EXISTS idx_ticks_recording ON {TICKS_TABLE} (recording_id, timestamp) "
+            "WHERE recording_id IS NOT NULL"
+        )
+
+    def __init_rollups(self):
+        """Creates the rollup tables. Empty rollups are filled once from the existing raw rows."""
+        for table in VALUE_TABLES:
+            for resolution_ms in ROLLUP_RESOLUTIONS_MS:
+                name = rollup_table(table, resolution_ms)
+                self.execute(
+                    f"CREATE TABLE IF NOT EXISTS {name} (sensorid INTEGER, bucket INTEGER, count INTEGER, "
+                    "min REAL, max REAL, sum REAL, PRIMARY KEY (sensorid, bucket)) WITHOUT ROWID"
+                )
+                with self.lock:
+                    is_empty = self.conn.execute(f"SELECT 1 FROM {name} LIMIT 1").fetchone() is None
+                if is_empty:
+                    query, _ = Database.__sensor_rows_query(table, "1")
+                    self.execute(
+                        f"INSERT INTO {name} (sensorid, bucket, count, min, max, sum) "
+                        f"SELECT sensorid, timestamp - timestamp % {resolution_ms} AS bucket, "
+                        "COUNT(*), MIN(value), MAX(value), SUM(value) "
+                        f"FROM ({query}) GROUP BY sensorid, bucket"
+                    )
+
+    def __migrate_iso_timestamps(self, table: str):
+        """Converts tables created with ISO text timestamps to integer epoch milliseconds.
+
+        Older MAMA.sqlite files stored ``timestamp`` as TEXT. The table is rebuilt in a single
+        transaction, the conversion itself is done by SQLite so no row passes through Python.
+
+        :param table: Name of the table to migrate
+        """
+        cur = self.conn.cursor()
+        cur.execute(f"PRAGMA table_info({table})")
+        column_types = {row[1]: row[2].upper() for row in cur.fetchall()}
+        cur.close()
+
+        if column_types.get("timestamp") == "INTEGER":
+            return
+
+        write_to_systemd(f"Migrating table {table} to epoch millisecond timestamps")
+        self.conn.executescript(
+            f"""
+            BEGIN;
+            ALTER TABLE {table} RENAME TO {table}_iso;
+            CREATE TABLE {table} (sensorid INTEGER, timestamp INTEGER, value REAL);
+            INSERT INTO {table} (sensorid, timestamp, value)
+                SELECT sensorid,
+                       CAST(ROUND((julianday(timestamp) - {_JULIANDAY_UNIX_EPOCH}) * {_MS_PER_DAY}) AS INTEGER),
+                       value
+                FROM {table}_iso
+                WHERE julianday(timestamp) IS NOT NULL;
+            DROP TABLE {table}_iso;
+            COMMIT;
+            """
+        )
+
+    def __migrate_recording_id(self, table: str):
+        """Adds the recording_id column to tables created before recordings existed
+
+        :param table: Name of the table to migrate
+        """
+        columns = [row[1] for row in self.conn.execute(f"PRAGMA table_info({table})")]
+        if "recording_id" not in columns:
+            write_to_systemd(f"Adding recording_id to table {table}")
+            self.execute(f"ALTER TABLE {table} ADD COLUMN recording_id INTEGER")
 
 
 # Get the project root directory (4 levels up from this file)
 _project_root = Path(__file__).parent.parent.parent
-db_connection = Database(_project_root / "MAMA.sqlite")
+db_connection = Database(
+    _project_root / "MAMA.sqlite",
+    synchronous=getattr(config, "DB_SYNCHRONOUS"),
+    flush_rows=getattr(config, "DB_FLUSH_ROWS"),
+    flush_interval=getattr(config, "DB_FLUSH_INTERVAL"),
+    read_pool_size=getattr(config, "DB_READ_POOL_SIZE"),
+)
+atexit.register(db_connection.stop_recording)
+atexit.register(db_connection.flush)
@@ -0,0 +1,100 @@
+"""Pool of read-only SQLite connections
+
+With WAL journaling readers never block the writer and vice versa, as long as they use their own
+connections. API requests borrow a connection from this pool instead of sharing the writer connection.
+"""
+
+import queue
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Generator
+
+
+class ReadConnectionPool:
+    """Fixed number of ``mode=ro`` connections handed out one request at a time"""
+
+    def __init__(self, db_file: Path, size: int = 2, timeout: float = 5.0):
+        """Opens ``size`` read-only connections to the database file
+
+        :param db_file: Path to the SQLite file (must already exist)
+        :param size: Number of connections
+        :param timeout: Seconds to wait for a free connection
+        """
+        if size < 1:
+            raise ValueError("The read pool needs at least one connection")
+
+        self.size = size
+        self.timeout = timeout
+        self._uri = f"{Path(db_file).resolve().as_uri()}?mode=ro"
+        self._connections: queue.Queue[sqlite3.Connection] = queue.Queue()
+        for _ in range(size):
+            self._connections.put(sqlite3.connect(self._uri, uri=True, check_same_thread=False))
+
+        self._stats_lock = threading.Lock()
+        self._created = time.monotonic()
+        self._in_use = 0
+        self._acquisitions = 0
+        self._total_wait_ms = 0.0
+        self._max_wait_ms = 0.0
+        self._busy_seconds = 0.0
+        self._timeouts = 0
+
+    @contextmanager
+    def connection(self, timeout: float | None = None) -> Generator[sqlite3.Connection, None, None]:
+        """Borrows a connection, waiting until one is free
+
+        :param timeout: Seconds to wait for a free connection, the timeout of the pool if None
+        :return: Read-only connection, returned to the pool when the block is left
+        :raises TimeoutError: If no connection became free in time
+        """
+        wait_start = time.perf_counter()
+        try:
+            conn = self._connections.get(timeout=self.timeout if timeout is None else timeout)
+        except queue.Empty:
+            with self._stats_lock:
+                self._timeouts += 1
+            raise TimeoutError(f"No free read connection within {self.timeout if timeout is None else timeout}s")
+        acquired = time.perf_counter()
+        wait_ms = (acquired - wait_start) * 1000
+
+        with self._stats_lock:
+            self._in_use += 1
+            self._acquisitions += 1
+            self._total_wait_ms += wait_ms
+            self._max_wait_ms = max(self._max_wait_ms, wait_ms)
+
+        try:
+            yield conn
+        finally:
+            # Never hand out a connection with an open read transaction
+            if conn.in_transaction:
+                conn.rollback()
+            with self._stats_lock:
+                self._in_use -= 1
+                self._busy_seconds += time.perf_counter() - acquired
+            self._connections.put(conn)
+
+    def get_stats(self) -> dict:
+        """Returns wait time and utilisation counters
+
+        :return: Dictionary with the current counters
+        """
+        with self._stats_lock:
+            elapsed = time.monotonic() - self._created
+            return {
+                "size": self.size,
+                "in_use": self._in_use,
+                "acquisitions": self._acquisitions,
+                "avg_wait_ms": round(self._total_wait_ms / self._acquisitions, 3) if self._acquisitions else 0.0,
+                "max_wait_ms": round(self._max_wait_ms, 3),
+                "timeouts": self._timeouts,
+                "utilisation": round(self._busy_seconds / (elapsed * self.size), 4) if elapsed > 0 else 0.0,
+            }
+
+    def close(self):
+        """Closes all idle connections"""
+        while not self._connections.empty():
+            self._connections.get_nowait().close()
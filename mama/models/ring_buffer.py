@@ -0,0 +1,148 @@
+"""In-memory ring buffer of the most recent update ticks
+
+Every channel is stored in a preallocated ``array`` so the buffer holds no Python object per sample
+and its memory footprint is fixed by the capacity. Recent-window queries and reconnect backfill are
+answered from here without touching SQLite.
+"""
+
+import threading
+import time
+from array import array
+from typing import Callable
+
+from mama.config import config
+
+# Fields of one update tick, in the order they are emitted by background.sample_sensors
+CHANNELS = (
+    "lamda1",
+    "lamda2",
+    "volt1",
+    "volt2",
+    "afr1",
+    "afr2",
+    "temp1",
+    "temp2",
+    "temp1_voltage",
+    "temp2_voltage",
+)
+
+
+class SampleRingBuffer:
+    """Fixed-capacity buffer of ticks, addressed by a monotonically increasing sequence number"""
+
+    def __init__(
+        self, capacity: int, channels: tuple[str, ...] = CHANNELS, clock: Callable[[], float] = time.monotonic
+    ):
+        """Preallocates the arrays of all channels
+
+        :param capacity: Number of ticks kept in memory
+        :param channels: Names of the channels of one tick
+        :param clock: Monotonic clock in seconds, stamps the arrival of every tick for ``window``
+        """
+        if capacity < 1:
+            raise ValueError("The ring buffer needs a capacity of at least 1")
+
+        self.capacity = capacity
+        self.channels = channels
+        self._clock = clock
+        self._timestamps = array("q", bytes(8 * capacity))
+        # Arrival of every tick on the monotonic clock, the timestamps jump when the system time is set
+        self._received = array("d", bytes(8 * capacity))
+        self._values = {channel: array("d", bytes(8 * capacity)) for channel in channels}
+        # Sequence number of the newest tick, the first tick gets sequence 1
+        self._sequence = 0
+        self._lock = threading.Lock()
+
+    @property
+    def sequence(self) -> int:
+        """Sequence number of the newest tick (0 if the buffer is empty)"""
+        return self._sequence
+
+    def append(self, timestamp_ms: int, sample: dict) -> int:
+        """Stores one tick, overwriting the oldest one if the buffer is full
+
+        :param timestamp_ms: Time of the tick in epoch milliseconds
+        :param sample: Value of every channel
+        :return: Sequence number of the stored tick
+        """
+        with self._lock:
+            index = self._sequence % self.capacity
+            self._timestamps[index] = timestamp_ms
+            self._received[index] = self._clock()
+            for channel in self.channels:
+                self._values[channel][index] = sample[channel]
+            self._sequence += 1
+            return self._sequence
+
+    def since(self, sequence: int, channels: tuple[str, ...] | None = None) -> dict:
+        """Returns all buffered ticks newer than ``sequence``
+
+        :param sequence: Last sequence number the caller already has (0 for everything)
+        :param channels: Channels to return, all if None
+        :return: Columns, see ``_columns``
+        """
+        with self._lock:
+            first = max(sequence + 1, self._oldest_sequence())
+            return self._columns(first, self._sequence, channels)
+
+    def window(self, seconds: float, channels: tuple[str, ...] | None = None) -> dict:
+        """Returns all ticks buffered in the last ``seconds`` seconds
+
+        :param seconds: Length of the window ending now
+        :param channels: Channels to return, all if None
+        :return: Columns, see ``_columns``
+        """
+        with self._lock:
+            start = self._clock() - seconds
+            # Arrival times grow with the sequence number, so the first tick in the window is found by bisection
+            low, high = self._oldest_sequence(), self._sequence + 1
+            while low < high:
+                middle = (low + high) // 2
+                if self._received[(middle - 1) % self.capacity] < start:
+                    low = middle + 1
+                else:
+                    high = middle
+            return self._columns(low, self._sequence, channels)
+
+    def oldest_timestamp(self) -> int | None:
+        """Time of the oldest buffered tick in epoch milliseconds, None if the buffer is empty"""
+        with self._lock:
+            if self._sequence == 0:
+                return None
+            return self._timestamps[(self._oldest_sequence() - 1) % self.capacity]
+
+    def memory_bytes(self) -> int:
+        """Size of the preallocated arrays in bytes"""
+        return (self._timestamps.itemsize + self._received.itemsize) * self.capacity + sum(
+            values.itemsize * self.capacity for values in self._values.values()
+        )
+
+    def _oldest_sequence(self) -> int:
+        return max(1, self._sequence - self.capacity + 1)
+
+    def _columns(self, first: int, last: int, channels: tuple[str, ...] | None) -> dict:
+        """Copies the ticks ``first`` to ``last`` (sequence numbers, inclusive) into columns
+
+        :return: ``{"first_sequence", "sequence", "timestamps", <channel>: [...]}``
+        """
+        channels = channels if channels is not None else self.channels
+        if first > last:
+            return {"first_sequence": last + 1, "sequence": last, "timestamps": []} | {
+                channel: [] for channel in channels
+            }
+
+        start = (first - 1) % self.capacity
+        end = last % self.capacity
+
+        def column(values: array) -> list:
+            if start < end:
+                return values[start:end].tolist()
+            return values[start:].tolist() + values[:end].tolist()
+
+        result = {"first_sequence": first, "sequence": last, "timestamps": column(self._timestamps)}
+        for channel in channels:
+            result[channel] = column(self._values[channel])
+        return result
+
+
+live_buffer = SampleRingBuffer(getattr(config, "LIVE_BUFFER_SIZE"))
@@ -0,0 +1,134 @@
+"""Write-behind buffer for sensor samples
+
+Rows are queued in memory and written with ``executemany`` in a single transaction once either
+the number of queued rows or the age of the oldest queued row exceeds its threshold. This keeps
+the number of fsyncs on the SD card at one per flush instead of one per sample. The age is checked
+on every new row and by ``flush_if_due``, which a background task calls periodically so the last
+rows are written even when no new row arrives.
+"""
+
+import sqlite3
+import threading
+import time
+from typing import Callable
+
+FlushListener = Callable[[sqlite3.Connection, dict[str, list[tuple]]], None]
+
+
+class BufferedWriter:
+    """Queues INSERTs per table and flushes them in batches"""
+
+    def __init__(
+        self,
+        conn: sqlite3.Connection,
+        lock: threading.RLock,
+        max_rows: int = 50,
+        max_delay: float = 10.0,
+    ):
+        """Write-behind buffer for one SQLite connection
+
+        :param conn: Connection the batches are written to
+        :param lock: Lock guarding the connection
+        :param max_rows: Flush as soon as this many rows are queued
+        :param max_delay: Flush as soon as the oldest queued row is older than this (seconds)
+        """
+        self.conn = conn
+        self.lock = lock
+        self.max_rows = max_rows
+        self.max_delay = max_delay
+
+        self._queue: dict[str, list[tuple]] = {}
+        self._queue_depth = 0
+        self._oldest = 0.0
+        self._queue_lock = threading.Lock()
+        self._flush_listeners: list[FlushListener] = []
+
+        self._flushes = 0
+        self._rows_written = 0
+        self._last_flush_ms = 0.0
+        self._max_flush_ms = 0.0
+        self._total_flush_ms = 0.0
+
+    def add(self, table: str, row: tuple):
+        """Queues a row for the given table and flushes if a threshold is reached
+
+        :param table: Name of the target table
+        :param row: Values in column order of the table
+        """
+        with self._queue_lock:
+            if self._queue_depth == 0:
+                self._oldest = time.monotonic()
+            self._queue.setdefault(table, []).append(row)
+            self._queue_depth += 1
+            flush_needed = self._queue_depth >= self.max_rows or time.monotonic() - self._oldest >= self.max_delay
+
+        if flush_needed:
+            self.flush()
+
+    def flush_if_due(self) -> bool:
+        """Flushes if the oldest queued row is older than ``max_delay``
+
+        :return: True if the queue was flushed
+        """
+        with self._queue_lock:
+            flush_needed = self._queue_depth > 0 and time.monotonic() - self._oldest >= self.max_delay
+
+        if flush_needed:
+            self.flush()
+        return flush_needed
+
+    def add_flush_listener(self, listener: FlushListener):
+        """Registers a callable that runs inside the flush transaction
+
+        :param listener: Called as ``listener(conn, batches)`` after the batches are inserted
+        """
+        self._flush_listeners.append(listener)
+
+    def flush(self):
+        """Writes all queued rows in one transaction"""
+        with self._queue_lock:
+            if self._queue_depth == 0:
+                return
+            batches = self._queue
+            rows = self._queue_depth
+            self._queue = {}
+            self._queue_depth = 0
+
+        start = time.perf_counter()
+        try:
+            with self.lock, self.conn:
+                for table, table_rows in batches.items():
+                    placeholders = ", ".join("?" for _ in table_rows[0])
+                    self.conn.executemany(f"INSERT INTO {table} VALUES ({placeholders})", table_rows)
+                for listener in self._flush_listeners:
+                    listener(self.conn, batches)
+        except sqlite3.Error:
+            # Keep the rows so the next flush retries them
+            with self._queue_lock:
+                for table, table_rows in batches.items():
+                    self._queue[table] = table_rows + self._queue.get(table, [])
+                self._queue_depth += rows
+            raise
+
+        duration_ms = (time.perf_counter() - start) * 1000
+        with self._queue_lock:
+            self._flushes += 1
+            self._rows_written += rows
+            self._last_flush_ms = duration_ms
+            self._max_flush_ms = max(self._max_flush_ms, duration_ms)
+            self._total_flush_ms += duration_ms
+
+    def get_stats(self) -> dict:
+        """Returns queue depth and flush latency counters
+
+        :return: Dictionary with the current counters
+        """
+        with self._queue_lock:
+            return {
+                "queue_depth": self._queue_depth,
+                "flushes": self._flushes,
+                "rows_written": self._rows_written,
+                "last_flush_ms": round(self._last_flush_ms, 3),
+                "max_flush_ms": round(self._max_flush_ms, 3),
+                "avg_flush_ms": round(self._total_flush_ms / self._flushes, 3) if self._flushes else 0.0,
+            }
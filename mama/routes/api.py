@@ -1,19 +1,195 @@
 """API routes for data retrieval"""
 
+import itertools
 import json
+import math
+from typing import Iterable
+from typing import Iterator
 
 from flask import Blueprint
 from flask import request
 from flask import Response
+from flask import stream_with_context
 
 from mama.models.database import db_connection
+from mama.models.database import iso_to_epoch_ms
+from mama.models.database import select_rollup_resolution
+from mama.models.ring_buffer import CHANNELS
+from mama.models.ring_buffer import live_buffer
+from mama.sensors.spi_bus import get_bus_stats
+from mama.tasks.hub import acquisition_hub
+from mama.tasks.sampler import get_sampler_stats
+from mama.tasks.scope import scope_streamer
+from mama.utils import binary_format
+from mama.utils.downsampling import downsample
+from mama.utils.downsampling import MIN_POINTS
+from mama.utils.downsampling import rollup_to_rows
+from mama.utils.systemd import write_to_systemd
 
 api_bp = Blueprint("api", __name__)
 
+# Values of the ``stream`` query parameter and their mimetypes
+STREAM_FORMATS = {
+    "ndjson": "application/x-ndjson",
+    "json": "application/json",
+}
+
+
+def _history_values(table: str, start_time: str, end_time: str, data: dict) -> list:
+    """Loads the history of a table, applying the optional ``max_points`` / ``downsample`` parameters.
+
+    Long ranges are served from the coarsest rollup table that still yields ``max_points`` buckets,
+    short ranges from the raw rows.
+
+    :param table: ``temps`` or ``lambda``
+    :param start_time: Start in ISO format
+    :param end_time: End in ISO format
+    :param data: Request arguments
+    :raises ValueError: If the parameters are invalid
+    :return: Rows of (sensorid, timestamp in ms, value)
+    """
+    get_values_between = {
+        "temps": db_connection.get_temp_values_between,
+        "lambda": db_connection.get_lambda_values_between,
+    }[table]
+    get_rollup_between = {
+        "temps": db_connection.get_temp_rollup_between,
+        "lambda": db_connection.get_lambda_rollup_between,
+    }[table]
+
+    if "max_points" not in data:
+        return get_values_between(start_time, end_time)
+
+    max_points = int(data["max_points"])
+    mode = data.get("downsample", "lttb")
+    if max_points < MIN_POINTS:
+        raise ValueError(f"max_points must be at least {MIN_POINTS}")
+
+    resolution_ms = select_rollup_resolution(iso_to_epoch_ms(start_time), iso_to_epoch_ms(end_time), max_points)
+    if resolution_ms is None:
+        rows = get_values_between(start_time, end_time)
+    else:
+        rows = rollup_to_rows(get_rollup_between(start_time, end_time, resolution_ms), mode)
+
+    return downsample(rows, max_points, mode)
+
+
+def _stream_rows(chunks: Iterable[list], stream_format: str) -> Iterator[str]:
+    """Serializes chunks of rows one at a time, either as newline-delimited JSON or as one JSON array
+
+    :param chunks: Iterable over lists of rows
+    :param stream_format: ``ndjson`` or ``json``
+    :return: Iterator over the response body parts
+    """
+    if stream_format == "ndjson":
+        for rows in chunks:
+            yield "".join(json.dumps(row) + "\n" for row in rows)
+        return
+
+    yield "["
+    separator = ""
+    for rows in chunks:
+        if rows:
+            yield separator + ",".join(json.dumps(row) for row in rows)
+            separator = ","
+    yield "]"
+
+
+def _wants_binary(data: dict) -> bool:
+    """True if the client asked for the columnar binary format via ``format=binary`` or the Accept header"""
+    if "format" in data:
+        return data["format"] == "binary"
+    return request.accept_mimetypes.best_match(["application/json", binary_format.MIMETYPE]) == binary_format.MIMETYPE
+
+
+def _binary_response(table: str, start_time: str, end_time: str, data: dict) -> Response:
+    """Builds a history response in the columnar binary format, gzip compressed if the client accepts it
+
+    :param table: ``temps`` or ``lambda``
+    :param start_time: Start in ISO format
+    :param end_time: End in ISO format
+    :param data: Request arguments
+    :return: Response with status code 200 if successful. 400 if an error occurred.
+    """
+    try:
+        values = _history_values(table, start_time, end_time, data)
+    except ValueError as error:
+        write_to_systemd(str(error))
+        return Response(json.dumps({"message": str(error)}), status=400, mimetype="application/json")
+
+    body = binary_format.encode_history(values)
+    response = Response(status=200, mimetype=binary_format.MIMETYPE)
+    if "gzip" in request.accept_encodings:
+        body = binary_format.compress(body)
+        response.headers["Content-Encoding"] = "gzip"
+    response.headers["Vary"] = "Accept, Accept-Encoding"
+    response.set_data(body)
+    return response
+
+
+def _history_response(table: str, start_time: str, end_time: str, data: dict) -> Response:
+    """Builds the response of a history route.
+
+    With ``stream`` the rows are sent chunk by chunk from a server-side cursor, so the memory use
+    does not depend on the number of rows.
+
+    :param table: ``temps`` or ``lambda``
+    :param start_time: Start in ISO format
+    :param end_time: End in ISO format
+    :param data: Request arguments
+    :return: Response with status code 200 if successful. 400 if an error occurred, 503 if every stream connection
+        is busy.
+    """
+    stream_format = data.get("stream")
+    if stream_format is not None and stream_format not in STREAM_FORMATS:
+        return Response(
+            json.dumps({"message": f"Invalid stream format {stream_format}"}), status=400, mimetype="application/json"
+        )
+
+    if _wants_binary(data):
+        if stream_format is not None:
+            return Response(
+                json.dumps({"message": "stream cannot be combined with the binary format"}),
+                status=400,
+                mimetype="application/json",
+            )
+        return _binary_response(table, start_time, end_time, data)
+
+    try:
+        if stream_format is not None and "max_points" not in data:
+            iter_values_between = {
+                "temps": db_connection.iter_temp_values_between,
+                "lambda": db_connection.iter_lambda_values_between,
+            }[table]
+            chunks = iter_values_between(start_time, end_time)
+            # Takes the stream connection now, a busy stream pool is answered before the response starts
+            chunks = itertools.chain([next(chunks, [])], chunks)
+        else:
+            values = _history_values(table, start_time, end_time, data)
+            chunks = [values]
+    except ValueError as error:
+        write_to_systemd(str(error))
+        return Response(json.dumps({"message": str(error)}), status=400, mimetype="application/json")
+    except TimeoutError as error:
+        write_to_systemd(str(error))
+        return Response(json.dumps({"message": str(error)}), status=503, mimetype="application/json")
+
+    if stream_format is None:
+        return Response(json.dumps(values), status=200, mimetype="application/json")
+
+    return Response(
+        stream_with_context(_stream_rows(chunks, stream_format)),
+        status=200,
+        mimetype=STREAM_FORMATS[stream_format],
+    )
+
 
 @api_bp.route("/tempdata", methods=["GET"])
 def get_temp_data_between():
-    """Returns temperature data between two timestamps
+    """Returns temperature data between two timestamps.
+    Optional ``max_points`` limits the rows per sensor, ``downsample`` selects ``lttb`` (default) or ``minmax``.
+    Optional ``stream`` (``ndjson`` or ``json``) sends the rows in chunks.
+    ``format=binary`` or ``Accept: application/vnd.mama.history`` returns the columnar binary format.
 
     :return: Response with status code 200 if successful. 400 if an error occurred.
     """
@@ -22,14 +198,10 @@ def get_temp_data_between():
         start_time = data["start_time"]
         end_time = data["end_time"]
     except KeyError as error:
-        print(error)
+        write_to_systemd(str(error))
         return Response("{'message':'Invalid values'}", status=400, mimetype="application/json")
 
-    return Response(
-        json.dumps(db_connection.get_temp_values_between(start_time, end_time)),
-        status=200,
-        mimetype="application/json",
-    )
+    return _history_response("temps", start_time, end_time, data)
 
 
 @api_bp.route("/reset_temp_sensors", methods=["POST"])
@@ -46,7 +218,11 @@ def reset_temp_sensors():
 
 @api_bp.route("/lambdadata", methods=["GET"])
 def get_lambda_data_between():
-    """Returns lambda data between two timestamps
+    """Returns lambda data between two timestamps.
+    Optional ``max_points`` limits the rows per sensor, ``downsample`` selects ``lttb`` (default) or ``minmax``.
+    Optional ``stream`` (``ndjson`` or ``json``) sends the rows in chunks.
+    ``format=binary`` or ``Accept: application/vnd.mama.history`` returns the columnar binary format.
+
     :return: Response with status code 200 if successful. 400 if an error occurred.
     """
     data: dict = request.args
@@ -54,11 +230,141 @@ def get_lambda_data_between():
         start_time = data["start_time"]
         end_time = data["end_time"]
     except KeyError as error:
-        print(error)
+        write_to_systemd(str(error))
         return Response("{'message':'Invalid values'}", status=400, mimetype="application/json")
 
-    return Response(
-        json.dumps(db_connection.get_lambda_values_between(start_time, end_time)),
-        status=200,
-        mimetype="application/json",
-    )
+    return _history_response("lambda", start_time, end_time, data)
+
+
+@api_bp.route("/recordings", methods=["GET"])
+def get_recordings():
+    """Returns all recordings (id, start/end in ms, row counts and per sensor min/max/avg), newest first
+
+    :return: Response with status code 200
+    """
+    return Response(json.dumps(db_connection.get_recordings()), status=200, mimetype="application/json")
+
+
+@api_bp.route("/recordings/<int:recording_id>", methods=["GET"])
+def get_recording(recording_id: int):
+    """Returns one recording with all its temperature and lambda values, loaded via the recording index.
+    Optional ``max_points`` and ``downsample`` work like for ``/tempdata``.
+
+    :return: Response with status code 200 if successful. 404 if the recording does not exist. 400 if an error occurred.
+    """
+    recording = db_connection.get_recording(recording_id)
+    if recording is None:
+        return Response(
+            json.dumps({"message": f"Unknown recording {recording_id}"}), status=404, mimetype="application/json"
+        )
+
+    data: dict = request.args
+    try:
+        for table in ("temps", "lambda"):
+            values = db_connection.get_recording_values(table, recording_id)
+            if "max_points" in data:
+                values = downsample(values, int(data["max_points"]), data.get("downsample", "lttb"))
+            recording[table] = values
+    except ValueError as error:
+        write_to_systemd(str(error))
+        return Response(json.dumps({"message": str(error)}), status=400, mimetype="application/json")
+
+    return Response(json.dumps(recording), status=200, mimetype="application/json")
+
+
+@api_bp.route("/livedata", methods=["GET"])
+def get_live_data():
+    """Returns the most recent update ticks from the in-memory ring buffer as columns.
+    Either ``seconds`` (window ending now) or ``since`` (last sequence number already received) is required.
+    Optional ``channels`` is a comma separated list of channels, default all.
+
+    :return: Response with status code 200 if successful. 400 if an error occurred.
+    """
+    data: dict = request.args
+    try:
+        channels = tuple(data["channels"].split(",")) if "channels" in data else None
+        if channels is not None and not set(channels) <= set(live_buffer.channels):
+            raise ValueError(f"Unknown channels {set(channels) - set(live_buffer.channels)}")
+
+        if "since" in data:
+            values = live_buffer.since(int(data["since"]), channels)
+        elif "seconds" in data:
+            seconds = float(data["seconds"])
+            if not math.isfinite(seconds) or seconds <= 0:
+                raise ValueError("seconds has to be a finite number greater than 0")
+            values = live_buffer.window(seconds, channels)
+        else:
+            raise ValueError("since or seconds is required")
+    except ValueError as error:
+        write_to_systemd(str(error))
+        return Response(json.dumps({"message": str(error)}), status=400, mimetype="application/json")
+
+    return Response(json.dumps(values), status=200, mimetype="application/json")
+
+
+@api_bp.route("/tickdata", methods=["GET"])
+def get_tick_data_between():
+    """Returns every channel of the recorded update ticks between two timestamps as columns.
+    Optional ``channels`` is a comma separated list of channels, default all.
+
+    :return: Response with status code 200 if successful. 400 if an error occurred.
+    """
+    data: dict = request.args
+    try:
+        channels = tuple(data["channels"].split(",")) if "channels" in data else CHANNELS
+        rows = db_connection.get_ticks_between(data["start_time"], data["end_time"], channels)
+    except (KeyError, ValueError) as error:
+        write_to_systemd(str(error))
+        return Response(json.dumps({"message": str(error)}), status=400, mimetype="application/json")
+
+    columns = list(zip(*rows)) if rows else [()] * (len(channels) + 1)
+    values = {"timestamps": list(columns[0])} | {
+        channel: list(column) for channel, column in zip(channels, columns[1:])
+    }
+    return Response(json.dumps(values), status=200, mimetype="application/json")
+
+
+@api_bp.route("/dbstats", methods=["GET"])
+def get_db_stats():
+    """Returns the counters of the database write buffer (queue depth, flush latency)
+    and of the read connection pool (wait time, utilisation)
+
+    :return: Response with status code 200
+    """
+    return Response(json.dumps(db_connection.get_stats()), status=200, mimetype="application/json")
+
+
+@api_bp.route("/spistats", methods=["GET"])
+def get_spi_stats():
+    """Returns the counters of every shared SPI bus (transactions, conversions per second, lock wait time)
+
+    :return: Response with status code 200
+    """
+    return Response(json.dumps(get_bus_stats()), status=200, mimetype="application/json")
+
+
+@api_bp.route("/samplerstats", methods=["GET"])
+def get_sampler_statistics():
+    """Returns configured and effective sampling rate and the jitter (p50/p99/max) of every sampling loop
+
+    :return: Response with status code 200
+    """
+    return Response(json.dumps(get_sampler_stats()), status=200, mimetype="application/json")
+
+
+@api_bp.route("/hubstats", methods=["GET"])
+def get_hub_statistics():
+    """Returns the number of published ticks and the deliveries, errors and average time of every consumer
+
+    :return: Response with status code 200
+    """
+    return Response(json.dumps(acquisition_hub.get_stats()), status=200, mimetype="application/json")
+
+
+@api_bp.route("/scopestats", methods=["GET"])
+def get_scope_statistics():
+    """Returns the number of scope frames and the queue, decimation and counters of every scope client
+
+    :return: Response with status code 200
+    """
+    return Response(json.dumps(scope_streamer.get_stats()), status=200, mimetype="application/json")
@@ -22,7 +22,8 @@ def update_settings():
                     status=400,
                     mimetype="application/json",
                 )
-            config.update_setting(key, value)
+        # All values at once, the sampling loop picks them up together at its next tick
+        config.update_settings(data)
     except KeyError as error:
         print(error)
         return Response(
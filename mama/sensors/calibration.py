@@ -0,0 +1,167 @@
+"""Lookup tables from ADC codes to calibrated values
+
+The MCP3008 only delivers 1024 different codes, so every conversion (lambda, AFR, temperature) is computed
+once per code when the calibration settings change. Converting a sample is then a table lookup.
+
+The EGT channels use the curve from the ``TEMP_CURVE`` setting::
+
+    {"type": "linear", "scale": 250.0, "offset": 0.0}                T = scale * V + offset (default)
+    {"type": "nist", "gain": 0.25, "cold_junction": 25.0}            amplified Type-K thermocouple, NIST ITS-90
+    {"type": "piecewise", "points": [[0.0, 0], [2.0, 500], ...]}     interpolated [voltage, temperature] points
+
+For ``nist`` the thermocouple voltage is ``V / gain`` (``gain`` in volts output per millivolt of thermocouple
+voltage) and the cold junction is compensated at the given temperature.
+"""
+
+import bisect
+import math
+from array import array
+from typing import Callable
+from typing import Sequence
+
+# Highest code and reference voltage of the MCP3008
+ADC_MAX_CODE = 1023
+REFERENCE_VOLTAGE = 5.0
+
+# NIST ITS-90 Type-K reference functions (temperature in degrees Celsius, voltage in millivolts)
+_NIST_K_EMF = (
+    -1.7600413686e-2,
+    3.8921204975e-2,
+    1.8558770032e-5,
+    -9.9457592874e-8,
+    3.1840945719e-10,
+    -5.6072844889e-13,
+    5.6075059059e-16,
+    -3.2020720003e-19,
+    9.7151147152e-23,
+    -1.2104721275e-26,
+)
+_NIST_K_EMF_EXPONENTIAL = (1.185976e-1, -1.183432e-4, 126.9686)
+# Inverse functions by upper end of their millivolt range
+_NIST_K_INVERSE = (
+    (
+        0.0,
+        (0.0, 2.5173462e1, -1.1662878, -1.0833638, -8.9773540e-1, -3.7342377e-1, -8.6632643e-2, -1.0450598e-2,
+         -5.1920577e-4),
+    ),
+    (
+        20.644,
+        (0.0, 2.508355e1, 7.860106e-2, -2.503131e-1, 8.315270e-2, -1.228034e-2, 9.804036e-4, -4.413030e-5,
+         1.057734e-6, -1.052755e-8),
+    ),
+    (54.886, (-1.318058e2, 4.830222e1, -1.646031, 5.464731e-2, -9.650715e-4, 8.802193e-6, -3.110810e-8)),
+)  # fmt: skip
+
+
+def _polynomial(coefficients: Sequence[float], x: float) -> float:
+    result = 0.0
+    for coefficient in reversed(coefficients):
+        result = result * x + coefficient
+    return result
+
+
+def type_k_emf(temperature: float) -> float:
+    """Thermocouple voltage of a Type-K thermocouple (0-1372 degrees Celsius)
+
+    :param temperature: Temperature of the hot junction in degrees Celsius, cold junction at 0 degrees Celsius
+    :return: Voltage in millivolts
+    """
+    a0, a1, a2 = _NIST_K_EMF_EXPONENTIAL
+    return _polynomial(_NIST_K_EMF, temperature) + a0 * math.exp(a1 * (temperature - a2) ** 2)
+
+
+def type_k_temperature(emf: float) -> float:
+    """Temperature of a Type-K thermocouple (-200-1372 degrees Celsius), clamped to the range of the NIST tables
+
+    :param emf: Thermocouple voltage in millivolts, cold junction at 0 degrees Celsius
+    :return: Temperature in degrees Celsius
+    """
+    emf = min(max(emf, -5.891), _NIST_K_INVERSE[-1][0])
+    for upper, coefficients in _NIST_K_INVERSE:
+        if emf <= upper:
+            return _polynomial(coefficients, emf)
+    return _polynomial(_NIST_K_INVERSE[-1][1], emf)
+
+
+def code_to_voltage(code: int) -> float:
+    return code / ADC_MAX_CODE * REFERENCE_VOLTAGE
+
+
+class CalibrationTable:
+    """Value of every ADC code"""
+
+    __slots__ = ("values",)
+
+    def __init__(self, convert: Callable[[float], float]):
+        """Computes the table
+
+        :param convert: Conversion of a voltage (0-5V) to the calibrated value
+        """
+        self.values = array("d", (convert(code_to_voltage(code)) for code in range(ADC_MAX_CODE + 1)))
+
+    def __getitem__(self, code: int) -> float:
+        return self.values[code]
+
+    def convert(self, codes: Sequence[int]) -> array:
+        """Converts a batch of ADC codes
+
+        :param codes: Raw values (0-1023)
+        :return: Calibrated values
+        """
+        return array("d", map(self.values.__getitem__, codes))
+
+    def from_voltage(self, voltage: float) -> float:
+        """Value of a voltage, interpolated between the two neighbouring codes (filtered voltages are no codes)
+
+        :param voltage: Voltage (0-5V)
+        :return: Calibrated value
+        """
+        position = min(max(voltage / REFERENCE_VOLTAGE * ADC_MAX_CODE, 0.0), float(ADC_MAX_CODE))
+        code = int(position)
+        if code == ADC_MAX_CODE:
+            return self.values[code]
+        return self.values[code] + (position - code) * (self.values[code + 1] - self.values[code])
+
+
+# Voltage of every code
+VOLTAGE_TABLE = CalibrationTable(lambda voltage: voltage)
+
+
+def temperature_curve(spec: dict) -> Callable[[float], float]:
+    """Builds the voltage to temperature conversion of the EGT channels
+
+    :param spec: Curve, see module docstring. An empty dict is the linear default.
+    :return: Conversion of a voltage (0-5V) to degrees Celsius
+    :raises ValueError: For unknown curve types or invalid parameters
+    """
+    curve = spec.get("type", "linear")
+    if curve == "linear":
+        # Default of the EGT amplifier, T [C] = 250 * OUT [V]
+        # Reference: https://www.turbozentrum.de/turbozentrum/pdf/Anleitungen/EGT-DE_mit_CANchecked_Info.pdf
+        scale = float(spec.get("scale", 250.0))
+        offset = float(spec.get("offset", 0.0))
+        return lambda voltage: scale * voltage + offset
+
+    if curve == "nist":
+        gain = float(spec["gain"])
+        if gain <= 0:
+            raise ValueError("The amplifier gain of the nist curve must be greater than 0")
+        cold_junction_emf = type_k_emf(float(spec.get("cold_junction", 25.0)))
+        return lambda voltage: type_k_temperature(voltage / gain + cold_junction_emf)
+
+    if curve == "piecewise":
+        points = sorted((float(voltage), float(temperature)) for voltage, temperature in spec["points"])
+        if len(points) < 2:
+            raise ValueError("The piecewise curve needs at least two points")
+        voltages = [voltage for voltage, _ in points]
+
+        def interpolate(voltage: float) -> float:
+            index = min(max(bisect.bisect_right(voltages, voltage), 1), len(points) - 1)
+            (v0, t0), (v1, t1) = points[index - 1], points[index]
+            if voltage <= v0 or v1 == v0:
+                return t0 if voltage <= v0 else t1
+            return t0 + (min(voltage, v1) - v0) * (t1 - t0) / (v1 - v0)
+
+        return interpolate
+
+    raise ValueError(f"Unknown temperature curve {curve}")
@@ -1,26 +1,51 @@
 import os
+from array import array
+from typing import Sequence
 
-from mama.sensors.mcp3008 import MCP3008
 from mama.sensors.mcp3008 import TestMCP3008
+from mama.sensors.spi_bus import create_test_bus
+from mama.sensors.spi_bus import get_bus
+from mama.sensors.spi_bus import SpiBus
 
 
 class ADC(object):
     """Base class for the ADC interface"""
 
     def __init__(self, bus: int = 0, device: int = 0):
-        """If it is a test environment, a TestMCP3008 object is created, otherwise an MCP3008 object"""
+        """If it is a test environment, a bus with a TestMCP3008 object is created,
+        otherwise the shared bus of the MCP3008 is used"""
         if os.environ.get("FLASK_ENV") == "development":
             print("Create TestMCP3008 Object")
-            self.adc = TestMCP3008(bus, device)
+            self.adc: SpiBus = create_test_bus(TestMCP3008(bus, device))
         else:
-            self.adc = MCP3008(bus, device)
+            self.adc = get_bus(bus, device)
 
-    def get_voltage(self, channel: int) -> float:
-        """Returns the voltage value of the specified channel
+    def read_codes(self, channels: Sequence[int], samples: int = 1) -> array:
+        """Returns the raw values of several channels, read in one batched transaction
 
-        :param channel: Channel of the ADC (0-7)
-        :return: Voltage value (0-5V)
+        :param channels: Channels of the ADC (0-7)
+        :param samples: Number of conversions per channel
+        :return: Raw values (0-1023), ordered sample by sample: ``[s0c0, s0c1, ..., s1c0, s1c1, ...]``
         """
-        value = self.adc.read(channel)
-        voltage = value / 1023.0 * 5.0
-        return voltage
+        return self.adc.read_many(channels, samples)
+
+
+def read_sensor_codes(sensors: Sequence[ADC], samples: int = 1) -> list[array]:
+    """Returns the raw values of several sensors with one transaction per shared bus.
+    The sensors convert them with their calibration tables (see ``data_from_codes``).
+
+    :param sensors: Sensors with a ``channel`` attribute
+    :param samples: Number of conversions per sensor
+    :return: Raw values (0-1023) of every sample, one array per sensor in the order of ``sensors``
+    """
+    chips: dict[SpiBus, list[int]] = {}
+    for index, sensor in enumerate(sensors):
+        chips.setdefault(sensor.adc, []).append(index)
+
+    codes: list[array] = [array("H")] * len(sensors)
+    for indices in chips.values():
+        channels = [sensors[index].channel for index in indices]
+        values = sensors[indices[0]].read_codes(channels, samples)
+        for position, index in enumerate(indices):
+            codes[index] = values[position :: len(channels)]
+    return codes
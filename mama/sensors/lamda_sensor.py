@@ -1,6 +1,10 @@
 from mama.config import config
+from mama.config import ConfigSnapshot
+from mama.sensors.calibration import CalibrationTable
+from mama.sensors.calibration import VOLTAGE_TABLE
 from mama.sensors.gpio import ADC, TestMCP3008
 from dataclasses import dataclass
+from typing import Sequence
 
 
 @dataclass
@@ -25,8 +29,33 @@ class LambdaSensor(ADC):
         self.channel = channel
         self.correction_factor_key = correction_factor_key
 
-        if isinstance(self.adc, TestMCP3008):
-            self.adc = TestMCP3008(min_value=0, max_value=1023)
+        if isinstance(self.adc.adc, TestMCP3008):
+            self.adc.adc = TestMCP3008(min_value=0, max_value=1023)
+
+        self._settings_version: int | None = None
+        self._calibration: tuple[float, float] | None = None
+        self.lamda_table: CalibrationTable | None = None
+        self.afr_table: CalibrationTable | None = None
+        self.refresh_calibration()
+
+    def refresh_calibration(self, settings: ConfigSnapshot | None = None) -> None:
+        """Recomputes the lambda and AFR tables per ADC value if the correction factor or AFR_STOCH
+        have changed
+
+        :param settings: Settings, the current ones if not given
+        """
+        settings = settings or config.snapshot()
+        if settings.version == self._settings_version:
+            return
+        self._settings_version = settings.version
+
+        calibration = (getattr(settings, self.correction_factor_key), settings.AFR_STOCH)
+        if calibration == self._calibration:
+            return
+        correction, afr_stoch = calibration
+        self.lamda_table = CalibrationTable(lambda voltage: LambdaSensor.calculate_lamda(voltage, correction))
+        self.afr_table = CalibrationTable(lambda voltage: LambdaSensor.calculate_lamda(voltage, correction) * afr_stoch)
+        self._calibration = calibration
 
     @staticmethod
     def calculate_lamda(voltage: float, correction: float) -> float:
@@ -39,22 +68,27 @@ class LambdaSensor(ADC):
         lamda = round(0.2 * voltage + correction, 3)
         return lamda
 
-    def get_afr(self, lamda: float) -> float:
-        """Gibt den aktuellen AFR Wert zurück
+    def data_from_codes(self, codes: Sequence[int]) -> list[LamdaData]:
+        """Looks up lambda, AFR and voltage of raw values that were already read (e.g. by read_sensor_codes)
+        in the tables of the last refresh_calibration
 
-        :param lamda: Aktueller Lamdawert
-        :return: Aktueller AFR Wert
+        :param codes: Raw values (0-1023)
+        :return: Lambda, AFR and voltage of every raw value
         """
-        afr = lamda * getattr(config, "AFR_STOCH")
-        return afr
+        return [
+            LamdaData(lamda=lamda, afr=afr, volt=volt)
+            for lamda, afr, volt in zip(
+                self.lamda_table.convert(codes), self.afr_table.convert(codes), VOLTAGE_TABLE.convert(codes)
+            )
+        ]
 
-    def get_data(self) -> LamdaData:
-        """Gibt den aktuellen Lamdawert, den aktuellen AFR Wert und den aktuellen Spannungswert zurück
+    def data_from_voltage(self, voltage: float) -> LamdaData:
+        """Computes lambda and AFR of a voltage that may lie between two ADC values
+        (e.g. after a filter), interpolated from the tables of the last refresh_calibration
 
-        :return: Aktueller Lamdawert, Aktueller AFR Wert und Aktueller Spannungswert
+        :param voltage: Voltage of the lambda sensor (0-5V)
+        :return: Lambda, AFR and voltage
         """
-        voltage = self.get_voltage(self.channel)
-        lamda = LambdaSensor.calculate_lamda(voltage, getattr(config, self.correction_factor_key))
-        afr = self.get_afr(lamda)
-
-        return LamdaData(lamda=lamda, afr=afr, volt=voltage)
+        return LamdaData(
+            lamda=self.lamda_table.from_voltage(voltage), afr=self.afr_table.from_voltage(voltage), volt=voltage
+        )
@@ -1,7 +1,23 @@
+import ctypes
+import fcntl
 import random
+import struct
+from array import array
+from typing import Sequence
 
 from spidev import SpiDev
 
+# struct spi_ioc_transfer from linux/spi/spidev.h
+_SPI_IOC_TRANSFER = struct.Struct("<QQIIHBBBBBx")
+# The ioctl size field has 14 bits, so one message holds at most 511 transfers
+_MAX_TRANSFERS = ((1 << 14) - 1) // _SPI_IOC_TRANSFER.size
+_FRAME_SIZE = 3
+
+
+def _spi_ioc_message(transfers: int) -> int:
+    """Request code of SPI_IOC_MESSAGE(transfers), i.e. _IOW('k', 0, char[transfers * 32])"""
+    return (1 << 30) | ((transfers * _SPI_IOC_TRANSFER.size) << 16) | (ord("k") << 8)
+
 
 class MCP3008:
     def __init__(self, bus=0, device=0):
@@ -22,9 +38,49 @@ class MCP3008:
         data = ((adc[1] & 3) << 8) + adc[2]
         return data
 
+    def read_many(self, channels: Sequence[int], samples: int = 1) -> array:
+        """Reads ``samples`` conversions of every channel with a single ioctl.
+
+        Every conversion is its own 3 byte transfer with chip select released in between, as the MCP3008
+        only starts a new conversion on a falling chip select. All transfers are submitted as one
+        SPI_IOC_MESSAGE, so the whole burst costs one syscall instead of one per conversion.
+
+        :param channels: Channels of the ADC (0-7)
+        :param samples: Number of conversions per channel
+        :return: Raw values (0-1023), ordered sample by sample: ``[s0c0, s0c1, ..., s1c0, s1c1, ...]``
+        """
+        count = len(channels) * samples
+        tx = bytes(byte for _ in range(samples) for channel in channels for byte in (1, (8 + channel) << 4, 0))
+        try:
+            rx = self.__transfer_frames(tx, count)
+        except OSError:
+            # Fallback for SPI drivers without multi-transfer messages
+            rx = b"".join(bytes(self.spi.xfer2(list(tx[i : i + _FRAME_SIZE]))) for i in range(0, len(tx), _FRAME_SIZE))
+
+        return array("H", (((rx[i + 1] & 3) << 8) + rx[i + 2] for i in range(0, len(rx), _FRAME_SIZE)))
+
     def close(self):
         self.spi.close()
 
+    def __transfer_frames(self, tx: bytes, count: int) -> bytes:
+        tx_buffer = ctypes.create_string_buffer(tx, len(tx))
+        rx_buffer = ctypes.create_string_buffer(len(tx))
+        tx_address, rx_address = ctypes.addressof(tx_buffer), ctypes.addressof(rx_buffer)
+
+        for first in range(0, count, _MAX_TRANSFERS):
+            last = min(first + _MAX_TRANSFERS, count)
+            message = bytearray()
+            for frame in range(first, last):
+                offset = frame * _FRAME_SIZE
+                # Release chip select after every frame except the last one of the message
+                cs_change = 1 if frame < last - 1 else 0
+                message += _SPI_IOC_TRANSFER.pack(
+                    tx_address + offset, rx_address + offset, _FRAME_SIZE, 0, 0, 0, cs_change, 0, 0, 0
+                )
+            fcntl.ioctl(self.spi.fileno(), _spi_ioc_message(last - first), message)
+
+        return rx_buffer.raw
+
 
 class TestMCP3008:
     def __init__(self, offset_value: int = 1, min_value: int = 0, max_value: int = 1023):
@@ -47,5 +103,8 @@ class TestMCP3008:
 
         return self.current_value
 
+    def read_many(self, channels: Sequence[int], samples: int = 1) -> array:
+        return array("H", (self.read(channel) for _ in range(samples) for channel in channels))
+
     def close(self):
         pass
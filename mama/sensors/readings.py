@@ -0,0 +1,310 @@
+"""Reading the sensors without any web or database dependency
+
+Shared by the update loop of the web process and the optional acquisition process.
+"""
+
+import time
+from array import array
+from dataclasses import dataclass
+from dataclasses import field
+
+from mama.config import config
+from mama.config import ConfigSnapshot
+from mama.models.ring_buffer import CHANNELS
+from mama.sensors.gpio import read_sensor_codes
+from mama.sensors.lamda_sensor import LambdaSensor
+from mama.sensors.lamda_sensor import LamdaData
+from mama.sensors.temp_sensor import TempData
+from mama.sensors.temp_sensor import TypKTemperaturSensor
+from mama.tasks.scheduler import ChannelScheduler
+from mama.tasks.scope import SCOPE_CHANNELS
+from mama.tasks.scope import ScopeStreamer
+from mama.utils.filters import FilterBank
+from mama.utils.filters import RunningStats
+from mama.utils.systemd import write_to_systemd
+
+# Averaged channels, their window statistics are sent along with the mean
+STAT_CHANNELS = ("lamda1", "lamda2", "volt1", "volt2", "afr1", "afr2")
+STAT_FIELDS = tuple(f"{channel}_{statistic}" for channel in STAT_CHANNELS for statistic in ("min", "max", "std"))
+
+# Every field of an update tick
+SAMPLE_FIELDS = (*CHANNELS, *STAT_FIELDS)
+
+# Sensor (see create_sensors) of every scheduled channel
+CHANNEL_SENSORS = {"lamda1": "lamda0", "lamda2": "lamda1", "temp1": "temp0", "temp2": "temp1"}
+
+# Settings the sampling depends on
+SAMPLING_SETTINGS = (
+    "LAMDA0_CHANNEL",
+    "LAMDA1_CHANNEL",
+    "TEMPERATUR0_CHANNEL",
+    "TEMPERATUR1_CHANNEL",
+    "KORREKTURFAKTOR_BANK_1",
+    "KORREKTURFAKTOR_BANK_2",
+    "AFR_STOCH",
+    "TEMP_CURVE",
+    "MESSURE_INTERVAL",
+    "UPDATE_INTERVAL",
+    "CHANNEL_RATES",
+    "SENSOR_FILTER",
+)
+
+
+def create_sensors() -> dict:
+    """Creates all sensors on the channels from the settings
+
+    :return: Sensors by name (lamda0, lamda1, temp0, temp1)
+    """
+    return {
+        "lamda0": LambdaSensor(
+            channel=getattr(config, "LAMDA0_CHANNEL"), correction_factor_key="KORREKTURFAKTOR_BANK_1"
+        ),
+        "lamda1": LambdaSensor(
+            channel=getattr(config, "LAMDA1_CHANNEL"), correction_factor_key="KORREKTURFAKTOR_BANK_2"
+        ),
+        "temp0": TypKTemperaturSensor(channel=getattr(config, "TEMPERATUR0_CHANNEL")),
+        "temp1": TypKTemperaturSensor(channel=getattr(config, "TEMPERATUR1_CHANNEL")),
+    }
+
+
+@dataclass
+class AveragedLamdaValues:
+    """Container for averaged lambda sensor readings from both sensors"""
+
+    lamda1: float
+    lamda2: float
+    volt1: float
+    volt2: float
+    afr1: float
+    afr2: float
+    # Window statistics by channel (see STAT_CHANNELS)
+    stats: dict[str, RunningStats] = field(default_factory=dict)
+
+
+@dataclass
+class TempValues:
+    """Container for temperature sensor readings from both sensors"""
+
+    temp0: float
+    temp1: float
+    temp0_voltage: float
+    temp1_voltage: float
+
+
+def channel_rates(settings: ConfigSnapshot | None = None) -> dict[str, float]:
+    """Returns the sampling rate of every channel: lambda every MESSURE_INTERVAL, the temperatures once per
+    UPDATE_INTERVAL, each overridable in the CHANNEL_RATES setting
+
+    :param settings: Settings to use, the current ones if omitted
+    :return: Samples per second by channel (see CHANNEL_SENSORS)
+    :raises ValueError: For unknown channels in CHANNEL_RATES or intervals not greater than 0
+    """
+    settings = settings or config.snapshot()
+    if not settings.MESSURE_INTERVAL > 0 or not settings.UPDATE_INTERVAL > 0:
+        raise ValueError("MESSURE_INTERVAL and UPDATE_INTERVAL must be greater than 0")
+    lamda_rate = 1 / settings.MESSURE_INTERVAL
+    temp_rate = 1 / settings.UPDATE_INTERVAL
+    rates = {"lamda1": lamda_rate, "lamda2": lamda_rate, "temp1": temp_rate, "temp2": temp_rate}
+    for channel, rate in settings.CHANNEL_RATES.items():
+        if channel not in rates:
+            raise ValueError(f"Unknown channel {channel} in CHANNEL_RATES")
+        rates[channel] = float(rate)
+    return rates
+
+
+class ScheduledReader:
+    """Reads every channel at its own rate and aggregates the samples of one update window
+
+    The lambda channels are averaged in RunningStats, which also yield min, max and standard deviation of the
+    window. The temperatures are averaged as well, a window without a temperature sample keeps the last one.
+
+    Changed settings (update interval, channel rates, filters, calibration) are picked up at the start of the next
+    window, within a window the reader only uses its own state.
+
+    While a scope client is connected, the unfiltered lambda samples of every window are handed to the scope.
+    """
+
+    def __init__(
+        self,
+        sensors: dict,
+        filters: FilterBank | None = None,
+        register: bool = False,
+        scope: ScopeStreamer | None = None,
+    ):
+        """
+        :param sensors: Sensors by name, see create_sensors
+        :param filters: Filters applied to the voltage of every sample, a rejected temperature keeps the last one
+        :param register: Make the statistics of every channel available in ``get_sampler_stats``
+        :param scope: Receiver of the raw lambda samples of every window
+        """
+        self.sensors = sensors
+        self.filters = filters
+        self.register = register
+        self.scope = scope
+        self.scheduler: ChannelScheduler | None = None
+        self.duration: float | None = None
+        self._settings_version: int | None = None
+        self._window_end: float | None = None
+        self._last_lamda_voltage: dict[str, float] = {}
+        self._last_temp: dict[str, TempData] = {}
+
+    def apply_settings(self, settings: ConfigSnapshot) -> None:
+        """Applies changed settings, invalid rates or intervals keep the previous rates and window length
+
+        :param settings: Settings of the next window
+        :raises ValueError: If the first settings contain invalid rates or intervals
+        """
+        if settings.version == self._settings_version:
+            return
+        self._settings_version = settings.version
+
+        try:
+            rates = channel_rates(settings)
+            if self.scheduler is None or rates != self.scheduler.rates:
+                self.scheduler = ChannelScheduler(rates, register=self.register)
+            self.duration = settings.UPDATE_INTERVAL
+        except (AttributeError, TypeError, ValueError) as error:
+            if self.scheduler is None:
+                raise
+            write_to_systemd(f"Invalid sampling settings, keeping the previous ones: {error}")
+
+        if self.filters is not None:
+            refresh_filters(self.filters, settings)
+        for sensor in self.sensors.values():
+            sensor.refresh_calibration(settings)
+
+    def read_window(self, settings: ConfigSnapshot) -> tuple[AveragedLamdaValues, TempValues]:
+        """Reads the channels for one UPDATE_INTERVAL, windows follow each other without gaps
+
+        :param settings: Settings of this window, usually ``config.snapshot()``
+        :return: Averaged lambda values and temperature values of the window
+        """
+        self.apply_settings(settings)
+        duration = self.duration
+
+        now = self.scheduler.clock()
+        # Start a new sequence of windows if the caller fell more than a whole window behind
+        if self._window_end is None or self._window_end + duration < now:
+            self._window_end = now
+        self._window_end += duration
+        window_start = self._window_end - duration
+
+        raw = None
+        if self.scope is not None and self.scope.active:
+            raw = {channel: (array("f"), array("f"), array("f")) for channel in SCOPE_CHANNELS}
+            window_start_ms = round((time.time() - (now - window_start)) * 1000)
+
+        lamda_stats = {channel: RunningStats() for channel in STAT_CHANNELS}
+        temp_stats = {channel: (RunningStats(), RunningStats()) for channel in ("temp1", "temp2")}
+
+        while due := self.scheduler.wait(until=self._window_end):
+            sensors = [self.sensors[CHANNEL_SENSORS[channel]] for channel in due]
+            if raw is not None:
+                offset_ms = (self.scheduler.clock() - window_start) * 1000
+            # Every due channel of a chip in one SPI transaction, the raw values are looked up in the
+            # calibration tables. Only a sample changed by a filter lies between two codes and is interpolated.
+            for channel, sensor, codes in zip(due, sensors, read_sensor_codes(sensors)):
+                if channel in temp_stats:
+                    data = sensor.data_from_codes(codes)[0]
+                    if self.filters is not None:
+                        voltage = self.filters.apply(channel, data.volt, hold=True)
+                        if voltage != data.volt:
+                            data = sensor.data_from_voltage(voltage)
+                    self._last_temp[channel] = data
+                    temp_stats[channel][0].add(data.temp)
+                    temp_stats[channel][1].add(data.volt)
+                    continue
+
+                data = sensor.data_from_codes(codes)[0]
+                self._last_lamda_voltage[channel] = data.volt
+                if raw is not None:
+                    # The scope shows the samples before filtering
+                    raw_offsets, raw_voltages, raw_lamdas = raw[channel]
+                    raw_offsets.append(offset_ms)
+                    raw_voltages.append(data.volt)
+                    raw_lamdas.append(data.lamda)
+                if self.filters is not None:
+                    voltage = self.filters.apply(channel, data.volt)
+                    if voltage is None:
+                        continue
+                    if voltage != data.volt:
+                        data = sensor.data_from_voltage(voltage)
+                _add_lamda_sample(lamda_stats, channel[-1], data)
+
+        # No accepted sample in this window (all rejected by the filters or a rate below the update rate),
+        # fall back to the last unfiltered one
+        for channel in ("lamda1", "lamda2"):
+            if lamda_stats[channel].count == 0:
+                sensor = self.sensors[CHANNEL_SENSORS[channel]]
+                voltage = self._last_lamda_voltage[channel]
+                _add_lamda_sample(lamda_stats, channel[-1], sensor.data_from_voltage(voltage))
+        for channel, (temps, volts) in temp_stats.items():
+            if temps.count == 0:
+                temps.add(self._last_temp[channel].temp)
+                volts.add(self._last_temp[channel].volt)
+
+        if raw is not None:
+            self.scope.publish(window_start_ms, raw)
+
+        lamda_values = AveragedLamdaValues(
+            lamda1=lamda_stats["lamda1"].mean,
+            lamda2=lamda_stats["lamda2"].mean,
+            volt1=lamda_stats["volt1"].mean,
+            volt2=lamda_stats["volt2"].mean,
+            afr1=lamda_stats["afr1"].mean,
+            afr2=lamda_stats["afr2"].mean,
+            stats=lamda_stats,
+        )
+        temp_values = TempValues(
+            temp0=round(temp_stats["temp1"][0].mean),
+            temp1=round(temp_stats["temp2"][0].mean),
+            temp0_voltage=temp_stats["temp1"][1].mean,
+            temp1_voltage=temp_stats["temp2"][1].mean,
+        )
+        return lamda_values, temp_values
+
+
+def _add_lamda_sample(stats: dict[str, RunningStats], bank: str, data: LamdaData) -> None:
+    stats[f"lamda{bank}"].add(data.lamda)
+    stats[f"volt{bank}"].add(data.volt)
+    stats[f"afr{bank}"].add(data.afr)
+
+
+def refresh_filters(filters: FilterBank, settings: ConfigSnapshot | None = None) -> None:
+    """Applies changes of the SENSOR_FILTER setting, an invalid setting keeps the previous filters
+
+    :param filters: Filters of the sampling loop
+    :param settings: Settings to use, the current ones if omitted
+    """
+    settings = settings or config.snapshot()
+    try:
+        filters.configure(settings.SENSOR_FILTER)
+    except (TypeError, ValueError) as error:
+        write_to_systemd(f"Invalid SENSOR_FILTER setting: {error}")
+
+
+def sample_from_values(lamda_values: AveragedLamdaValues, temp_values: TempValues) -> dict:
+    """Returns the values of one update tick by channel name (see ring_buffer.CHANNELS),
+    followed by min, max and standard deviation of the averaged channels (see STAT_FIELDS)
+
+    :param lamda_values: Averaged lambda values
+    :param temp_values: Temperature values
+    :return: Value of every channel and statistic
+    """
+    sample = {
+        "lamda1": lamda_values.lamda1,
+        "lamda2": lamda_values.lamda2,
+        "volt1": lamda_values.volt1,
+        "volt2": lamda_values.volt2,
+        "afr1": lamda_values.afr1,
+        "afr2": lamda_values.afr2,
+        "temp1": temp_values.temp0,
+        "temp2": temp_values.temp1,
+        "temp1_voltage": temp_values.temp0_voltage,
+        "temp2_voltage": temp_values.temp1_voltage,
+    }
+    for channel, stats in lamda_values.stats.items():
+        sample[f"{channel}_min"] = stats.min
+        sample[f"{channel}_max"] = stats.max
+        sample[f"{channel}_std"] = stats.std
+    return sample
@@ -0,0 +1,130 @@
+"""Process-wide access to the ADC chips on the SPI bus
+
+Every chip select (``/dev/spidevB.D``) is opened once and shared by all sensors on it. A lock around each
+transaction keeps the sampling, lifetime and overheating tasks from interleaving their transfers.
+"""
+
+import threading
+import time
+from array import array
+from typing import Sequence
+
+from mama.sensors.mcp3008 import MCP3008
+from mama.sensors.mcp3008 import TestMCP3008
+
+# Bytes on the wire per MCP3008 conversion
+_BYTES_PER_CONVERSION = 3
+
+
+class SpiBus:
+    """One opened ADC chip, transactions are serialised by a lock"""
+
+    def __init__(self, adc: MCP3008 | TestMCP3008, name: str):
+        """Wraps an opened ADC
+
+        :param adc: ADC driver
+        :param name: Name used in the statistics, e.g. ``spidev0.0``
+        """
+        self.adc = adc
+        self.name = name
+        self._lock = threading.Lock()
+        self._created = time.monotonic()
+        self._transactions = 0
+        self._conversions = 0
+        self._busy_seconds = 0.0
+        self._total_wait_ms = 0.0
+        self._max_wait_ms = 0.0
+
+    def read(self, channel: int) -> int:
+        """Reads one conversion
+
+        :param channel: Channel of the ADC (0-7)
+        :return: Raw value (0-1023)
+        """
+        return self.read_many((channel,))[0]
+
+    def read_many(self, channels: Sequence[int], samples: int = 1) -> array:
+        """Reads ``samples`` conversions of every channel in one transaction, see ``MCP3008.read_many``
+
+        :param channels: Channels of the ADC (0-7)
+        :param samples: Number of conversions per channel
+        :return: Raw values (0-1023), ordered sample by sample
+        """
+        wait_start = time.perf_counter()
+        with self._lock:
+            acquired = time.perf_counter()
+            values = self.adc.read_many(channels, samples)
+            finished = time.perf_counter()
+
+            wait_ms = (acquired - wait_start) * 1000
+            self._transactions += 1
+            self._conversions += len(values)
+            self._busy_seconds += finished - acquired
+            self._total_wait_ms += wait_ms
+            self._max_wait_ms = max(self._max_wait_ms, wait_ms)
+        return values
+
+    def get_stats(self) -> dict:
+        """Returns throughput and lock wait counters
+
+        :return: Dictionary with the current counters
+        """
+        with self._lock:
+            elapsed = time.monotonic() - self._created
+            return {
+                "transactions": self._transactions,
+                "conversions": self._conversions,
+                "bytes": self._conversions * _BYTES_PER_CONVERSION,
+                "conversions_per_second": round(self._conversions / elapsed, 1) if elapsed > 0 else 0.0,
+                "avg_transaction_ms": (
+                    round(self._busy_seconds * 1000 / self._transactions, 3) if self._transactions else 0.0
+                ),
+                "avg_wait_ms": round(self._total_wait_ms / self._transactions, 3) if self._transactions else 0.0,
+                "max_wait_ms": round(self._max_wait_ms, 3),
+                "utilisation": round(self._busy_seconds / elapsed, 4) if elapsed > 0 else 0.0,
+            }
+
+    def close(self):
+        """Closes the ADC"""
+        with self._lock:
+            self.adc.close()
+
+
+_buses: dict[tuple[int, int], SpiBus] = {}
+_test_buses: list[SpiBus] = []
+_buses_lock = threading.Lock()
+
+
+def get_bus(bus: int = 0, device: int = 0) -> SpiBus:
+    """Returns the shared bus of an SPI chip select, opening it on first use
+
+    :param bus: SPI bus
+    :param device: Chip select
+    :return: Shared bus
+    """
+    with _buses_lock:
+        if (bus, device) not in _buses:
+            _buses[(bus, device)] = SpiBus(MCP3008(bus, device), f"spidev{bus}.{device}")
+        return _buses[(bus, device)]
+
+
+def create_test_bus(adc: TestMCP3008) -> SpiBus:
+    """Wraps a simulated ADC. In test mode every sensor gets its own, so each produces its own values.
+
+    :param adc: Simulated ADC
+    :return: Bus for this sensor only
+    """
+    with _buses_lock:
+        bus = SpiBus(adc, f"test{len(_test_buses)}")
+        _test_buses.append(bus)
+        return bus
+
+
+def get_bus_stats() -> dict[str, dict]:
+    """Returns the counters of all opened buses
+
+    :return: Counters by bus name
+    """
+    with _buses_lock:
+        buses = [*_buses.values(), *_test_buses]
+    return {bus.name: bus.get_stats() for bus in buses}
@@ -1,6 +1,14 @@
 from dataclasses import dataclass
+from typing import Sequence
 
+from mama.config import config
+from mama.config import ConfigSnapshot
+from mama.sensors.calibration import CalibrationTable
+from mama.sensors.calibration import temperature_curve
+from mama.sensors.calibration import VOLTAGE_TABLE
 from mama.sensors.gpio import ADC, TestMCP3008
+from mama.sensors.spi_bus import create_test_bus
+from mama.utils.systemd import write_to_systemd
 
 
 @dataclass
@@ -21,28 +29,51 @@ class TypKTemperaturSensor(ADC):
         :param channel: ADC pin to which the temperature sensor is connected
         """
         # TODO: Remove the following line when the implementation is complete
-        self.adc = TestMCP3008(min_value=0, max_value=800)
+        self.adc = create_test_bus(TestMCP3008(min_value=0, max_value=800))
         self.channel = channel
+        self._settings_version: int | None = None
+        self._curve: dict | None = None
+        self.table = CalibrationTable(temperature_curve({}))
+        self.refresh_calibration()
 
-    @staticmethod
-    def calculate_temp(voltage: float) -> int:
-        """Returns the temperature in degrees Celsius.
+    def refresh_calibration(self, settings: ConfigSnapshot | None = None) -> None:
+        """Rebuilds the temperature table if the TEMP_CURVE setting changed.
+        An invalid curve is reported and the previous table is kept.
 
-        :param voltage: Voltage from the Type-K thermocouple (0-5V)
-        :return: Temperature in degrees Celsius (0-1360°C)
+        :param settings: Settings to use, the current ones if omitted
+        """
+        settings = settings or config.snapshot()
+        if settings.version == self._settings_version:
+            return
+        self._settings_version = settings.version
+
+        curve = settings.TEMP_CURVE
+        if curve == self._curve:
+            return
+        self._curve = curve
+        try:
+            self.table = CalibrationTable(temperature_curve(curve))
+        except (KeyError, TypeError, ValueError) as error:
+            write_to_systemd(f"Invalid TEMP_CURVE setting: {error!r}")
+
+    def data_from_codes(self, codes: Sequence[int]) -> list[TempData]:
+        """Looks up the temperatures of raw values that were already read (e.g. by read_sensor_codes)
+        in the table of the last refresh_calibration.
+
+        :param codes: Raw values (0-1023)
+        :return: Temperature in degrees Celsius truncated to whole degrees (0-1360) and voltage (0-5V) of every raw value
         """
-        # Conversion formula from voltage to degrees Celsius
-        # Reference: https://www.turbozentrum.de/turbozentrum/pdf/Anleitungen/EGT-DE_mit_CANchecked_Info.pdf
-        # T [C] = 250 * OUT [V]
-        temp = int(250 * voltage)
-        return temp
+        return [
+            TempData(temp=int(temp), volt=volt)
+            for temp, volt in zip(self.table.convert(codes), VOLTAGE_TABLE.convert(codes))
+        ]
 
-    def get_data(self) -> TempData:
-        """Returns the temperature in degrees Celsius.
+    def data_from_voltage(self, voltage: float) -> TempData:
+        """Returns the temperature for a voltage between two raw values (e.g. after a filter),
+        interpolated in the table of the last refresh_calibration.
 
-        :param channel: GPIO pin to which the temperature sensor is connected
-        :return: Temperature in degrees Celsius (0-1360°C) and voltage (0-5V)
+        :param voltage: Voltage from the Type-K thermocouple (0-5V)
+        :return: Temperature in degrees Celsius truncated to whole degrees (0-1360) and voltage (0-5V)
         """
-        voltage = self.get_voltage(self.channel)
-        temp = self.calculate_temp(voltage)
+        temp = int(self.table.from_voltage(voltage))
         return TempData(temp=temp, volt=voltage)
@@ -0,0 +1,54 @@
+// Decoder for the columnar binary history format (see mama/utils/binary_format.py)
+//
+// Header (16 bytes, little-endian): magic "MAMH", version (uint8), 3 bytes padding,
+// number of rows (uint32), 4 bytes padding. Followed by int64[n] timestamps in ms,
+// float32[n] values and uint8[n] sensor ids.
+
+const HISTORY_BINARY_MIMETYPE = "application/vnd.mama.history";
+const HISTORY_BINARY_VERSION = 1;
+const HISTORY_BINARY_HEADER_SIZE = 16;
+
+function decodeHistoryBinary(buffer) {
+    const header = new DataView(buffer, 0, HISTORY_BINARY_HEADER_SIZE);
+    const magic = String.fromCharCode(header.getUint8(0), header.getUint8(1), header.getUint8(2), header.getUint8(3));
+    if (magic !== "MAMH" || header.getUint8(4) !== HISTORY_BINARY_VERSION) {
+        throw new Error("Unsupported history format");
+    }
+
+    const count = header.getUint32(8, true);
+    let offset = HISTORY_BINARY_HEADER_SIZE;
+    const timestamps = new BigInt64Array(buffer, offset, count);
+    offset += 8 * count;
+    const values = new Float32Array(buffer, offset, count);
+    offset += 4 * count;
+    const sensors = new Uint8Array(buffer, offset, count);
+
+    return {
+        count: count,
+        timestamps: timestamps,
+        values: values,
+        sensors: sensors,
+    };
+}
+
+// Splits the decoded columns into chart points {x, y} per sensor id
+function historyBinaryToPoints(columns, sensorIds) {
+    const points = sensorIds.map(() => []);
+    for (let i = 0; i < columns.count; i++) {
+        const index = sensorIds.indexOf(columns.sensors[i]);
+        if (index >= 0) {
+            points[index].push({x: Number(columns.timestamps[i]), y: columns.values[i]});
+        }
+    }
+    return points;
+}
+
+async function fetchHistoryBinary(url, params) {
+    const response = await fetch(url + "?" + new URLSearchParams(params), {
+        headers: {"Accept": HISTORY_BINARY_MIMETYPE},
+    });
+    if (!response.ok) {
+        throw new Error(await response.text());
+    }
+    return decodeHistoryBinary(await response.arrayBuffer());
+}
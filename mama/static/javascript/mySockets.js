@@ -19,6 +19,32 @@ const MIN_SHOWN_LAMBDA_LIMIT = 0.550
 const MAX_SHOWN_AFR_LIMIT = 21.0
 const MIN_SHOWN_AFR_LIMIT = 8.09
 
+// Wire format of the newValues event: "json", "float32" or "float32-delta" (see mama/utils/binary_format.py)
+const LIVE_FORMAT = "float32-delta";
+const LIVE_BINARY_VERSION = 1;
+const LIVE_BINARY_HEADER_SIZE = 16;
+
+// Live values shown on this page, every tick. A tick comes every UPDATE_INTERVAL (1.5 s by default), a second
+// subscription for the temperatures at a lower rate would not save anything but cost an extra event per tick
+const SHOWN_FIELDS = ["lamda1", "lamda2", "afr1", "afr2", "temp1", "temp2"];
+const LIVE_SUBSCRIPTIONS = [{channels: SHOWN_FIELDS, rate: 0}];
+
+// Streams by id, sent by the server in the liveFormat event: field order of the binary frames
+// and values of the previous tick, base of the next delta record
+let liveStreams = {};
+// Newest value of every field, merged from all streams
+let currentValues = {};
+// Sequence number of the newest tick received and the server buffer it belongs to, sent on reconnect so the
+// server only replays the missed ticks in the backfill event
+let liveSequence = 0;
+let liveBuffer = undefined;
+
+// Scope mode: raw lambda samples of every update window, see enableScope
+const SCOPE_BINARY_VERSION = 1;
+const SCOPE_BINARY_HEADER_SIZE = 16;
+let scopeCallback = undefined;
+let scopeChannels = [];
+
 let hinweis_queue = [];
 
 let blinking = undefined;
@@ -28,8 +54,27 @@ socket.on('connect', function () {
     let browserTime = new Date().toISOString();
 
     socket.emit('connected', {
-        data: browserTime
+        data: browserTime,
+        format: LIVE_FORMAT,
+        subscriptions: LIVE_SUBSCRIPTIONS,
+        sequence: liveSequence,
+        buffer: liveBuffer
     });
+
+    // The scope subscription does not survive a reconnect
+    if (scopeCallback !== undefined) {
+        socket.emit('scope', {enabled: true});
+    }
+});
+
+socket.on('liveFormat', function (liveFormat) {
+    if (liveFormat.buffer !== liveBuffer) {
+        // The server restarted, its sequence numbers start again
+        liveBuffer = liveFormat.buffer;
+        liveSequence = 0;
+    }
+    liveStreams = {};
+    liveFormat.streams.forEach(stream => liveStreams[stream.id] = {fields: stream.fields, previous: undefined});
 });
 
 socket.on("connect_error", (error) => {
@@ -46,8 +91,98 @@ socket.on("disconnect", (reason) => {
 
 
 
-socket.on('newValues', function (values) {
-    console.log(JSON.stringify(values));
+// Decodes a binary newValues frame into one object per tick, records of a delta frame
+// without a known previous tick are skipped until the next key frame
+function decodeLiveFrame(buffer, stream) {
+    const view = new DataView(buffer);
+    const magic = String.fromCharCode(view.getUint8(0), view.getUint8(1), view.getUint8(2), view.getUint8(3));
+    if (magic !== "MAML" || view.getUint8(4) !== LIVE_BINARY_VERSION) {
+        throw new Error("Unsupported live format");
+    }
+
+    const delta = (view.getUint8(5) & 1) === 1;
+    const tickCount = view.getUint16(6, true);
+    const fieldCount = view.getUint32(8, true);
+    const maskWords = Math.ceil(fieldCount / 32);
+    let offset = LIVE_BINARY_HEADER_SIZE + 8 * tickCount;
+
+    const samples = [];
+    for (let tick = 0; tick < tickCount; tick++) {
+        const hasBase = !delta || stream.previous !== undefined;
+        const values = hasBase && delta ? Float32Array.from(stream.previous) : new Float32Array(fieldCount);
+
+        if (delta) {
+            const maskOffset = offset;
+            offset += 4 * maskWords;
+            for (let field = 0; field < fieldCount; field++) {
+                if ((view.getUint32(maskOffset + 4 * (field >> 5), true) >>> (field & 31)) & 1) {
+                    values[field] = view.getFloat32(offset, true);
+                    offset += 4;
+                }
+            }
+        } else {
+            for (let field = 0; field < fieldCount; field++) {
+                values[field] = view.getFloat32(offset, true);
+                offset += 4;
+            }
+        }
+
+        if (!hasBase) {
+            continue;
+        }
+        stream.previous = values;
+
+        const sample = {timestamp: Number(view.getBigInt64(LIVE_BINARY_HEADER_SIZE + 8 * tick, true))};
+        stream.fields.forEach((name, field) => sample[name] = values[field]);
+        samples.push(sample);
+    }
+    return samples;
+}
+
+
+// Missed ticks after a (re)connect, samples with their sequence number are dispatched as liveBackfill DOM event
+socket.on('backfill', function (payload, description) {
+    let samples = [];
+    if (Array.isArray(payload)) {
+        const stream = {fields: description.fields, previous: undefined};
+        payload.forEach(frame => samples.push(...decodeLiveFrame(frame, stream)));
+    } else {
+        samples = payload.timestamps.map((timestamp, index) => {
+            const sample = {timestamp: timestamp};
+            description.fields.forEach(field => sample[field] = payload[field][index]);
+            return sample;
+        });
+    }
+    samples.forEach((sample, index) => sample.sequence = description.first_sequence + index);
+
+    if (description.sequence > liveSequence) {
+        liveSequence = description.sequence;
+        Object.assign(currentValues, samples[samples.length - 1]);
+    }
+    document.dispatchEvent(new CustomEvent('liveBackfill', {detail: samples}));
+});
+
+
+socket.on('newValues', function (values, streamId, sequence) {
+    liveSequence = Math.max(liveSequence, sequence);
+    if (values instanceof ArrayBuffer) {
+        const stream = liveStreams[streamId];
+        if (stream === undefined) {
+            // Frame of a subscription replaced in the meantime
+            return;
+        }
+        const samples = decodeLiveFrame(values, stream);
+        if (samples.length === 0) {
+            return;
+        }
+        // A batched frame is shown with its newest tick
+        values = samples[samples.length - 1];
+    }
+    Object.assign(currentValues, values);
+    if (!SHOWN_FIELDS.every(field => field in currentValues)) {
+        return;
+    }
+    values = currentValues;
 
     const lamda1 = Math.max(Math.min(values.lamda1, MAX_SHOWN_LAMBDA_LIMIT), MIN_SHOWN_LAMBDA_LIMIT);
     const lamda2 = Math.max(Math.min(values.lamda2, MAX_SHOWN_LAMBDA_LIMIT), MIN_SHOWN_LAMBDA_LIMIT);
@@ -73,6 +208,60 @@ socket.on('newValues', function (values) {
 });
 
 
+// Streams the raw lambda samples to the callback, called with one object per update window:
+// {timestamp, channels: {lamda1: {offsets, volts, lamdas}, ...}} (offsets in milliseconds since the timestamp)
+function enableScope(callback) {
+    scopeCallback = callback;
+    socket.emit('scope', {enabled: true});
+}
+
+function disableScope() {
+    scopeCallback = undefined;
+    socket.emit('scope', {enabled: false});
+}
+
+socket.on('scopeState', function (state) {
+    if (state.enabled) {
+        scopeChannels = state.channels;
+    } else {
+        scopeCallback = undefined;
+        if (state.reason) {
+            console.log(state.reason);
+        }
+    }
+});
+
+function decodeScopeFrame(buffer) {
+    const view = new DataView(buffer);
+    const magic = String.fromCharCode(view.getUint8(0), view.getUint8(1), view.getUint8(2), view.getUint8(3));
+    if (magic !== "MAMS" || view.getUint8(4) !== SCOPE_BINARY_VERSION) {
+        throw new Error("Unsupported scope format");
+    }
+
+    const channelCount = view.getUint8(5);
+    const channels = {};
+    let offset = SCOPE_BINARY_HEADER_SIZE + 4 * channelCount;
+    for (let channel = 0; channel < channelCount; channel++) {
+        const count = view.getUint32(SCOPE_BINARY_HEADER_SIZE + 4 * channel, true);
+        const columns = [0, 1, 2].map(column => new Float32Array(buffer, offset + 4 * count * column, count));
+        channels[scopeChannels[channel]] = {offsets: columns[0], volts: columns[1], lamdas: columns[2]};
+        offset += 12 * count;
+    }
+    return {timestamp: Number(view.getBigInt64(8, true)), channels: channels};
+}
+
+socket.on('scopeFrame', function (buffer, ack) {
+    // The server only sends the next frames after the acknowledgement, a slow page gets fewer frames
+    try {
+        if (scopeCallback !== undefined) {
+            scopeCallback(decodeScopeFrame(buffer));
+        }
+    } finally {
+        ack();
+    }
+});
+
+
 socket.on("error", (error) => {
     console.log(error);
 
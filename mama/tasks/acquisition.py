@@ -0,0 +1,240 @@
+"""Optional sensor acquisition in a dedicated process
+
+With ``ACQUISITION_PROCESS`` enabled the sensors are sampled by a separate Python process (optionally pinned
+to one CPU core with ``ACQUISITION_CPU``), so slow requests, template rendering or blocking calls in the web
+worker can no longer stall the sampling cadence. The process writes every update tick into a ring buffer in
+shared memory, the web process only reads from it to emit and persist the values.
+
+The process is started with ``python -m mama.tasks.acquisition`` instead of ``multiprocessing``, so it does
+not import the web application (or open the database) of the parent.
+
+Shared memory layout (native byte order)::
+
+    header  int64 sequence of the newest tick, int64 capacity
+    slots   capacity x (int64 sequence tag, int64 timestamp in ms, float64 value per field of readings.SAMPLE_FIELDS)
+
+The writer marks a slot with tag -1 while writing it and sets the tag to the sequence number afterwards.
+A reader only accepts a slot whose tag equals the expected sequence before and after copying it.
+"""
+
+import argparse
+import os
+import signal
+import struct
+import subprocess
+import sys
+import time
+from multiprocessing import resource_tracker
+from multiprocessing import shared_memory
+
+from mama.config import config
+from mama.config import ConfigSnapshot
+from mama.sensors.readings import SAMPLE_FIELDS
+from mama.sensors.readings import SAMPLING_SETTINGS
+from mama.utils.systemd import write_to_systemd
+
+# Number of ticks in the shared ring, the web process polls it several times per update interval
+ACQUISITION_RING_SIZE = 256
+
+_HEADER = struct.Struct("=qq")
+_TAG = struct.Struct("=q")
+
+
+class SharedSampleRing:
+    """Single writer, multiple reader ring of update ticks in shared memory"""
+
+    def __init__(self, memory: shared_memory.SharedMemory, channels: tuple[str, ...] = SAMPLE_FIELDS):
+        self.memory = memory
+        self.channels = channels
+        self._slot = struct.Struct("=qq" + "d" * len(channels))
+        self.capacity = _HEADER.unpack_from(memory.buf)[1]
+
+    @classmethod
+    def create(cls, capacity: int, channels: tuple[str, ...] = SAMPLE_FIELDS) -> "SharedSampleRing":
+        """Allocates a new ring
+
+        :param capacity: Number of ticks
+        :param channels: Names of the channels of one tick
+        :return: Ring owning the shared memory
+        """
+        slot_size = struct.calcsize("=qq" + "d" * len(channels))
+        memory = shared_memory.SharedMemory(create=True, size=_HEADER.size + capacity * slot_size)
+        _HEADER.pack_into(memory.buf, 0, 0, capacity)
+        return cls(memory, channels)
+
+    @classmethod
+    def attach(cls, name: str, channels: tuple[str, ...] = SAMPLE_FIELDS) -> "SharedSampleRing":
+        """Attaches to a ring created by another process
+
+        :param name: Name of the shared memory
+        :param channels: Names of the channels of one tick
+        :return: Ring without ownership of the shared memory
+        """
+        memory = shared_memory.SharedMemory(name=name)
+        # Only the creator may unlink the memory, keep the resource tracker of this process away from it
+        resource_tracker.unregister(memory._name, "shared_memory")
+        return cls(memory, channels)
+
+    @property
+    def name(self) -> str:
+        return self.memory.name
+
+    @property
+    def sequence(self) -> int:
+        """Sequence number of the newest tick (0 if the ring is empty)"""
+        return _HEADER.unpack_from(self.memory.buf)[0]
+
+    def append(self, timestamp_ms: int, sample: dict) -> int:
+        """Stores one tick, only one process may write
+
+        :param timestamp_ms: Time of the tick in epoch milliseconds
+        :param sample: Value of every channel
+        :return: Sequence number of the stored tick
+        """
+        sequence = self.sequence + 1
+        offset = self.__offset(sequence)
+        self._slot.pack_into(self.memory.buf, offset, -1, timestamp_ms, *(sample[channel] for channel in self.channels))
+        _TAG.pack_into(self.memory.buf, offset, sequence)
+        _HEADER.pack_into(self.memory.buf, 0, sequence, self.capacity)
+        return sequence
+
+    def since(self, sequence: int) -> list[tuple[int, int, dict]]:
+        """Returns all ticks newer than ``sequence`` that are still in the ring
+
+        :param sequence: Last sequence number the caller already has
+        :return: List of (sequence, timestamp in ms, value by channel)
+        """
+        newest = self.sequence
+        ticks = []
+        for current in range(max(sequence + 1, newest - self.capacity + 1, 1), newest + 1):
+            offset = self.__offset(current)
+            tag, timestamp_ms, *values = self._slot.unpack_from(self.memory.buf, offset)
+            # Skip slots that are being (over)written
+            if tag != current or _TAG.unpack_from(self.memory.buf, offset)[0] != current:
+                continue
+            ticks.append((current, timestamp_ms, dict(zip(self.channels, values))))
+        return ticks
+
+    def close(self):
+        self.memory.close()
+
+    def unlink(self):
+        self.memory.unlink()
+
+    def __offset(self, sequence: int) -> int:
+        return _HEADER.size + ((sequence - 1) % self.capacity) * self._slot.size
+
+
+class AcquisitionProcess:
+    """Starts, reads and stops the acquisition process from the web process"""
+
+    def __init__(self, cpu: int = -1, capacity: int = ACQUISITION_RING_SIZE):
+        """
+        :param cpu: CPU core the process is pinned to, -1 for no pinning
+        :param capacity: Number of ticks in the shared ring
+        """
+        self.cpu = cpu
+        self.capacity = capacity
+        self.ring: SharedSampleRing | None = None
+        self._process: subprocess.Popen | None = None
+        self._settings: tuple | None = None
+
+    def start(self):
+        """Allocates the shared ring and starts the process"""
+        self._settings = self.__sampling_settings(config.snapshot())
+        self.ring = SharedSampleRing.create(self.capacity)
+        self._process = subprocess.Popen(
+            [sys.executable, "-m", "mama.tasks.acquisition", "--shm", self.ring.name, "--cpu", str(self.cpu)]
+        )
+
+    def is_alive(self) -> bool:
+        return self._process is not None and self._process.poll() is None
+
+    def settings_changed(self, settings: ConfigSnapshot) -> bool:
+        """The process reads the settings once when it starts, tells if it needs a restart for new settings
+
+        :param settings: New settings
+        :return: True if a setting the sampling depends on differs from the one the process started with
+        """
+        return self._settings is not None and self.__sampling_settings(settings) != self._settings
+
+    @staticmethod
+    def __sampling_settings(settings: ConfigSnapshot) -> tuple:
+        return tuple(getattr(settings, name) for name in SAMPLING_SETTINGS)
+
+    @property
+    def sequence(self) -> int:
+        """Sequence number of the newest tick"""
+        return self.ring.sequence if self.ring is not None else 0
+
+    def since(self, sequence: int) -> list[tuple[int, int, dict]]:
+        """Returns all ticks newer than ``sequence``, see ``SharedSampleRing.since``"""
+        return self.ring.since(sequence) if self.ring is not None else []
+
+    def stop(self, timeout: float = 5.0):
+        """Stops the process and frees the shared ring
+
+        :param timeout: Seconds to wait for the process before it is killed
+        """
+        if self._process is not None:
+            self._process.terminate()
+            try:
+                self._process.wait(timeout)
+            except subprocess.TimeoutExpired:
+                self._process.kill()
+                self._process.wait()
+            self._process = None
+
+        if self.ring is not None:
+            self.ring.close()
+            self.ring.unlink()
+            self.ring = None
+
+
+def run_acquisition(shm_name: str, cpu: int = -1):
+    """Sampling loop of the acquisition process, runs until SIGTERM or until the parent process exits
+
+    :param shm_name: Name of the shared ring created by the web process
+    :param cpu: CPU core to pin the process to, -1 for no pinning
+    """
+    # Imported here, the web process only needs the ring
+    from mama.sensors.readings import create_sensors
+    from mama.sensors.readings import sample_from_values
+    from mama.sensors.readings import ScheduledReader
+    from mama.utils.filters import FilterBank
+
+    if cpu >= 0:
+        os.sched_setaffinity(0, {cpu})
+
+    stopped = False
+
+    def stop(*_):
+        nonlocal stopped
+        stopped = True
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+
+    parent = os.getppid()
+    ring = SharedSampleRing.attach(shm_name)
+    sensors = create_sensors()
+    # Settings changed in the web process only reach this process with a restart, see AcquisitionProcess
+    settings = config.snapshot()
+    reader = ScheduledReader(sensors, FilterBank())
+
+    write_to_systemd(f"Acquisition process {os.getpid()} started (cpu {cpu})")
+    sys.stdout.flush()
+    try:
+        while not stopped and os.getppid() == parent:
+            lamda_values, temp_values = reader.read_window(settings)
+            ring.append(int(time.time() * 1000), sample_from_values(lamda_values, temp_values))
+    finally:
+        ring.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="MAMA sensor acquisition process")
+    parser.add_argument("--shm", required=True, help="Name of the shared memory ring")
+    parser.add_argument("--cpu", type=int, default=-1, help="CPU core to pin the process to")
+    arguments = parser.parse_args()
+    run_acquisition(arguments.shm, arguments.cpu)
@@ -1,158 +1,79 @@
 """Background tasks for sensor data collection and monitoring"""
 
-from datetime import datetime, timedelta
+import sqlite3
 import time
 import traceback
-from dataclasses import dataclass
+from typing import Callable
+from typing import Iterable
+from typing import Iterator
 
+from mama.config import config
 from mama.models.database import db_connection
-from mama.sensors.temp_sensor import TypKTemperaturSensor
-from mama.sensors.lamda_sensor import LambdaSensor
+from mama.models.database import now_epoch_ms
+from mama.models.database import RETENTION_TABLES
+from mama.models.database import retention_days
+from mama.models.database import TICK_SENSOR_COLUMNS
+from mama.sensors.readings import sample_from_values
+from mama.sensors.readings import ScheduledReader
+from mama.tasks.acquisition import AcquisitionProcess
+from mama.tasks.hub import AcquisitionHub
+from mama.tasks.live import LiveEmitter
+from mama.tasks.scope import ScopeStreamer
+from mama.utils.filters import FilterBank
+from mama.utils.systemd import write_to_systemd
+
+
+def sample_sensors(sensors, scope: ScopeStreamer | None = None) -> Iterator[tuple[int, dict]]:
+    """Reads every sensor at its own rate (see readings.channel_rates) and yields one tick per
+    UPDATE_INTERVAL with the averaged lambda values and the temperatures. The sensors are only read here.
 
-
-@dataclass
-class AveragedLamdaValues:
-    """Container for averaged lambda sensor readings from both sensors"""
-
-    lamda1: float
-    lamda2: float
-    volt1: float
-    volt2: float
-    afr1: float
-    afr2: float
-
-
-@dataclass
-class TempValues:
-    """Container for temperature sensor readings from both sensors"""
-
-    temp0: float
-    temp1: float
-    temp0_voltage: float
-    temp1_voltage: float
-
-
-def get_lamda_values(
-    lamda_sensor0: LambdaSensor, lamda_sensor1: LambdaSensor, number_of_lamda_values: int, sampling_rate: float
-) -> AveragedLamdaValues:
-    """Returns the averaged lambda values from both lambda sensors
-
-    Args:
-        lamda_sensor0: Lambda Sensor 0 instance
-        lamda_sensor1: Lambda Sensor 1 instance
-        number_of_lamda_values: Number of measurements to perform for averaging
-        sampling_rate: Sleep interval between measurements in seconds
-
-    Returns:
-        AveragedLamdaValues: Averaged lambda values from both sensors
-    """
-    assert number_of_lamda_values > 0, "number_of_lamda_values must be greater than 0"
-
-    # Collect samples
-    lamda1_samples = []
-    lamda2_samples = []
-    volt1_samples = []
-    volt2_samples = []
-    afr1_samples = []
-    afr2_samples = []
-
-    for _ in range(number_of_lamda_values):
-        lamda0_data = lamda_sensor0.get_data()
-        lamda1_data = lamda_sensor1.get_data()
-
-        lamda1_samples.append(lamda0_data.lamda)
-        lamda2_samples.append(lamda1_data.lamda)
-        volt1_samples.append(lamda0_data.volt)
-        volt2_samples.append(lamda1_data.volt)
-        afr1_samples.append(lamda0_data.afr)
-        afr2_samples.append(lamda1_data.afr)
-
-        time.sleep(sampling_rate)
-
-    assert len(lamda1_samples) == number_of_lamda_values
-
-    # Calculate averages
-    return AveragedLamdaValues(
-        lamda1=sum(lamda1_samples) / number_of_lamda_values,
-        lamda2=sum(lamda2_samples) / number_of_lamda_values,
-        volt1=sum(volt1_samples) / number_of_lamda_values,
-        volt2=sum(volt2_samples) / number_of_lamda_values,
-        afr1=sum(afr1_samples) / number_of_lamda_values,
-        afr2=sum(afr2_samples) / number_of_lamda_values,
-    )
-
-
-def get_temp_values(temp_sensor0: TypKTemperaturSensor, temp_sensor1: TypKTemperaturSensor) -> TempValues:
-    """Gibt die Temperaturwerte der beiden Temperatursensoren zurück
-
-    Args:
-        temp_sensor0: Temperature Sensor 0 instance
-        temp_sensor1: Temperature Sensor 1 instance
-
-    Returns:
-        TempValues: Temperature values from both sensors
+    :param sensors: Dictionary containing all sensor instances
+    :param scope: Receiver of the raw lambda samples for the scope clients
+    :return: Endless source of (time in epoch milliseconds, value of every channel)
     """
-    temp0_data = temp_sensor0.get_data()
-    temp1_data = temp_sensor1.get_data()
+    # Absolute deadlines per channel, so reading, averaging and publishing do not stretch the intervals
+    reader = ScheduledReader(sensors, FilterBank(), register=True, scope=scope)
 
-    return TempValues(
-        temp0=temp0_data.temp,
-        temp1=temp1_data.temp,
-        temp0_voltage=temp0_data.volt,
-        temp1_voltage=temp1_data.volt,
-    )
+    while True:
+        # Changed settings are picked up at the next tick
+        lamda_values, temp_values = reader.read_window(config.snapshot())
+        yield now_epoch_ms(), sample_from_values(lamda_values, temp_values)
 
 
-def update_data(
-    socketio, thread_stop_event, is_recording_func, sensors, update_interval: float, messure_interval: float
-):
-    """Diese Funktion wird in einem eigenen Thread ausgeführt und sorgt dafür, dass die Daten
-    über einen Socket an den Client gesendet werden. Die Daten werden dabei in einem bestimmten
-    Intervall aktualisiert. Die Temperaturwerte werden dabei immer gesichert, die Lambda Werte nur
-    wenn die Aufzeichnung läuft.
+def relay_acquisition(
+    socketio, acquisition: AcquisitionProcess, poll_interval: float = 0.1
+) -> Iterator[tuple[int, dict]]:
+    """Counterpart of ``sample_sensors`` if the sensors are sampled by the acquisition process.
+    Polls the shared ring and yields every new tick, the web process does not touch the sensors.
 
     :param socketio: SocketIO instance
-    :param thread_stop_event: Event to signal thread stop
-    :param is_recording_func: Function that returns current recording state
-    :param sensors: Dictionary containing all sensor instances
-    :param update_interval: In welchem Intervall die Daten aktualisiert werden sollen
-    :param messure_interval: In welchem Intervall die Messwerte ermittelt werden sollen
+    :param acquisition: Running acquisition process
+    :param poll_interval: Seconds between two polls of the shared ring
+    :return: Endless source of (time in epoch milliseconds, value of every channel)
     """
-    try:
-        sampling_rate = messure_interval
-        number_of_lamda_values = round(update_interval / sampling_rate)
-
-        while not thread_stop_event.isSet():
-            lamda_values = get_lamda_values(sensors["lamda0"], sensors["lamda1"], number_of_lamda_values, sampling_rate)
-            temp_values = get_temp_values(sensors["temp0"], sensors["temp1"])
-
-            data = {
-                "lamda1": lamda_values.lamda1,
-                "lamda2": lamda_values.lamda2,
-                "volt1": lamda_values.volt1,
-                "volt2": lamda_values.volt2,
-                "afr1": lamda_values.afr1,
-                "afr2": lamda_values.afr2,
-                "temp1": temp_values.temp0,
-                "temp2": temp_values.temp1,
-                "temp1_voltage": temp_values.temp0_voltage,
-                "temp2_voltage": temp_values.temp1_voltage,
-            }
+    # Ticks sampled before the hub started are not replayed
+    sequence = acquisition.sequence
 
-            socketio.emit("newValues", data)
+    while True:
+        # The process was restarted with a new ring
+        if acquisition.sequence < sequence:
+            sequence = 0
 
-            # without sleep, the emit does not work properly
-            # socketio.sleep(0.1)
+        for sequence, timestamp_ms, data in acquisition.since(sequence):
+            yield timestamp_ms, data
+        socketio.sleep(poll_interval)
 
-            if temp_values.temp0 > 100 and is_recording_func():
-                db_connection.insert_temp_value(0, temp_values.temp0)
 
-            if temp_values.temp1 > 100 and is_recording_func():
-                db_connection.insert_temp_value(1, temp_values.temp1)
+def run_hub(socketio, hub: AcquisitionHub, ticks: Iterable[tuple[int, dict]]) -> None:
+    """Runs in its own thread and hands the ticks of the source to every consumer of the hub.
+    It keeps running without a connected client, so overheating and lifetime are always monitored.
 
-            if is_recording_func():
-                db_connection.insert_lambda_value(0, lamda_values.lamda1)
-                db_connection.insert_lambda_value(1, lamda_values.lamda2)
+    :param socketio: SocketIO instance
+    :param hub: Hub with the subscribed consumers
+    :param ticks: Source of the ticks, ``sample_sensors`` or ``relay_acquisition``
+    """
+    try:
+        hub.run(ticks)
 
     except AttributeError:
         socketio.emit(
@@ -174,120 +95,210 @@ def update_data(
         )
 
 
-def update_lifetime(socketio, sensors) -> None:
-    """Updates the lifespan of the temperature sensors in the database.
-    Only increases the lifespan if the temperature is over 100°C.
+# Longest time between two ticks counted by the consumers, in update intervals. Longer gaps (a stalled loop)
+# count as this many intervals.
+MAX_TICK_GAP_INTERVALS = 3
 
-    :param socketio: SocketIO instance
-    :param sensors: Dictionary containing all sensor instances
+
+class TickClock:
+    """Time between the ticks a consumer gets, on the monotonic clock.
+
+    The tick timestamps follow the system time, which is set to the browser time on every connect,
+    so they must not be used for durations.
     """
-    update_frequency_sec = 60
 
-    # Do not add any stop event here, we always want to check for overheating
-    # even if no user is connected to the web interface
-    while True:
-        temp_values = get_temp_values(sensors["temp0"], sensors["temp1"])
-
-        current_lifespan0 = db_connection.get_temp_sensor_tracking(0)
-        current_lifespan1 = db_connection.get_temp_sensor_tracking(1)
-
-        if temp_values.temp0 > 100:
-            current_lifespan0 += int(update_frequency_sec / 60)
-            db_connection.update_temp_sensor_tracking(0, current_lifespan0)
-
-        if temp_values.temp1 > 100:
-            current_lifespan1 += int(update_frequency_sec / 60)
-            db_connection.update_temp_sensor_tracking(1, current_lifespan1)
-
-        # Wenn die Lebensdauer der Sensoren überschritten wurde, wird ein Fehler gesetzt
-        # dies sind 60min * 100 = 100 Stunden
-        if current_lifespan0 > 60 * 100:
-            db_connection.set_error_state(
-                0,
-                True,
-                f"Maximale Lebensdauer überschritten! Er wurde bereits {int(current_lifespan1 / 60)} Stunden betrieben. Bitte ersetzen!",
-            )
-
-        if current_lifespan1 > 60 * 100:
-            db_connection.set_error_state(
-                1,
-                True,
-                f"Maximale Lebensdauer überschritten! Er wurde bereits {int(current_lifespan1 / 60)} Stunden betrieben. Bitte ersetzen!",
-            )
+    def __init__(self, clock: Callable[[], float] = time.monotonic):
+        self._clock = clock
+        self._last: float | None = None
 
-        socketio.sleep(update_frequency_sec)
+    def elapsed(self) -> float:
+        """Returns the seconds since the previous call, 0 on the first call and at most MAX_TICK_GAP_INTERVALS
+        update intervals
+        """
+        now = self._clock()
+        elapsed = now - self._last if self._last is not None else 0.0
+        self._last = now
+        return min(max(elapsed, 0.0), MAX_TICK_GAP_INTERVALS * config.snapshot().UPDATE_INTERVAL)
+
+
+# Temperatures up to this value (cold engine) are not stored
+MIN_STORED_TEMPERATURE = 100
+
+
+class TickRecorder:
+    """Stores every tick while a recording runs, one row with every channel.
+    Temperatures up to MIN_STORED_TEMPERATURE are stored as NULL, their voltages are kept.
+    """
+
+    def __init__(self, is_recording_func: Callable[[], bool]):
+        self.is_recording_func = is_recording_func
+
+    def __call__(self, timestamp_ms: int, data: dict):
+        if self.is_recording_func():
+            cold = {
+                column: None
+                for column in TICK_SENSOR_COLUMNS["temps"]
+                if data[column] is not None and data[column] <= MIN_STORED_TEMPERATURE
+            }
+            db_connection.insert_tick(data | cold if cold else data, timestamp_ms)
+
+
+class LifetimeTracker:
+    """Accumulates the operating time of the temperature sensors above 100 degrees Celsius and stores it in whole minutes.
+    Sets an error once a sensor ran for more than 100 hours.
+    """
 
+    def __init__(self, clock: Callable[[], float] = time.monotonic):
+        self._tick_clock = TickClock(clock)
+        self._hot_ms = [0, 0]
+
+    def __call__(self, timestamp_ms: int, data: dict):
+        elapsed_ms = round(self._tick_clock.elapsed() * 1000)
+
+        for sensor_id, channel in enumerate(("temp1", "temp2")):
+            if data[channel] <= 100:
+                continue
+            self._hot_ms[sensor_id] += elapsed_ms
+            minutes, self._hot_ms[sensor_id] = divmod(self._hot_ms[sensor_id], 60_000)
+            if minutes == 0:
+                continue
+
+            # Through the writer connection, the hub thread never waits for the read pool
+            lifespan = db_connection.add_temp_sensor_runtime(sensor_id, minutes)
+
+            # Wenn die Lebensdauer der Sensoren überschritten wurde, wird ein Fehler gesetzt
+            # dies sind 60min * 100 = 100 Stunden
+            if lifespan > 60 * 100:
+                db_connection.set_error_state(
+                    sensor_id,
+                    True,
+                    f"Maximale Lebensdauer überschritten! Er wurde bereits {int(lifespan / 60)} Stunden betrieben. Bitte ersetzen!",
+                )
+
+
+class OverheatDetector:
+    """Sets an error if a temperature is over 1100 degrees Celsius for more than 2 seconds"""
+
+    def __init__(self, clock: Callable[[], float] = time.monotonic):
+        self._tick_clock = TickClock(clock)
+        # Seconds over 1100 degrees Celsius since the first hot tick, None while below
+        self._hot_seconds: list[float | None] = [None, None]
+
+    def __call__(self, timestamp_ms: int, data: dict):
+        elapsed = self._tick_clock.elapsed()
+        for sensor_id, channel in enumerate(("temp1", "temp2")):
+            if data[channel] <= 1100:
+                self._hot_seconds[sensor_id] = None
+                continue
+
+            if self._hot_seconds[sensor_id] is None:
+                self._hot_seconds[sensor_id] = 0.0
+            else:
+                self._hot_seconds[sensor_id] += elapsed
+            if self._hot_seconds[sensor_id] > 2:
+                db_connection.set_error_state(
+                    sensor_id,
+                    True,
+                    f"Überhitzung! Die Temperatur betrug {data[channel]}°C. Bitte ersetzen!",
+                )
+
+
+class ErrorNotifier:
+    """Notifies the clients if a temperature sensor is in an error state. The state is read from the read pool
+    in a background task, so a busy pool never stalls the hub.
+    """
+
+    def __init__(self, socketio):
+        self.socketio = socketio
+
+    def __call__(self, timestamp_ms: int, data: dict):
+        self.socketio.start_background_task(self.notify)
 
-def check_overheating(socketio, sensors) -> None:
-    """Check for overheading. True if the temperature is over 1100°C for more than 2 seconds
+    def notify(self):
+        for sensor_id in (0, 1):
+            try:
+                error_state, error_msg = db_connection.get_error_state(sensor_id)
+            except TimeoutError as error:
+                write_to_systemd(f"Could not read the error state of sensor {sensor_id}: {error}")
+                continue
+            if error_state:
+                self.socketio.emit(
+                    "info",
+                    {
+                        "msg": f"Achtung der Temperatursensor {sensor_id} hat einen Fehler! Fehlermeldung: {error_msg}",
+                    },
+                )
 
+
+def subscribe_consumers(hub: AcquisitionHub, socketio, is_recording_func: Callable[[], bool]) -> LiveEmitter:
+    """Registers the consumers of the update ticks with the rate each of them needs
+
+    :param hub: Hub publishing the ticks
     :param socketio: SocketIO instance
-    :param sensors: Dictionary containing all sensor instances
+    :param is_recording_func: Function that returns current recording state
+    :return: Emitter of the live values, clients register their subscriptions there
     """
-    start_time0 = datetime.now()
-    start_time1 = datetime.now()
+    live_emitter = LiveEmitter(socketio)
+    hub.subscribe("live", live_emitter)
+    hub.subscribe("recording", TickRecorder(is_recording_func))
+    hub.subscribe("overheating", OverheatDetector())
+    hub.subscribe("lifetime", LifetimeTracker())
+    hub.subscribe("error_state", ErrorNotifier(socketio), interval=30)
+    return live_emitter
 
-    update_frequency_sec = 1
 
-    # Do not add any stop event here, we always want to check for overheating
-    # even if no user is connected to the web interface
-    while True:
-        temp_values = get_temp_values(sensors["temp0"], sensors["temp1"])
-
-        if temp_values.temp0 > 1100:
-            time0 = datetime.now() - start_time0
-        else:
-            start_time0 = datetime.now()
-            time0 = timedelta(seconds=0)
-
-        if temp_values.temp1 > 1100:
-            time1 = datetime.now() - start_time1
-        else:
-            start_time1 = datetime.now()
-            time1 = timedelta(seconds=0)
-
-        if time0 > timedelta(seconds=2):
-            db_connection.set_error_state(
-                0,
-                True,
-                f"Überhitzung! Die Temperatur betrug {temp_values.temp0}°C. Bitte ersetzen!",
-            )
-
-        if time1 > timedelta(seconds=2):
-            db_connection.set_error_state(
-                1,
-                True,
-                f"Überhitzung! Die Temperatur betrug {temp_values.temp1}°C. Bitte ersetzen!",
-            )
+def flush_buffered_values(socketio) -> None:
+    """Writes the buffered sensor values once the oldest one waited ``DB_FLUSH_INTERVAL`` seconds, also when
+    no new values arrive (e.g. the sampling loop stopped). The buffer checks the age only when a row is added.
 
-        socketio.sleep(update_frequency_sec)
+    :param socketio: SocketIO instance
+    """
+    while True:
+        try:
+            db_connection.flush_if_due()
+        except sqlite3.Error:
+            # The rows stay queued, the next check retries them
+            write_to_systemd(f"Flushing buffered values failed: {traceback.format_exc().splitlines()[-1]}")
+        socketio.sleep(max(db_connection.writer.max_delay / 2, 0.1))
 
 
-def check_tmp_sensor_error_state(socketio) -> None:
-    """Checks the error state of the temperature sensors and notifies the client if an error is present
+def delete_old_values(socketio) -> None:
+    """Moves sensor values older than ``DB_ARCHIVE_AELTER_ALS`` days into compressed archive blocks
+    and deletes values older than ``DB_DELETE_AELTER_ALS`` days (rollup buckets after their own horizon, see
+    ``rollup_retention_days``).
+    Runs in small chunks and yields between them so the sampling loop and inserts are never stalled.
+    Afterwards the freed pages are returned to the file system.
 
     :param socketio: SocketIO instance
     """
-    update_frequency_sec = 30
+    update_frequency_sec = 60 * 60
+    chunk_size = 500
 
     while True:
-        error_state0, error_msg0 = db_connection.get_error_state(0)
-        error_state1, error_msg1 = db_connection.get_error_state(1)
-
-        if error_state0:
-            socketio.emit(
-                "info",
-                {
-                    "msg": f"Achtung der Temperatursensor 0 hat einen Fehler! Fehlermeldung: {error_msg0}",
-                },
-            )
-
-        if error_state1:
-            socketio.emit(
-                "info",
-                {
-                    "msg": f"Achtung der Temperatursensor 1 hat einen Fehler! Fehlermeldung: {error_msg1}",
-                },
-            )
+        archive_older_than_days = getattr(config, "DB_ARCHIVE_AELTER_ALS")
+        archived = 0
+        while (archived_chunk := db_connection.archive_values_older_than(archive_older_than_days)) > 0:
+            archived += archived_chunk
+            socketio.sleep(0.1)
+
+        if archived > 0:
+            write_to_systemd(f"Archived {archived} values older than {archive_older_than_days} days")
+
+        deleted = 0
+
+        for table in RETENTION_TABLES:
+            older_than_days = retention_days(table)
+            table_deleted = 0
+            while (deleted_chunk := db_connection.delete_values_older_than(table, older_than_days, chunk_size)) > 0:
+                table_deleted += deleted_chunk
+                socketio.sleep(0.1)
+
+            if table_deleted > 0:
+                write_to_systemd(f"Deleted {table_deleted} rows of {table} older than {older_than_days} days")
+            deleted += table_deleted
+
+        if archived > 0 or deleted > 0:
+            while db_connection.incremental_vacuum() > 0:
+                socketio.sleep(0.1)
 
         socketio.sleep(update_frequency_sec)
@@ -0,0 +1,139 @@
+"""Single point of sensor acquisition
+
+The hub owns the sampling loop: the sensors (or the ring of the acquisition process) are read once per update
+tick and every tick is handed to the registered consumers. A consumer declares the minimum interval it needs,
+e.g. the lifetime tracking only every minute, so adding a consumer never adds a read on the SPI bus.
+
+The intervals are measured on the monotonic clock: the tick timestamps follow the system time, which jumps when
+a client sets it on connect.
+"""
+
+import threading
+import time
+import traceback
+from typing import Callable
+from typing import Iterable
+
+from mama.utils.systemd import write_to_systemd
+
+# Consumer of the update ticks: called with the time of the tick in epoch milliseconds and the sample
+Consumer = Callable[[int, dict], None]
+
+
+class Subscription:
+    """Registered consumer and its delivery counters"""
+
+    __slots__ = ("name", "callback", "interval", "last_delivery", "deliveries", "errors", "busy_seconds")
+
+    def __init__(self, name: str, callback: Consumer, interval: float):
+        self.name = name
+        self.callback = callback
+        self.interval = interval
+        # Monotonic time of the last delivery in seconds
+        self.last_delivery: float | None = None
+        self.deliveries = 0
+        self.errors = 0
+        self.busy_seconds = 0.0
+
+    def is_due(self, now: float) -> bool:
+        """
+        :param now: Monotonic time in seconds
+        """
+        return self.last_delivery is None or now - self.last_delivery >= self.interval
+
+
+class AcquisitionHub:
+    """Publishes every update tick to the subscribed consumers"""
+
+    def __init__(self, clock: Callable[[], float] = time.monotonic):
+        """
+        :param clock: Monotonic clock in seconds for the intervals of the consumers
+        """
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._subscriptions: dict[str, Subscription] = {}
+        self._latest: tuple[int, dict] | None = None
+        self._ticks = 0
+
+    def subscribe(self, name: str, callback: Consumer, interval: float = 0.0) -> Subscription:
+        """Registers a consumer, replacing one with the same name
+
+        :param name: Name of the consumer
+        :param callback: Called with the time of the tick in epoch milliseconds and the sample
+        :param interval: Minimum seconds between two deliveries, 0 for every tick
+        :return: The subscription
+        """
+        subscription = Subscription(name, callback, interval)
+        with self._lock:
+            self._subscriptions[name] = subscription
+        return subscription
+
+    def unsubscribe(self, name: str):
+        with self._lock:
+            self._subscriptions.pop(name, None)
+
+    @property
+    def latest(self) -> tuple[int, dict] | None:
+        """Time in epoch milliseconds and sample of the newest tick, None before the first one"""
+        return self._latest
+
+    def publish(self, timestamp_ms: int, sample: dict):
+        """Hands one tick to every due consumer. A failing consumer is reported and does not affect the others.
+
+        :param timestamp_ms: Time of the tick in epoch milliseconds
+        :param sample: Value of every channel
+        """
+        with self._lock:
+            self._latest = (timestamp_ms, sample)
+            self._ticks += 1
+            subscriptions = list(self._subscriptions.values())
+
+        now = self._clock()
+        for subscription in subscriptions:
+            if not subscription.is_due(now):
+                continue
+            subscription.last_delivery = now
+            start = time.perf_counter()
+            try:
+                subscription.callback(timestamp_ms, sample)
+            except Exception:
+                subscription.errors += 1
+                write_to_systemd(f"Consumer {subscription.name} failed:\n{traceback.format_exc()}")
+            subscription.deliveries += 1
+            subscription.busy_seconds += time.perf_counter() - start
+
+    def run(self, ticks: Iterable[tuple[int, dict]]):
+        """Publishes the ticks of a source until it is exhausted
+
+        :param ticks: Source of (time in epoch milliseconds, sample)
+        """
+        for timestamp_ms, sample in ticks:
+            self.publish(timestamp_ms, sample)
+
+    def get_stats(self) -> dict:
+        """Returns the number of ticks and the deliveries of every consumer
+
+        :return: Dictionary with the current counters
+        """
+        with self._lock:
+            subscriptions = list(self._subscriptions.values())
+            ticks = self._ticks
+        return {
+            "ticks": ticks,
+            "consumers": {
+                subscription.name: {
+                    "interval_s": subscription.interval,
+                    "deliveries": subscription.deliveries,
+                    "errors": subscription.errors,
+                    "avg_ms": (
+                        round(subscription.busy_seconds * 1000 / subscription.deliveries, 3)
+                        if subscription.deliveries
+                        else 0.0
+                    ),
+                }
+                for subscription in subscriptions
+            },
+        }
+
+
+acquisition_hub = AcquisitionHub()
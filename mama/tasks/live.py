@@ -0,0 +1,234 @@
+"""Live values for the connected clients
+
+Every client subscribes to one or more streams: a set of fields with a maximum rate, e.g. the lambda values with
+every tick and the temperatures once per second. All subscriptions share the wire format the client chose
+(see ``LIVE_FORMATS``). Clients with the same subscription share one stream and its Socket.IO room, so every
+payload is built and encoded once per distinct subscription, not once per client.
+
+The ``newValues`` event carries the payload, the id of the stream and the sequence number of the newest tick in
+``live_buffer``. A reconnecting client sends the last sequence number it got and receives the ticks it missed from
+the buffer (see ``LiveEmitter.backfill``).
+"""
+
+import math
+import time
+import uuid
+import zlib
+from typing import Callable
+
+from mama.config import config
+from mama.models.ring_buffer import CHANNELS
+from mama.models.ring_buffer import live_buffer
+from mama.sensors.readings import SAMPLE_FIELDS
+from mama.sensors.readings import STAT_FIELDS
+from mama.utils.binary_format import LIVE_VERSION
+from mama.utils.binary_format import LiveEncoder
+
+# Wire formats of the newValues event (see binary_format.LiveEncoder)
+LIVE_FORMATS = ("json", "float32", "float32-delta")
+
+# Names that can be used instead of single fields in a subscription
+LIVE_CHANNEL_GROUPS = {
+    "lambda": ("lamda1", "lamda2", "volt1", "volt2", "afr1", "afr2"),
+    "temps": ("temp1", "temp2", "temp1_voltage", "temp2_voltage"),
+    "stats": STAT_FIELDS,
+}
+
+# Streams one client may subscribe to
+MAX_SUBSCRIPTIONS = 4
+
+# Ticks arrive with some jitter, a tick this close to the rate interval still counts as due
+_RATE_TOLERANCE = 0.9
+
+
+def resolve_fields(channels) -> tuple[str, ...]:
+    """Returns the fields of a subscription in the order of SAMPLE_FIELDS, unknown names are ignored
+
+    :param channels: Field names and names of LIVE_CHANNEL_GROUPS, None for every field
+    :return: Fields, every field if none of the names is known
+    """
+    if not channels:
+        return SAMPLE_FIELDS
+    if isinstance(channels, str):
+        channels = [channels]
+    requested = set()
+    for channel in channels:
+        requested.update(LIVE_CHANNEL_GROUPS.get(channel, (channel,)))
+    return tuple(field for field in SAMPLE_FIELDS if field in requested) or SAMPLE_FIELDS
+
+
+class LiveStream:
+    """Ticks of one subscription, shared by all clients in its room"""
+
+    def __init__(
+        self, live_format: str, fields: tuple[str, ...], rate: float, clock: Callable[[], float] = time.monotonic
+    ):
+        """
+        :param live_format: Wire format, one of LIVE_FORMATS
+        :param fields: Fields of the payload
+        :param rate: Maximum payloads per second, 0 for every tick
+        :param clock: Monotonic clock in seconds, the rate and the batches do not follow the tick timestamps
+            because the system time is set to the browser time on every connect
+        """
+        self.live_format = live_format
+        self.fields = fields
+        self.rate = rate
+        self.id = f"live-{live_format}-{zlib.crc32(','.join(fields).encode()):08x}-{rate:g}"
+        self.encoder = LiveEncoder(fields, delta=live_format == "float32-delta") if live_format != "json" else None
+        self.clients: set[str] = set()
+        self._clock = clock
+        self._last_tick: float | None = None
+        self._batch: list[tuple[int, dict]] = []
+        self._batch_start = 0.0
+
+    def describe(self) -> dict:
+        return {"id": self.id, "fields": list(self.fields), "rate": self.rate}
+
+    def publish(self, socketio, timestamp_ms: int, data: dict, sequence: int, batch_interval: float):
+        """Emits a tick to the room if it is due for the rate of the stream
+
+        :param socketio: SocketIO instance
+        :param timestamp_ms: Time of the tick in epoch milliseconds
+        :param data: Value of every field
+        :param sequence: Sequence number of the tick in live_buffer
+        :param batch_interval: Seconds of ticks collected in one binary frame
+        """
+        now = self._clock()
+        if self.rate and self._last_tick is not None and now - self._last_tick < _RATE_TOLERANCE / self.rate:
+            return
+        self._last_tick = now
+
+        if self.encoder is None:
+            socketio.emit("newValues", ({field: data[field] for field in self.fields}, self.id, sequence), to=self.id)
+            return
+
+        if not self._batch:
+            self._batch_start = now
+        self._batch.append((timestamp_ms, data))
+        if now - self._batch_start < batch_interval:
+            return
+        batch, self._batch = self._batch, []
+        socketio.emit("newValues", (self.encoder.encode(batch), self.id, sequence), to=self.id)
+
+
+class LiveEmitter:
+    """Buffers every tick for the history of new clients and emits it to the subscribed streams.
+    Binary frames collect the ticks of ``LIVE_BATCH_INTERVAL`` seconds, JSON is sent per tick.
+    """
+
+    def __init__(self, socketio):
+        self.socketio = socketio
+        self.streams: dict[str, LiveStream] = {}
+        self.clients: dict[str, list[str]] = {}
+        # Sequence numbers restart with the process, a client sends this id along with its last sequence number
+        self.buffer_id = uuid.uuid4().hex[:8]
+
+    def subscribe(self, sid: str, live_format: str, subscriptions: list | None = None) -> tuple[list[str], dict]:
+        """Replaces the subscriptions of a client
+
+        :param sid: Session id of the client
+        :param live_format: Requested format, unknown formats fall back to json
+        :param subscriptions: Dicts with the keys "channels" (see resolve_fields) and "rate" (maximum payloads per
+            second, 0 or missing for every tick). None subscribes to every field with every tick.
+        :return: Rooms the client has to leave and the negotiated format with the streams, the client has to join
+            the room of every stream (its id)
+        """
+        if live_format not in LIVE_FORMATS:
+            live_format = "json"
+
+        if not isinstance(subscriptions, list) or not subscriptions:
+            subscriptions = [{}]
+
+        left = self.remove_client(sid)
+        streams = []
+        for subscription in subscriptions[:MAX_SUBSCRIPTIONS]:
+            if not isinstance(subscription, dict):
+                subscription = {}
+            try:
+                rate = max(float(subscription.get("rate") or 0), 0.0)
+            except (TypeError, ValueError):
+                rate = 0.0
+            stream = LiveStream(live_format, resolve_fields(subscription.get("channels")), rate)
+            stream = self.streams.setdefault(stream.id, stream)
+            stream.clients.add(sid)
+            if stream.encoder is not None:
+                # A joining delta client needs a key frame
+                stream.encoder.reset()
+            if stream not in streams:
+                streams.append(stream)
+
+        self.clients[sid] = [stream.id for stream in streams]
+        left = [room for room in left if room not in self.clients[sid]]
+        return left, {
+            "format": live_format,
+            "version": LIVE_VERSION,
+            "buffer": self.buffer_id,
+            "streams": [stream.describe() for stream in streams],
+        }
+
+    def backfill(self, sid: str, sequence=0, buffer_id: str | None = None) -> tuple[dict | list[bytes], dict] | None:
+        """Returns the buffered ticks a (re)connecting client missed, at most ``LIVE_BACKFILL_SECONDS``.
+        Only the fields of its subscriptions that are kept in live_buffer (see ring_buffer.CHANNELS) are sent.
+
+        :param sid: Session id of the subscribed client
+        :param sequence: Last sequence number the client got, 0 for none
+        :param buffer_id: Buffer the sequence number belongs to (liveFormat "buffer"), another one counts as none
+        :return: Payload and its description (fields, first and last sequence number) or None if nothing is missed.
+            The payload is the columns of ``live_buffer.since`` for json, else LiveEncoder frames: one frame with
+            every tick for float32, a key frame with the first tick and a delta frame with the rest for float32-delta.
+        """
+        streams = [self.streams[room] for room in self.clients.get(sid, []) if room in self.streams]
+        fields = tuple(field for field in CHANNELS if any(field in stream.fields for stream in streams))
+        settings = config.snapshot()
+        if not fields or settings.LIVE_BACKFILL_SECONDS <= 0:
+            return None
+
+        try:
+            sequence = int(sequence) if buffer_id == self.buffer_id else 0
+        except (TypeError, ValueError):
+            sequence = 0
+        # One tick per update interval
+        max_ticks = math.ceil(settings.LIVE_BACKFILL_SECONDS / settings.UPDATE_INTERVAL)
+        columns = live_buffer.since(max(sequence, live_buffer.sequence - max_ticks), fields)
+        if not columns["timestamps"]:
+            return None
+
+        description = {
+            "fields": list(fields),
+            "first_sequence": columns["first_sequence"],
+            "sequence": columns["sequence"],
+        }
+        live_format = streams[0].live_format
+        if live_format == "json":
+            return columns, description
+
+        ticks = [
+            (timestamp_ms, {field: columns[field][index] for field in fields})
+            for index, timestamp_ms in enumerate(columns["timestamps"])
+        ]
+        encoder = LiveEncoder(fields, delta=live_format == "float32-delta")
+        if not encoder.delta or len(ticks) == 1:
+            return [encoder.encode(ticks)], description
+        return [encoder.encode(ticks[:1]), encoder.encode(ticks[1:])], description
+
+    def remove_client(self, sid: str) -> list[str]:
+        """Drops the subscriptions of a client, streams without clients are removed
+
+        :param sid: Session id of the client
+        :return: Rooms of the dropped subscriptions
+        """
+        rooms = self.clients.pop(sid, [])
+        for room in rooms:
+            stream = self.streams.get(room)
+            if stream is None:
+                continue
+            stream.clients.discard(sid)
+            if not stream.clients:
+                del self.streams[room]
+        return rooms
+
+    def __call__(self, timestamp_ms: int, data: dict):
+        sequence = live_buffer.append(timestamp_ms, data)
+        batch_interval = config.snapshot().LIVE_BATCH_INTERVAL
+        for stream in list(self.streams.values()):
+            stream.publish(self.socketio, timestamp_ms, data, sequence, batch_interval)
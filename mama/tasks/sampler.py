@@ -0,0 +1,143 @@
+"""Deadline based sampling clock
+
+Sleeping a fixed time after every read makes the real period ``interval + read time + scheduler latency``,
+so the sampling rate drifts below the configured one. The sampler instead schedules every sample at an
+absolute deadline on the monotonic clock. A late sample is taken immediately and the following ones keep
+their original deadlines (catch up). If the loop falls more than a whole interval behind, the missed
+deadlines are skipped instead of being sampled back to back.
+"""
+
+import threading
+import time
+from collections import deque
+from typing import Callable
+
+
+def _percentile(values: list[float], percent: float) -> float:
+    """Nearest-rank percentile of sorted values"""
+    if not values:
+        return 0.0
+    return values[min(len(values) - 1, int(round(percent / 100 * (len(values) - 1))))]
+
+
+class DeadlineSampler:
+    """Clock for a sampling loop with a fixed interval, records the real intervals between samples"""
+
+    def __init__(
+        self,
+        interval: float,
+        history: int = 1000,
+        clock: Callable[[], float] = time.monotonic,
+        sleep: Callable[[float], None] = time.sleep,
+    ):
+        """Creates the sampler, the first call of ``wait`` returns immediately
+
+        :param interval: Target interval between two samples in seconds
+        :param history: Number of recent intervals kept for the statistics
+        :param clock: Monotonic clock in seconds
+        :param sleep: Sleep function in seconds
+        """
+        if interval <= 0:
+            raise ValueError("The sampling interval must be greater than 0")
+
+        self.interval = interval
+        self._clock = clock
+        self._sleep = sleep
+        self._next_deadline: float | None = None
+        self._last_sample: float | None = None
+        self._intervals: deque[float] = deque(maxlen=history)
+        self._lock = threading.Lock()
+        self._samples = 0
+        self._late = 0
+        self._skipped = 0
+
+    def wait(self) -> float:
+        """Blocks until the deadline of the next sample
+
+        :return: Time of the sample on the monotonic clock
+        """
+        now = self._clock()
+        if self._next_deadline is None:
+            self._next_deadline = now
+
+        delay = self._next_deadline - now
+        skipped = 0
+        if delay > 0:
+            self._sleep(delay)
+            now = self._clock()
+        elif -delay >= self.interval:
+            # More than a whole interval behind, drop the missed deadlines
+            skipped = int(-delay // self.interval)
+            self._next_deadline += skipped * self.interval
+
+        with self._lock:
+            if self._last_sample is not None:
+                self._intervals.append(now - self._last_sample)
+            self._samples += 1
+            self._late += delay < 0
+            self._skipped += skipped
+
+        self._last_sample = now
+        self._next_deadline += self.interval
+        return now
+
+    @property
+    def next_deadline(self) -> float | None:
+        """Deadline of the next sample on the monotonic clock, None before the first sample"""
+        return self._next_deadline
+
+    def reset(self):
+        """Starts a new schedule, e.g. after the loop was paused"""
+        self._next_deadline = None
+        self._last_sample = None
+
+    def get_stats(self) -> dict:
+        """Returns the configured and the effective rate and the distribution of the real intervals
+
+        :return: Dictionary with the current statistics, times in milliseconds
+        """
+        with self._lock:
+            intervals = sorted(self._intervals)
+            samples, late, skipped = self._samples, self._late, self._skipped
+
+        jitter = sorted(abs(interval - self.interval) for interval in intervals)
+        return {
+            "interval_ms": round(self.interval * 1000, 3),
+            "rate_hz": round(1 / self.interval, 3),
+            "effective_rate_hz": round(len(intervals) / sum(intervals), 3) if intervals else 0.0,
+            "samples": samples,
+            "late": late,
+            "skipped": skipped,
+            "interval_p50_ms": round(_percentile(intervals, 50) * 1000, 3),
+            "interval_p99_ms": round(_percentile(intervals, 99) * 1000, 3),
+            "interval_max_ms": round(intervals[-1] * 1000, 3) if intervals else 0.0,
+            "jitter_p50_ms": round(_percentile(jitter, 50) * 1000, 3),
+            "jitter_p99_ms": round(_percentile(jitter, 99) * 1000, 3),
+            "jitter_max_ms": round(jitter[-1] * 1000, 3) if jitter else 0.0,
+        }
+
+
+_samplers: dict[str, DeadlineSampler] = {}
+_samplers_lock = threading.Lock()
+
+
+def register_sampler(name: str, sampler: DeadlineSampler) -> DeadlineSampler:
+    """Makes the statistics of a sampler available in ``get_sampler_stats``, replacing one with the same name
+
+    :param name: Name of the sampling loop
+    :param sampler: Sampler
+    :return: The registered sampler
+    """
+    with _samplers_lock:
+        _samplers[name] = sampler
+    return sampler
+
+
+def get_sampler_stats() -> dict[str, dict]:
+    """Returns the statistics of all registered samplers
+
+    :return: Statistics by sampler name
+    """
+    with _samplers_lock:
+        samplers = dict(_samplers)
+    return {name: sampler.get_stats() for name, sampler in samplers.items()}
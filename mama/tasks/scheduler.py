@@ -0,0 +1,97 @@
+"""Multi-rate scheduling of the sensor channels
+
+Every channel gets its own ``DeadlineSampler`` with the configured rate. The scheduler sleeps until the earliest
+deadline and returns every channel that is due at that moment, so channels sharing a deadline are read in one
+SPI transaction and no channel is read more often than configured.
+"""
+
+import time
+from typing import Callable
+
+from mama.tasks.sampler import DeadlineSampler
+from mama.tasks.sampler import register_sampler
+from mama.utils.systemd import write_to_systemd
+
+# Bus time of one MCP3008 conversion: 24 clocks at 1 MHz
+SPI_CONVERSION_SECONDS = 24 / 1_000_000
+# Estimated cost of one transaction: ioctl, wake up and one iteration of the Python loop
+SPI_TRANSACTION_SECONDS = 200e-6
+# Share of the time the sampling loop may spend on the bus, the rest is left for the other tasks
+SPI_BUDGET = 0.8
+
+# Channels due within this many seconds of the earliest deadline are read in the same transaction
+_COALESCE_SECONDS = 0.0005
+
+
+def estimate_spi_load(rates: dict[str, float]) -> float:
+    """Estimates the share of time the bus and the sampling loop are busy, assuming no channels are coalesced
+
+    :param rates: Samples per second by channel
+    :return: Load, 1.0 means the requested rates cannot be delivered
+    """
+    return sum(rates.values()) * (SPI_CONVERSION_SECONDS + SPI_TRANSACTION_SECONDS)
+
+
+class ChannelScheduler:
+    """Interleaves the reads of channels with different rates"""
+
+    def __init__(
+        self,
+        rates: dict[str, float],
+        register: bool = False,
+        clock: Callable[[], float] = time.monotonic,
+        sleep: Callable[[float], None] = time.sleep,
+    ):
+        """Creates one sampler per channel and warns if the rates exceed the SPI budget
+
+        :param rates: Samples per second by channel
+        :param register: Make the statistics of every channel available in ``get_sampler_stats``
+        :param clock: Monotonic clock in seconds
+        :param sleep: Sleep function in seconds
+        :raises ValueError: If a rate is not greater than 0
+        """
+        if any(rate <= 0 for rate in rates.values()):
+            raise ValueError("The sampling rate of every channel must be greater than 0")
+
+        self.rates = dict(rates)
+        self.clock = clock
+        self._sleep = sleep
+        # The scheduler sleeps, the samplers only keep the deadlines and statistics
+        self.samplers = {
+            channel: DeadlineSampler(1 / rate, clock=clock, sleep=lambda _: None) for channel, rate in rates.items()
+        }
+        if register:
+            for channel, sampler in self.samplers.items():
+                register_sampler(channel, sampler)
+
+        self.load = estimate_spi_load(rates)
+        if self.load > SPI_BUDGET:
+            write_to_systemd(
+                f"Warning: the channel rates {self.rates} need about {self.load:.0%} of the SPI bus and sampling loop"
+                f" (budget {SPI_BUDGET:.0%}), samples will be late or skipped"
+            )
+
+    def wait(self, until: float | None = None) -> list[str]:
+        """Blocks until the next channel is due
+
+        :param until: Time on the monotonic clock after which no channel is returned
+        :return: Channels to read now, empty if the next deadline is after ``until`` (returns at ``until``)
+        """
+        now = self.clock()
+        deadline = min(
+            now if sampler.next_deadline is None else sampler.next_deadline for sampler in self.samplers.values()
+        )
+        if until is not None and deadline > until:
+            if until > now:
+                self._sleep(until - now)
+            return []
+
+        if deadline > now:
+            self._sleep(deadline - now)
+
+        due = []
+        for channel, sampler in self.samplers.items():
+            if sampler.next_deadline is None or sampler.next_deadline <= deadline + _COALESCE_SECONDS:
+                sampler.wait()
+                due.append(channel)
+        return due
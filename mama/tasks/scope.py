@@ -0,0 +1,177 @@
+"""Raw waveform streaming ("scope" mode)
+
+The live values are averages of one update window. For diagnosing oscillating sensors a client can opt in to the
+raw lambda samples: ``ScheduledReader`` hands the samples of every window to the ``ScopeStreamer``, which encodes
+them once (see ``binary_format.encode_scope``) and queues the frame for every scope client.
+
+Every client acknowledges its ``scopeFrame`` events. At most ``SCOPE_MAX_IN_FLIGHT`` frames are unacknowledged per
+client, the next ones wait in a queue of ``SCOPE_QUEUE_FRAMES``. If the queue overflows the oldest frame is dropped
+and the client only gets every second frame (down to every ``SCOPE_MAX_DECIMATION``-th). After
+``SCOPE_RECOVERY_FRAMES`` acknowledgements with an empty queue the decimation is halved again. The sampling loop
+only appends to the queues, a slow client never blocks it or the other clients.
+"""
+
+import threading
+import time
+from array import array
+from collections import deque
+from typing import Callable
+
+from mama.utils.binary_format import encode_scope
+from mama.utils.binary_format import SCOPE_VERSION
+
+# Channels of the scope frames, in this order
+SCOPE_CHANNELS = ("lamda1", "lamda2")
+
+# Every scope client costs bandwidth on the access point of the Pi
+SCOPE_MAX_CLIENTS = 4
+# Unacknowledged frames per client
+SCOPE_MAX_IN_FLIGHT = 2
+# Frames waiting for an acknowledgement per client
+SCOPE_QUEUE_FRAMES = 4
+# Only every n-th frame is sent to a client that falls behind
+SCOPE_MAX_DECIMATION = 16
+# Acknowledgements with an empty queue before the decimation is halved
+SCOPE_RECOVERY_FRAMES = 4
+# Frames without acknowledgement for this many seconds are assumed lost
+SCOPE_ACK_TIMEOUT = 5.0
+
+
+class ScopeClient:
+    """Send queue and counters of one scope client"""
+
+    __slots__ = ("sid", "queue", "in_flight", "last_activity", "decimation", "recovered", "sent", "dropped", "skipped")
+
+    def __init__(self, sid: str, now: float):
+        self.sid = sid
+        self.queue: deque[bytes] = deque()
+        self.in_flight = 0
+        self.last_activity = now
+        self.decimation = 1
+        self.recovered = 0
+        self.sent = 0
+        self.dropped = 0
+        self.skipped = 0
+
+    def describe(self) -> dict:
+        return {
+            "queued": len(self.queue),
+            "in_flight": self.in_flight,
+            "decimation": self.decimation,
+            "sent": self.sent,
+            "dropped": self.dropped,
+            "skipped": self.skipped,
+        }
+
+
+class ScopeStreamer:
+    """Distributes the raw samples of every update window to the scope clients"""
+
+    def __init__(self, socketio=None, clock: Callable[[], float] = time.monotonic):
+        """
+        :param socketio: SocketIO instance, can be set later (see ``scope_streamer``)
+        :param clock: Monotonic clock in seconds
+        """
+        self.socketio = socketio
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._clients: dict[str, ScopeClient] = {}
+        self._frames = 0
+
+    @property
+    def active(self) -> bool:
+        """True if at least one client wants the raw samples, the reader only collects them then"""
+        return bool(self._clients)
+
+    def add_client(self, sid: str) -> dict | None:
+        """Starts streaming to a client
+
+        :param sid: Session id of the client
+        :return: Format version and channel order of the frames, None if there are too many scope clients
+        """
+        with self._lock:
+            if sid not in self._clients:
+                if len(self._clients) >= SCOPE_MAX_CLIENTS:
+                    return None
+                self._clients[sid] = ScopeClient(sid, self._clock())
+        return {"version": SCOPE_VERSION, "channels": list(SCOPE_CHANNELS)}
+
+    def remove_client(self, sid: str):
+        with self._lock:
+            self._clients.pop(sid, None)
+
+    def publish(self, window_start_ms: int, channels: dict[str, tuple[array, array, array]]):
+        """Encodes the samples of one window and queues the frame for every client that is due
+
+        :param window_start_ms: Start of the window in epoch milliseconds
+        :param channels: float32 arrays of (milliseconds since the window start, voltages, lambda values) by channel
+        """
+        frame = encode_scope(window_start_ms, channels)
+        sends = []
+        with self._lock:
+            self._frames += 1
+            now = self._clock()
+            for client in self._clients.values():
+                if self._frames % client.decimation:
+                    client.skipped += 1
+                    continue
+                if client.in_flight and now - client.last_activity > SCOPE_ACK_TIMEOUT:
+                    client.in_flight = 0
+                if len(client.queue) >= SCOPE_QUEUE_FRAMES:
+                    client.queue.popleft()
+                    client.dropped += 1
+                    client.decimation = min(client.decimation * 2, SCOPE_MAX_DECIMATION)
+                    client.recovered = 0
+                client.queue.append(frame)
+                sends.extend(self.__drain(client, now))
+
+        for sid, queued_frame in sends:
+            self.__emit(sid, queued_frame)
+
+    def acknowledge(self, sid: str):
+        """Called when a client acknowledged a frame, sends the next queued one
+
+        :param sid: Session id of the client
+        """
+        with self._lock:
+            client = self._clients.get(sid)
+            if client is None:
+                return
+            now = self._clock()
+            client.in_flight = max(client.in_flight - 1, 0)
+            client.last_activity = now
+            if not client.queue:
+                client.recovered += 1
+                if client.recovered >= SCOPE_RECOVERY_FRAMES and client.decimation > 1:
+                    client.decimation //= 2
+                    client.recovered = 0
+            sends = self.__drain(client, now)
+
+        for sid, queued_frame in sends:
+            self.__emit(sid, queued_frame)
+
+    def get_stats(self) -> dict:
+        """Returns the number of frames and the queue and counters of every client
+
+        :return: Dictionary with the current counters
+        """
+        with self._lock:
+            clients = {sid: client.describe() for sid, client in self._clients.items()}
+            return {"frames": self._frames, "clients": clients}
+
+    @staticmethod
+    def __drain(client: ScopeClient, now: float) -> list[tuple[str, bytes]]:
+        sends = []
+        while client.queue and client.in_flight < SCOPE_MAX_IN_FLIGHT:
+            client.in_flight += 1
+            client.sent += 1
+            client.last_activity = now
+            sends.append((client.sid, client.queue.popleft()))
+        return sends
+
+    def __emit(self, sid: str, frame: bytes):
+        self.socketio.emit("scopeFrame", frame, to=sid, callback=lambda *_: self.acknowledge(sid))
+
+
+# Streamer of the application, the app sets its SocketIO instance
+scope_streamer = ScopeStreamer()
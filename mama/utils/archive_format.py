@@ -0,0 +1,124 @@
+"""
+Compressed block encoding for archived sensor values
+
+A block holds up to a few thousand rows of one series: a timestamp column and one or more value columns.
+Layout (little-endian)::
+
+    offset 0   4s   magic "MAMZ"
+    offset 4   B    format version
+    offset 5   B    number of value columns c
+    offset 6   2x   padding
+    offset 8   I    number of rows n
+    offset 12       2c + 1 sections, each a uint32 length followed by zlib data:
+                    timestamps as int64 deltas to the previous timestamp (the first one to 0)
+                    per value column float64 bit patterns XORed with the previous value
+                    per value column one byte per row, 1 where the value is NULL (stored as 0.0)
+
+Version 1 blocks have no NULL sections and are still decoded.
+
+Consecutive timestamps differ by an almost constant interval and consecutive sensor values share sign,
+exponent and leading mantissa bits, so both encodings produce mostly zero bytes. Before compression the
+bytes are shuffled (all first bytes, then all second bytes, ...) so zlib sees long runs. Every column is
+compressed on its own and can be decoded without touching the others. The encoding is lossless.
+"""
+
+import struct
+import sys
+import zlib
+from array import array
+from typing import Iterable
+from typing import Sequence
+
+MAGIC = b"MAMZ"
+VERSION = 2
+_VERSIONS = (1, 2)
+
+_HEADER = struct.Struct("<4sBB2xI")
+_SECTION = struct.Struct("<I")
+_WORD_SIZE = 8
+
+
+def encode_block(timestamps: Sequence[int], columns: Sequence[Sequence[float | None]]) -> bytes:
+    """Encodes a timestamp column and its value columns into one compressed block
+
+    :param timestamps: Timestamps in epoch milliseconds, ascending
+    :param columns: Value columns, each as long as ``timestamps``, may contain None
+    :return: Encoded bytes
+    """
+    count = len(timestamps)
+    if any(len(column) != count for column in columns):
+        raise ValueError("All columns of a block need the same number of rows")
+
+    deltas = array("q", timestamps)
+    for i in range(count - 1, 0, -1):
+        deltas[i] -= deltas[i - 1]
+
+    sections = [_compress(deltas)]
+    masks = []
+    for column in columns:
+        mask = bytes(value is None for value in column)
+        bits = array("Q", array("d", (0.0 if value is None else value for value in column)).tobytes())
+        for i in range(count - 1, 0, -1):
+            bits[i] ^= bits[i - 1]
+        sections.append(_compress(bits))
+        masks.append(zlib.compress(mask, 6))
+    sections.extend(masks)
+
+    header = _HEADER.pack(MAGIC, VERSION, len(columns), count)
+    return b"".join([header, *(_SECTION.pack(len(section)) + section for section in sections)])
+
+
+def decode_block(data: bytes, columns: Iterable[int] | None = None) -> tuple[list[int], list[list[float | None]]]:
+    """Decodes a block, optionally only some of its value columns
+
+    :param data: Encoded block
+    :param columns: Indices of the value columns to decode, all if None
+    :return: Timestamps and the requested value columns, None for NULL values
+    """
+    magic, version, column_count, count = _HEADER.unpack_from(data)
+    if magic != MAGIC or version not in _VERSIONS:
+        raise ValueError("Unsupported archive block")
+
+    sections = []
+    offset = _HEADER.size
+    for _ in range(column_count + 1 if version == 1 else 2 * column_count + 1):
+        (length,) = _SECTION.unpack_from(data, offset)
+        offset += _SECTION.size
+        sections.append(data[offset : offset + length])
+        offset += length
+
+    timestamps = _decompress(sections[0], "q", count)
+    for i in range(1, count):
+        timestamps[i] += timestamps[i - 1]
+
+    values = []
+    for index in range(column_count) if columns is None else columns:
+        bits = _decompress(sections[index + 1], "Q", count)
+        for i in range(1, count):
+            bits[i] ^= bits[i - 1]
+        column = array("d", bits.tobytes()).tolist()
+        mask = zlib.decompress(sections[column_count + index + 1]) if version > 1 else b""
+        if any(mask):
+            column = [None if is_null else value for value, is_null in zip(column, mask)]
+        values.append(column)
+
+    return timestamps.tolist(), values
+
+
+def _compress(words: array) -> bytes:
+    if sys.byteorder == "big":
+        words.byteswap()
+    raw = words.tobytes()
+    shuffled = b"".join(raw[byte::_WORD_SIZE] for byte in range(_WORD_SIZE))
+    return zlib.compress(shuffled, 6)
+
+
+def _decompress(section: bytes, typecode: str, count: int) -> array:
+    shuffled = zlib.decompress(section)
+    raw = bytearray(count * _WORD_SIZE)
+    for byte in range(_WORD_SIZE):
+        raw[byte::_WORD_SIZE] = shuffled[byte * count : (byte + 1) * count]
+    words = array(typecode, raw)
+    if sys.byteorder == "big":
+        words.byteswap()
+    return words
@@ -0,0 +1,167 @@
+"""
+Compact binary encodings of history rows and live update ticks
+
+History layout (little-endian)::
+
+    offset 0   4s   magic "MAMH"
+    offset 4   B    format version
+    offset 5   3x   padding
+    offset 8   I    number of rows n
+    offset 12  4x   padding
+    offset 16       int64[n]   timestamps in epoch milliseconds
+                    float32[n] values
+                    uint8[n]   sensor ids
+
+The timestamp column starts at offset 16 and the value column at a multiple of 8,
+so the browser can map both directly onto typed arrays without copying.
+
+Live frame layout of the ``newValues`` event (little-endian), fields in the order negotiated on connect::
+
+    offset 0   4s   magic "MAML"
+    offset 4   B    format version
+    offset 5   B    flags, bit 0: delta frame
+    offset 6   H    number of ticks k
+    offset 8   I    number of fields n
+    offset 12  4x   padding
+    offset 16       int64[k]   timestamps in epoch milliseconds
+                    k records
+
+A record of a key frame is float32[n]. A record of a delta frame is a bit mask of the fields that changed since
+the previous tick (uint32[ceil(n / 32)], bit i of word i // 32 for field i) followed by float32 values of the
+changed fields only.
+
+Scope frame layout of the ``scopeFrame`` event (little-endian), raw samples of one update window::
+
+    offset 0   4s   magic "MAMS"
+    offset 4   B    format version
+    offset 5   B    number of channels c
+    offset 6   2x   padding
+    offset 8   q    start of the window in epoch milliseconds
+    offset 16       uint32[c]  number of samples n of every channel
+                    per channel: float32[n] milliseconds since the window start, float32[n] voltages,
+                    float32[n] lambda values
+"""
+
+import gzip
+import struct
+import sys
+from array import array
+
+MIMETYPE = "application/vnd.mama.history"
+MAGIC = b"MAMH"
+VERSION = 1
+
+_HEADER = struct.Struct("<4sB3xI4x")
+
+LIVE_MAGIC = b"MAML"
+LIVE_VERSION = 1
+LIVE_DELTA = 0x01
+
+_LIVE_HEADER = struct.Struct("<4sBBHI4x")
+
+SCOPE_MAGIC = b"MAMS"
+SCOPE_VERSION = 1
+
+_SCOPE_HEADER = struct.Struct("<4sBB2xq")
+
+
+def encode_history(rows: list) -> bytes:
+    """Encodes rows of ``(sensorid, timestamp, value)`` into the columnar binary format
+
+    :param rows: History rows
+    :return: Encoded bytes
+    """
+    timestamps = array("q", (row[1] for row in rows))
+    values = array("f", (row[2] for row in rows))
+    sensors = array("B", (row[0] for row in rows))
+
+    if sys.byteorder == "big":
+        timestamps.byteswap()
+        values.byteswap()
+
+    header = _HEADER.pack(MAGIC, VERSION, len(rows))
+    return b"".join((header, timestamps.tobytes(), values.tobytes(), sensors.tobytes()))
+
+
+def compress(data: bytes) -> bytes:
+    """Gzip compression for the ``Content-Encoding: gzip`` response
+
+    :param data: Encoded bytes
+    :return: Compressed bytes
+    """
+    return gzip.compress(data, compresslevel=6)
+
+
+class LiveEncoder:
+    """Encodes update ticks into live frames, optionally as deltas against the previous tick.
+    Every ``keyframe_interval``-th frame is a key frame, so clients joining a delta stream catch up.
+    """
+
+    def __init__(self, fields: tuple[str, ...], delta: bool = False, keyframe_interval: int = 10):
+        """
+        :param fields: Field order of the records
+        :param delta: Encode delta frames between key frames
+        :param keyframe_interval: Number of frames from one key frame to the next
+        """
+        self.fields = fields
+        self.delta = delta
+        self.keyframe_interval = keyframe_interval
+        self._mask_words = (len(fields) + 31) // 32
+        self._previous: array | None = None
+        self._frames_since_keyframe = 0
+
+    def reset(self):
+        """Makes the next frame a key frame, e.g. when a client joins"""
+        self._previous = None
+
+    def encode(self, ticks: list[tuple[int, dict]]) -> bytes:
+        """Encodes one frame
+
+        :param ticks: (time in epoch milliseconds, value of every field) of each tick
+        :return: Encoded frame
+        """
+        keyframe = not self.delta or self._previous is None or self._frames_since_keyframe >= self.keyframe_interval - 1
+        self._frames_since_keyframe = 0 if keyframe else self._frames_since_keyframe + 1
+
+        parts = [array("q", (timestamp_ms for timestamp_ms, _ in ticks))]
+        for _, sample in ticks:
+            values = array("f", (sample[field] for field in self.fields))
+            parts.extend((values,) if keyframe else self.__delta_record(values))
+            self._previous = values
+
+        if sys.byteorder == "big":
+            for part in parts:
+                part.byteswap()
+
+        flags = 0 if keyframe else LIVE_DELTA
+        header = _LIVE_HEADER.pack(LIVE_MAGIC, LIVE_VERSION, flags, len(ticks), len(self.fields))
+        return b"".join((header, *(part.tobytes() for part in parts)))
+
+    def __delta_record(self, values: array) -> tuple[array, array]:
+        mask = array("I", bytes(4 * self._mask_words))
+        changed = array("f")
+        for index, (value, previous) in enumerate(zip(values, self._previous)):
+            if value != previous:
+                mask[index // 32] |= 1 << (index % 32)
+                changed.append(value)
+        return mask, changed
+
+
+def encode_scope(window_start_ms: int, channels: dict[str, tuple[array, array, array]]) -> bytes:
+    """Encodes the raw samples of one update window into a scope frame
+
+    :param window_start_ms: Start of the window in epoch milliseconds
+    :param channels: float32 arrays of (milliseconds since the window start, voltages, lambda values) by channel
+    :return: Encoded frame
+    """
+    parts = [array("I", (len(offsets) for offsets, _, _ in channels.values()))]
+    for columns in channels.values():
+        parts.extend(columns)
+
+    if sys.byteorder == "big":
+        parts = [array(part.typecode, part) for part in parts]
+        for part in parts:
+            part.byteswap()
+
+    header = _SCOPE_HEADER.pack(SCOPE_MAGIC, SCOPE_VERSION, len(channels), window_start_ms)
+    return b"".join((header, *(part.tobytes() for part in parts)))
@@ -0,0 +1,141 @@
+"""
+Downsampling of time series for the history charts
+
+Both algorithms work on rows of ``(sensorid, timestamp, value)`` ordered by timestamp
+and always keep the first and last row of a series.
+"""
+
+from itertools import groupby
+from typing import Callable
+
+MIN_POINTS = 4
+
+
+def lttb(rows: list, max_points: int) -> list:
+    """Largest-Triangle-Three-Buckets downsampling of one series.
+
+    Keeps the shape of the curve by picking from every bucket the row that spans
+    the largest triangle with the previously selected row and the average of the next bucket.
+
+    :param rows: Rows of one sensor ordered by timestamp
+    :param max_points: Maximum number of rows to return (at least MIN_POINTS)
+    :return: Downsampled rows
+    """
+    length = len(rows)
+    if length <= max_points:
+        return rows
+
+    sampled = [rows[0]]
+    bucket_size = (length - 2) / (max_points - 2)
+    selected = 0
+
+    for bucket in range(max_points - 2):
+        bucket_start = int(bucket * bucket_size) + 1
+        bucket_end = int((bucket + 1) * bucket_size) + 1
+
+        next_start = bucket_end
+        next_end = min(int((bucket + 2) * bucket_size) + 1, length)
+        next_count = next_end - next_start
+        avg_x = sum(rows[i][1] for i in range(next_start, next_end)) / next_count
+        avg_y = sum(rows[i][2] for i in range(next_start, next_end)) / next_count
+
+        point_x = rows[selected][1]
+        point_y = rows[selected][2]
+
+        max_area = -1.0
+        for i in range(bucket_start, bucket_end):
+            area = abs((point_x - avg_x) * (rows[i][2] - point_y) - (point_x - rows[i][1]) * (avg_y - point_y))
+            if area > max_area:
+                max_area = area
+                selected = i
+
+        sampled.append(rows[selected])
+
+    sampled.append(rows[-1])
+    return sampled
+
+
+def min_max(rows: list, max_points: int) -> list:
+    """Min/max per bucket downsampling of one series.
+
+    Every bucket contributes its minimum and maximum row in time order,
+    so single spikes (lean peaks, EGT peaks) are never dropped.
+
+    :param rows: Rows of one sensor ordered by timestamp
+    :param max_points: Maximum number of rows to return (at least MIN_POINTS)
+    :return: Downsampled rows
+    """
+    length = len(rows)
+    if length <= max_points:
+        return rows
+
+    buckets = (max_points - 2) // 2
+    bucket_size = (length - 2) / buckets
+    sampled = [rows[0]]
+
+    for bucket in range(buckets):
+        bucket_start = int(bucket * bucket_size) + 1
+        bucket_end = int((bucket + 1) * bucket_size) + 1
+        bucket_rows = rows[bucket_start:bucket_end]
+
+        low = min(bucket_rows, key=lambda row: row[2])
+        high = max(bucket_rows, key=lambda row: row[2])
+        if low is high:
+            sampled.append(low)
+        elif low[1] <= high[1]:
+            sampled.extend((low, high))
+        else:
+            sampled.extend((high, low))
+
+    sampled.append(rows[-1])
+    return sampled
+
+
+ALGORITHMS: dict[str, Callable[[list, int], list]] = {
+    "lttb": lttb,
+    "minmax": min_max,
+}
+
+
+def rollup_to_rows(buckets: list, mode: str = "lttb") -> list:
+    """Converts rollup buckets into rows that can be downsampled further.
+
+    ``lttb`` uses the mean of every bucket, ``minmax`` emits the minimum and the maximum
+    of every bucket at the bucket timestamp so the envelope is drawn as a vertical segment.
+
+    :param buckets: Rows of ``(sensorid, bucket, count, min, max, sum)`` ordered by sensorid and bucket
+    :param mode: ``lttb`` or ``minmax``
+    :return: Rows of ``(sensorid, timestamp, value)``
+    """
+    if mode not in ALGORITHMS:
+        raise ValueError(f"Unknown downsampling mode: {mode}")
+
+    if mode == "minmax":
+        rows = []
+        for sensor_id, bucket, _, low, high, _ in buckets:
+            rows.append((sensor_id, bucket, low))
+            if high != low:
+                rows.append((sensor_id, bucket, high))
+        return rows
+
+    return [(sensor_id, bucket, total / count) for sensor_id, bucket, count, _, _, total in buckets]
+
+
+def downsample(rows: list, max_points: int, mode: str = "lttb") -> list:
+    """Downsamples every sensor series of a result set to at most ``max_points`` rows.
+
+    :param rows: Rows of ``(sensorid, timestamp, value)`` ordered by sensorid and timestamp
+    :param max_points: Maximum number of rows per sensor
+    :param mode: ``lttb`` (shape preserving) or ``minmax`` (keeps peaks)
+    :return: Downsampled rows, still ordered by sensorid and timestamp
+    """
+    if mode not in ALGORITHMS:
+        raise ValueError(f"Unknown downsampling mode: {mode}")
+    if max_points < MIN_POINTS:
+        raise ValueError(f"max_points must be at least {MIN_POINTS}")
+
+    algorithm = ALGORITHMS[mode]
+    result = []
+    for _, series in groupby(rows, key=lambda row: row[0]):
+        result.extend(algorithm(list(series), max_points))
+    return result
@@ -0,0 +1,187 @@
+"""Constant-memory statistics and sample filters for the sensor channels
+
+``RunningStats`` computes count, mean, min, max and standard deviation of a window in one pass (Welford),
+without keeping the samples. The filters are applied sample by sample to the sensor voltages and are
+configured per sensor in the ``SENSOR_FILTER`` setting, e.g.::
+
+    {
+        "lamda1": [{"type": "outlier", "sigma": 3.0}, {"type": "median", "size": 5}],
+        "temp1": {"type": "ema", "alpha": 0.2}
+    }
+
+Sensors are ``lamda1``, ``lamda2``, ``temp1`` and ``temp2``. A sensor can have one filter or a chain.
+"""
+
+import math
+from collections import deque
+
+from mama.sensors.calibration import code_to_voltage
+
+
+class RunningStats:
+    """Welford accumulator for count, mean, min, max and standard deviation"""
+
+    __slots__ = ("count", "mean", "min", "max", "_m2")
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self.count = 0
+        self.mean = 0.0
+        self.min = math.inf
+        self.max = -math.inf
+        self._m2 = 0.0
+
+    def add(self, value: float):
+        self.count += 1
+        delta = value - self.mean
+        self.mean += delta / self.count
+        self._m2 += delta * (value - self.mean)
+        if value < self.min:
+            self.min = value
+        if value > self.max:
+            self.max = value
+
+    @property
+    def std(self) -> float:
+        """Population standard deviation, 0 for less than two values"""
+        return math.sqrt(self._m2 / self.count) if self.count > 1 else 0.0
+
+
+class MedianFilter:
+    """Median of the last ``size`` samples"""
+
+    def __init__(self, size: int = 5):
+        if size < 1:
+            raise ValueError("The median filter needs a size of at least 1")
+        self._window: deque[float] = deque(maxlen=size)
+
+    def __call__(self, value: float) -> float:
+        self._window.append(value)
+        ordered = sorted(self._window)
+        middle = len(ordered) // 2
+        return ordered[middle] if len(ordered) % 2 else (ordered[middle - 1] + ordered[middle]) / 2
+
+
+class EmaFilter:
+    """Exponential moving average, ``alpha`` is the weight of the newest sample"""
+
+    def __init__(self, alpha: float = 0.2):
+        if not 0 < alpha <= 1:
+            raise ValueError("The EMA alpha must be in (0, 1]")
+        self.alpha = alpha
+        self._value: float | None = None
+
+    def __call__(self, value: float) -> float:
+        self._value = value if self._value is None else self._value + self.alpha * (value - self._value)
+        return self._value
+
+
+class OutlierFilter:
+    """Rejects samples more than ``sigma`` standard deviations away from the exponentially weighted mean.
+
+    After ``max_rejected`` consecutive rejections the signal is assumed to have really changed,
+    the statistics restart from the current sample. Deviations up to ``min_deviation`` (default one ADC step)
+    are always accepted, otherwise a constant signal would reject its own quantization noise.
+    """
+
+    def __init__(
+        self,
+        sigma: float = 3.0,
+        alpha: float = 0.05,
+        warmup: int = 10,
+        max_rejected: int = 5,
+        min_deviation: float = code_to_voltage(1),
+    ):
+        if min_deviation < 0:
+            raise ValueError("The outlier filter needs a min_deviation of at least 0")
+        self.sigma = sigma
+        self.alpha = alpha
+        self.warmup = warmup
+        self.max_rejected = max_rejected
+        self.min_deviation = min_deviation
+        self._restart(None)
+
+    def __call__(self, value: float) -> float | None:
+        threshold = max(self.sigma * math.sqrt(self._variance), self.min_deviation)
+        if self._count >= self.warmup and abs(value - self._mean) > threshold:
+            self._rejected += 1
+            if self._rejected <= self.max_rejected:
+                return None
+            self._restart(value)
+            return value
+
+        self._rejected = 0
+        self._count += 1
+        if self._count == 1:
+            self._mean = value
+        else:
+            delta = value - self._mean
+            self._mean += self.alpha * delta
+            self._variance = (1 - self.alpha) * (self._variance + self.alpha * delta * delta)
+        return value
+
+    def _restart(self, value: float | None):
+        self._count = 0 if value is None else 1
+        self._mean = value or 0.0
+        self._variance = 0.0
+        self._rejected = 0
+
+
+FILTERS = {
+    "median": MedianFilter,
+    "ema": EmaFilter,
+    "outlier": OutlierFilter,
+}
+
+
+class FilterBank:
+    """Filter chains of all sensors, rebuilt when the configuration changes"""
+
+    def __init__(self, spec: dict | None = None):
+        self._spec: dict = {}
+        self._chains: dict[str, list] = {}
+        self._last: dict[str, float] = {}
+        self.configure(spec or {})
+
+    def configure(self, spec: dict):
+        """Builds the filter chains, does nothing if the configuration did not change.
+        An invalid configuration keeps the previous chains.
+
+        :param spec: Filters by sensor, see module docstring
+        :raises ValueError: For unknown filter types or invalid parameters
+        """
+        if spec == self._spec:
+            return
+        self._spec = spec
+
+        chains = {}
+        for sensor, filters in spec.items():
+            chain = []
+            for options in filters if isinstance(filters, list) else [filters]:
+                options = dict(options)
+                filter_type = options.pop("type", None)
+                if filter_type not in FILTERS:
+                    raise ValueError(f"Unknown filter {filter_type} for {sensor}")
+                chain.append(FILTERS[filter_type](**options))
+            chains[sensor] = chain
+
+        self._chains = chains
+        self._last = {}
+
+    def apply(self, sensor: str, value: float, hold: bool = False) -> float | None:
+        """Runs a sample through the chain of a sensor
+
+        :param sensor: Sensor name
+        :param value: Sample
+        :param hold: Return the last accepted (or else the unfiltered) value instead of None if the sample is rejected
+        :return: Filtered sample, None if it was rejected
+        """
+        filtered: float | None = value
+        for step in self._chains.get(sensor, ()):
+            filtered = step(filtered)
+            if filtered is None:
+                return self._last.get(sensor, value) if hold else None
+        self._last[sensor] = filtered
+        return filtered
@@ -0,0 +1,12 @@
+"""Output for the systemd journal"""
+
+import sys
+
+
+def write_to_systemd(message: str):
+    """print message and flush stdout to force the system to write the log immediately
+
+    :param message: Message to be printed
+    """
+    print(message)
+    sys.stdout.flush()
@@ -0,0 +1,13 @@
+"""Switches an existing database to incremental auto vacuum, so the retention task can shrink the file.
+
+Run once with the service stopped. The VACUUM rewrites the whole file and needs about twice the size of
+MAMA.sqlite in free disk space.
+"""
+
+from mama.models.database import db_connection
+
+if __name__ == "__main__":
+    print(f"Vacuuming {db_connection.db_file}, this may take a while")
+    db_connection.enable_incremental_vacuum()
+    db_connection.close()
+    print("Incremental auto vacuum enabled")
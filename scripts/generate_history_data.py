@@ -4,6 +4,7 @@ from datetime import timedelta
 from datetime import timezone
 
 from mama.models.database import db_connection
+from mama.models.database import to_epoch_ms
 
 
 def generate_temp_data():
@@ -13,9 +14,11 @@ def generate_temp_data():
     for i in range(60):
         temp = random.randint(300, 1000)
         timestamp = now - timedelta(seconds=60 - i)
-        timestamp_str = timestamp.isoformat()
         sensor_id = i % 2
-        db_connection.execute("INSERT INTO temps VALUES (?, ?, ?)", (sensor_id, timestamp_str, temp))
+        db_connection.execute(
+            "INSERT INTO temps (sensorid, timestamp, value) VALUES (?, ?, ?)",
+            (sensor_id, to_epoch_ms(timestamp), temp),
+        )
 
 
 def generate_lambda_data():
@@ -25,9 +28,11 @@ def generate_lambda_data():
     for i in range(60):
         lambda_value = random.random() + 0.4
         timestamp = now - timedelta(seconds=60 - i)
-        timestamp_str = timestamp.isoformat()
         sensor_id = i % 2
-        db_connection.execute("INSERT INTO lambda VALUES (?, ?, ?)", (sensor_id, timestamp_str, lambda_value))
+        db_connection.execute(
+            "INSERT INTO lambda (sensorid, timestamp, value) VALUES (?, ?, ?)",
+            (sensor_id, to_epoch_ms(timestamp), lambda_value),
+        )
 
 
 if __name__ == "__main__":
@@ -0,0 +1,16 @@
+"""Fake monotonic clock for the scheduling tests"""
+
+
+class FakeClock:
+    """Clock that only moves when something sleeps or the test advances it"""
+
+    def __init__(self, now: float = 100.0):
+        self.now = now
+        self.sleeps: list[float] = []
+
+    def __call__(self) -> float:
+        return self.now
+
+    def sleep(self, seconds: float):
+        self.sleeps.append(seconds)
+        self.now += seconds
@@ -0,0 +1,5 @@
+"""Shared test setup: the tests run against the development settings and the mock sensors"""
+
+import os
+
+os.environ.setdefault("FLASK_ENV", "development")
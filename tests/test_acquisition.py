@@ -0,0 +1,47 @@
+import struct
+
+import pytest
+
+from mama.tasks.acquisition import _HEADER
+from mama.tasks.acquisition import _TAG
+from mama.tasks.acquisition import SharedSampleRing
+
+CHANNELS = ("lamda1", "temp1")
+
+
+@pytest.fixture
+def ring():
+    shared = SharedSampleRing.create(4, CHANNELS)
+    yield shared
+    shared.close()
+    shared.unlink()
+
+
+def test_reader_gets_the_ticks_since_its_last_sequence(ring):
+    reader = SharedSampleRing(ring.memory, CHANNELS)
+    for tick in range(3):
+        ring.append(1000 * tick, {"lamda1": 1.0 + tick, "temp1": 800.0})
+
+    assert reader.capacity == 4
+    assert reader.sequence == 3
+    assert reader.since(1) == [
+        (2, 1000, {"lamda1": 2.0, "temp1": 800.0}),
+        (3, 2000, {"lamda1": 3.0, "temp1": 800.0}),
+    ]
+
+
+def test_overwritten_ticks_are_not_returned(ring):
+    for tick in range(10):
+        ring.append(tick, {"lamda1": float(tick), "temp1": 0.0})
+
+    assert [sequence for sequence, _, _ in ring.since(0)] == [7, 8, 9, 10]
+
+
+def test_slot_being_written_is_skipped(ring):
+    for tick in range(3):
+        ring.append(tick, {"lamda1": float(tick), "temp1": 0.0})
+    # The writer marks a slot with -1 while it is written
+    slot_size = struct.calcsize("=qq" + "d" * len(CHANNELS))
+    _TAG.pack_into(ring.memory.buf, _HEADER.size + slot_size, -1)
+
+    assert [sequence for sequence, _, _ in ring.since(0)] == [1, 3]
@@ -0,0 +1,75 @@
+import struct
+from array import array
+
+import pytest
+
+from mama.utils.archive_format import _compress
+from mama.utils.archive_format import decode_block
+from mama.utils.archive_format import encode_block
+from mama.utils.archive_format import MAGIC
+
+
+def columns(count: int) -> tuple[list[int], list[list]]:
+    timestamps = [1_700_000_000_000 + 10 * row for row in range(count)]
+    return timestamps, [[0.95 + row / 1000 for row in range(count)], [float(800 + row % 7) for row in range(count)]]
+
+
+def encode_v1_block(timestamps: list[int], values: list[list[float]]) -> bytes:
+    """Block as written before the NULL masks existed"""
+    deltas = array("q", [timestamps[0]] + [b - a for a, b in zip(timestamps, timestamps[1:])])
+    sections = [_compress(deltas)]
+    for column in values:
+        bits = array("Q", array("d", column).tobytes())
+        for i in range(len(bits) - 1, 0, -1):
+            bits[i] ^= bits[i - 1]
+        sections.append(_compress(bits))
+    header = struct.pack("<4sBB2xI", MAGIC, 1, len(values), len(timestamps))
+    return header + b"".join(struct.pack("<I", len(section)) + section for section in sections)
+
+
+def test_round_trip_is_lossless():
+    timestamps, values = columns(1024)
+
+    assert decode_block(encode_block(timestamps, values)) == (timestamps, values)
+
+
+def test_single_columns_can_be_decoded():
+    timestamps, values = columns(100)
+
+    assert decode_block(encode_block(timestamps, values), (1,)) == (timestamps, [values[1]])
+
+
+def test_null_values_survive_the_round_trip():
+    timestamps, values = columns(50)
+    values[0][3] = None
+    values[1] = [None] * 50
+
+    assert decode_block(encode_block(timestamps, values)) == (timestamps, values)
+
+
+def test_version_1_blocks_are_still_decoded():
+    timestamps, values = columns(200)
+
+    assert decode_block(encode_v1_block(timestamps, values)) == (timestamps, values)
+
+
+def test_columns_need_the_same_length():
+    with pytest.raises(ValueError):
+        encode_block([1, 2], [[1.0]])
+
+
+def test_unknown_blocks_are_rejected():
+    data = bytearray(encode_block([1], [[1.0]]))
+    data[4] = 99
+
+    with pytest.raises(ValueError):
+        decode_block(bytes(data))
+
+
+def test_constant_series_compress_well():
+    count = 1024
+    timestamps = [1_700_000_000_000 + 10 * row for row in range(count)]
+
+    data = encode_block(timestamps, [[1.0] * count])
+
+    assert len(data) < count
@@ -0,0 +1,36 @@
+from mama.models.database import CHANNELS
+from mama.tasks import background
+from mama.tasks.background import MIN_STORED_TEMPERATURE
+from mama.tasks.background import TickRecorder
+
+
+class FakeDatabase:
+    def __init__(self):
+        self.ticks = []
+
+    def insert_tick(self, sample: dict, timestamp_ms: int):
+        self.ticks.append((timestamp_ms, sample))
+
+
+def test_tick_recorder_stores_cold_temperatures_as_null(monkeypatch):
+    database = FakeDatabase()
+    monkeypatch.setattr(background, "db_connection", database)
+    sample = {channel: 1.0 for channel in CHANNELS} | {"temp1": MIN_STORED_TEMPERATURE, "temp2": 450.0}
+
+    TickRecorder(lambda: True)(1_000, sample)
+
+    ((timestamp_ms, stored),) = database.ticks
+    assert timestamp_ms == 1_000
+    assert stored["temp1"] is None
+    assert stored["temp2"] == 450.0
+    assert stored["temp1_voltage"] == 1.0
+    assert sample["temp1"] == MIN_STORED_TEMPERATURE
+
+
+def test_tick_recorder_stores_nothing_without_recording(monkeypatch):
+    database = FakeDatabase()
+    monkeypatch.setattr(background, "db_connection", database)
+
+    TickRecorder(lambda: False)(1_000, {channel: 500.0 for channel in CHANNELS})
+
+    assert database.ticks == []
@@ -0,0 +1,119 @@
+import gzip
+import struct
+from array import array
+
+from mama.utils.binary_format import compress
+from mama.utils.binary_format import encode_history
+from mama.utils.binary_format import LIVE_DELTA
+from mama.utils.binary_format import LIVE_MAGIC
+from mama.utils.binary_format import LiveEncoder
+from mama.utils.binary_format import encode_scope
+from mama.utils.binary_format import MAGIC
+from mama.utils.binary_format import SCOPE_MAGIC
+
+
+def decode_history(data: bytes) -> list:
+    magic, version, count = struct.unpack_from("<4sB3xI4x", data)
+    assert (magic, version) == (MAGIC, 1)
+    timestamps = array("q", data[16 : 16 + 8 * count])
+    values = array("f", data[16 + 8 * count : 16 + 12 * count])
+    sensors = array("B", data[16 + 12 * count : 16 + 13 * count])
+    return list(zip(sensors, timestamps, values))
+
+
+def test_history_round_trip():
+    rows = [(0, 1_700_000_000_000, 0.5), (1, 1_700_000_000_010, 850.25), (0, 1_700_000_001_000, -1.0)]
+
+    data = encode_history(rows)
+
+    assert len(data) == 16 + 13 * len(rows)
+    assert decode_history(data) == rows
+
+
+def test_empty_history():
+    assert decode_history(encode_history([])) == []
+
+
+def test_compress_is_gzip():
+    data = encode_history([(0, 1, 1.0)] * 100)
+
+    assert gzip.decompress(compress(data)) == data
+
+
+def decode_live(data: bytes, previous: list[float] | None = None) -> tuple[bool, list[tuple[int, list[float]]]]:
+    """Reference decoder of the live frames, like decodeLiveFrame in mySockets.js"""
+    magic, version, flags, tick_count, field_count = struct.unpack_from("<4sBBHI4x", data)
+    assert (magic, version) == (LIVE_MAGIC, 1)
+    delta = bool(flags & LIVE_DELTA)
+    timestamps = array("q", data[16 : 16 + 8 * tick_count])
+    offset = 16 + 8 * tick_count
+    mask_words = (field_count + 31) // 32
+    ticks = []
+    for timestamp in timestamps:
+        if delta:
+            mask = array("I", data[offset : offset + 4 * mask_words])
+            offset += 4 * mask_words
+            values = list(previous)
+            for field in range(field_count):
+                if mask[field // 32] >> (field % 32) & 1:
+                    (values[field],) = struct.unpack_from("<f", data, offset)
+                    offset += 4
+        else:
+            values = list(array("f", data[offset : offset + 4 * field_count]))
+            offset += 4 * field_count
+        ticks.append((timestamp, values))
+        previous = values
+    assert offset == len(data)
+    return delta, ticks
+
+
+def live_ticks(count: int, start: int = 0) -> list[tuple[int, dict]]:
+    return [(1000 * tick, {"a": 0.5, "b": float(tick), "c": 2.0 if tick % 2 else 1.0}) for tick in range(start, count)]
+
+
+def test_live_key_frame_round_trip():
+    encoder = LiveEncoder(("a", "b", "c"))
+    ticks = live_ticks(3)
+
+    delta, decoded = decode_live(encoder.encode(ticks))
+
+    assert not delta
+    assert decoded == [(timestamp, [sample["a"], sample["b"], sample["c"]]) for timestamp, sample in ticks]
+
+
+def test_live_delta_frames_only_carry_changed_fields():
+    encoder = LiveEncoder(("a", "b", "c"), delta=True, keyframe_interval=2)
+
+    key_frame = encoder.encode(live_ticks(2))
+    delta_frame = encoder.encode(live_ticks(4, start=2))
+    _, key_ticks = decode_live(key_frame)
+    delta, delta_ticks = decode_live(delta_frame, previous=key_ticks[-1][1])
+
+    assert delta
+    # Field "a" never changes: mask and two values per record
+    assert len(delta_frame) == 16 + 8 * 2 + 2 * (4 + 2 * 4)
+    assert delta_ticks == [(2000, [0.5, 2.0, 1.0]), (3000, [0.5, 3.0, 2.0])]
+    # Every second frame is a key frame
+    assert not decode_live(encoder.encode(live_ticks(5, start=4)))[0]
+
+
+def test_live_reset_forces_a_key_frame():
+    encoder = LiveEncoder(("a", "b", "c"), delta=True)
+    encoder.encode(live_ticks(1))
+    encoder.reset()
+
+    assert not decode_live(encoder.encode(live_ticks(2, start=1)))[0]
+
+
+def test_scope_frame_layout():
+    channels = {
+        "lamda1": (array("f", [0.0, 1.0]), array("f", [2.5, 2.75]), array("f", [1.0, 1.05])),
+        "lamda2": (array("f", [0.5]), array("f", [2.0]), array("f", [0.9])),
+    }
+
+    data = encode_scope(1_700_000_000_000, channels)
+
+    magic, version, channel_count, start = struct.unpack_from("<4sBBxxq", data)
+    assert (magic, version, channel_count, start) == (SCOPE_MAGIC, 1, 2, 1_700_000_000_000)
+    assert list(array("I", data[16:24])) == [2, 1]
+    assert array("f", data[24:]) == array("f", [0.0, 1.0, 2.5, 2.75, 1.0, 1.05, 0.5, 2.0, 0.9])
@@ -0,0 +1,69 @@
+import pytest
+
+from mama.sensors.calibration import ADC_MAX_CODE
+from mama.sensors.calibration import CalibrationTable
+from mama.sensors.calibration import code_to_voltage
+from mama.sensors.calibration import temperature_curve
+from mama.sensors.calibration import type_k_emf
+from mama.sensors.calibration import type_k_temperature
+from mama.sensors.calibration import VOLTAGE_TABLE
+
+
+def test_table_holds_the_value_of_every_code():
+    table = CalibrationTable(lambda voltage: 2 * voltage)
+
+    assert len(table.values) == ADC_MAX_CODE + 1
+    assert table[0] == 0.0
+    assert table[ADC_MAX_CODE] == 10.0
+    assert list(table.convert([0, 512, ADC_MAX_CODE])) == [0.0, 2 * code_to_voltage(512), 10.0]
+
+
+def test_from_voltage_interpolates_between_codes_and_clamps():
+    table = CalibrationTable(lambda voltage: voltage * voltage)
+    between = (code_to_voltage(100) + code_to_voltage(101)) / 2
+
+    assert table.from_voltage(code_to_voltage(100)) == pytest.approx(table[100])
+    assert table.from_voltage(between) == pytest.approx((table[100] + table[101]) / 2)
+    assert table.from_voltage(-1.0) == table[0]
+    assert table.from_voltage(6.0) == table[ADC_MAX_CODE]
+
+
+def test_voltage_table_is_the_identity_of_the_codes():
+    assert VOLTAGE_TABLE[ADC_MAX_CODE] == 5.0
+    assert VOLTAGE_TABLE[1] == pytest.approx(5.0 / 1023)
+
+
+def test_linear_curve_defaults_to_the_egt_amplifier():
+    assert temperature_curve({})(2.0) == 500.0
+    assert temperature_curve({"type": "linear", "scale": 100.0, "offset": -10.0})(2.0) == 190.0
+
+
+@pytest.mark.parametrize(("temperature", "emf"), [(0.0, 0.0), (100.0, 4.096), (500.0, 20.644), (1000.0, 41.276)])
+def test_type_k_reference_values(temperature, emf):
+    # NIST ITS-90 table values in millivolts
+    assert type_k_emf(temperature) == pytest.approx(emf, abs=0.001)
+    assert type_k_temperature(emf) == pytest.approx(temperature, abs=0.1)
+
+
+def test_nist_curve_compensates_the_cold_junction():
+    curve = temperature_curve({"type": "nist", "gain": 0.1, "cold_junction": 0.0})
+
+    assert curve(2.0644) == pytest.approx(500.0, abs=0.1)
+    with pytest.raises(ValueError):
+        temperature_curve({"type": "nist", "gain": 0})
+
+
+def test_piecewise_curve_interpolates_and_clamps():
+    curve = temperature_curve({"type": "piecewise", "points": [[2.0, 500], [0.0, 0], [4.0, 1100]]})
+
+    assert curve(1.0) == 250.0
+    assert curve(3.0) == 800.0
+    assert curve(-1.0) == 0.0
+    assert curve(5.0) == 1100.0
+    with pytest.raises(ValueError):
+        temperature_curve({"type": "piecewise", "points": [[0.0, 0]]})
+
+
+def test_unknown_curve_is_rejected():
+    with pytest.raises(ValueError):
+        temperature_curve({"type": "quadratic"})
@@ -0,0 +1,95 @@
+import sqlite3
+
+import pytest
+
+from mama.models.database import CHANNELS
+from mama.models.database import Database
+from mama.models.database import iso_to_epoch_ms
+from mama.models.database import rollup_table
+
+
+@pytest.fixture
+def db(tmp_path):
+    database = Database(tmp_path / "test.sqlite", flush_rows=1000, flush_interval=3600)
+    yield database
+    database.close()
+
+
+def sample(**values) -> dict:
+    return {channel: 1.0 for channel in CHANNELS} | values
+
+
+def test_flush_of_a_tick_with_a_null_value_updates_the_rollups(db):
+    db.insert_tick(sample(temp1=None, temp2=800.0), timestamp_ms=1_700_000_000_500)
+    db.insert_tick(sample(temp1=700.0, temp2=900.0), timestamp_ms=1_700_000_000_900)
+    db.flush()
+
+    assert db.writer.get_stats()["queue_depth"] == 0
+    assert db.conn.execute("SELECT COUNT(*) FROM ticks").fetchone() == (2,)
+    rows = db.conn.execute(
+        f"SELECT sensorid, bucket, count, min, max, sum FROM {rollup_table('temps', 1000)} ORDER BY sensorid"
+    ).fetchall()
+    assert rows == [
+        (0, 1_700_000_000_000, 1, 700.0, 700.0, 700.0),
+        (1, 1_700_000_000_000, 2, 800.0, 900.0, 1700.0),
+    ]
+
+
+def test_legacy_iso_timestamps_are_migrated_to_epoch_ms(tmp_path):
+    path = tmp_path / "legacy.sqlite"
+    legacy = sqlite3.connect(path)
+    legacy.execute("CREATE TABLE temps (sensorid integer, timestamp TEXT, value float)")
+    legacy.execute("CREATE TABLE lambda (sensorid integer, timestamp TEXT, value float)")
+    legacy.executemany(
+        "INSERT INTO temps VALUES (?, ?, ?)",
+        [(0, "2024-05-01T12:00:00.250000+00:00", 450.0), (1, "2024-05-01T14:00:01+02:00", 460.0), (0, "invalid", 1.0)],
+    )
+    legacy.execute("INSERT INTO lambda VALUES (0, '2024-05-01T12:00:00+00:00', 0.98)")
+    legacy.commit()
+    legacy.close()
+
+    db = Database(path)
+    try:
+        assert db.conn.execute("SELECT sensorid, timestamp, value FROM temps ORDER BY sensorid").fetchall() == [
+            (0, iso_to_epoch_ms("2024-05-01T12:00:00.250+00:00"), 450.0),
+            (1, iso_to_epoch_ms("2024-05-01T12:00:01+00:00"), 460.0),
+        ]
+        assert db.get_lambda_values_between("2024-05-01T11:00:00+00:00", "2024-05-01T13:00:00+00:00") == [
+            (0, iso_to_epoch_ms("2024-05-01T12:00:00+00:00"), 0.98)
+        ]
+        assert db.conn.execute(f"SELECT COUNT(*) FROM {rollup_table('temps', 1000)}").fetchone() == (2,)
+    finally:
+        db.close()
+
+
+def test_null_tick_columns_are_no_sensor_values(db):
+    db.insert_tick(sample(temp1=None, temp2=800.0), timestamp_ms=1_700_000_000_500)
+    db.flush()
+
+    rows = db.get_temp_values_between("2023-11-14T00:00:00+00:00", "2023-11-15T00:00:00+00:00")
+    assert rows == [(1, 1_700_000_000_500, 800.0)]
+
+
+def test_new_files_use_incremental_auto_vacuum(db):
+    assert db.conn.execute("PRAGMA auto_vacuum").fetchone() == (2,)
+
+
+def test_existing_files_are_not_vacuumed_on_open(tmp_path):
+    path = tmp_path / "legacy.sqlite"
+    legacy = sqlite3.connect(path)
+    legacy.execute("CREATE TABLE filler (data BLOB)")
+    legacy.executemany("INSERT INTO filler VALUES (zeroblob(4096))", [()] * 50)
+    legacy.execute("DELETE FROM filler")
+    legacy.commit()
+    legacy.close()
+
+    database = Database(path)
+    try:
+        assert database.conn.execute("PRAGMA auto_vacuum").fetchone() == (0,)
+        assert database.incremental_vacuum() == 0
+
+        database.enable_incremental_vacuum()
+        assert database.conn.execute("PRAGMA auto_vacuum").fetchone() == (2,)
+        assert database.conn.execute("PRAGMA freelist_count").fetchone() == (0,)
+    finally:
+        database.close()
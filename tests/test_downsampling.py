@@ -0,0 +1,61 @@
+import math
+
+import pytest
+
+from mama.utils.downsampling import downsample
+from mama.utils.downsampling import lttb
+from mama.utils.downsampling import min_max
+from mama.utils.downsampling import rollup_to_rows
+
+
+def series(sensor_id: int, count: int) -> list:
+    return [(sensor_id, timestamp, math.sin(timestamp / 10)) for timestamp in range(count)]
+
+
+@pytest.mark.parametrize("algorithm", [lttb, min_max])
+def test_keeps_first_and_last_row_and_the_limit(algorithm):
+    rows = series(0, 1000)
+
+    sampled = algorithm(rows, 50)
+
+    assert len(sampled) <= 50
+    assert sampled[0] == rows[0]
+    assert sampled[-1] == rows[-1]
+    assert [row[1] for row in sampled] == sorted(row[1] for row in sampled)
+
+
+@pytest.mark.parametrize("algorithm", [lttb, min_max])
+def test_short_series_are_returned_unchanged(algorithm):
+    rows = series(0, 10)
+
+    assert algorithm(rows, 50) is rows
+
+
+def test_min_max_keeps_a_single_spike():
+    rows = [(0, timestamp, 1.0) for timestamp in range(1000)]
+    rows[500] = (0, 500, 99.0)
+
+    assert (0, 500, 99.0) in min_max(rows, 20)
+
+
+def test_downsample_limits_every_sensor_on_its_own():
+    rows = series(0, 300) + series(1, 300)
+
+    sampled = downsample(rows, 20)
+
+    assert sum(row[0] == 0 for row in sampled) == 20
+    assert sum(row[0] == 1 for row in sampled) == 20
+
+
+def test_downsample_rejects_invalid_arguments():
+    with pytest.raises(ValueError):
+        downsample([], 20, mode="average")
+    with pytest.raises(ValueError):
+        downsample([], 2)
+
+
+def test_rollup_to_rows():
+    buckets = [(0, 1000, 4, 1.0, 3.0, 8.0), (0, 2000, 1, 5.0, 5.0, 5.0)]
+
+    assert rollup_to_rows(buckets, "lttb") == [(0, 1000, 2.0), (0, 2000, 5.0)]
+    assert rollup_to_rows(buckets, "minmax") == [(0, 1000, 1.0), (0, 1000, 3.0), (0, 2000, 5.0)]
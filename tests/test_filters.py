@@ -0,0 +1,86 @@
+import math
+import statistics
+
+import pytest
+
+from mama.sensors.calibration import code_to_voltage
+from mama.utils.filters import EmaFilter
+from mama.utils.filters import FilterBank
+from mama.utils.filters import MedianFilter
+from mama.utils.filters import OutlierFilter
+from mama.utils.filters import RunningStats
+
+
+def test_running_stats_match_the_statistics_module():
+    values = [0.91, 0.95, 1.02, 0.99, 1.10, 0.87, 1.0]
+    stats = RunningStats()
+    for value in values:
+        stats.add(value)
+
+    assert stats.count == len(values)
+    assert stats.mean == pytest.approx(statistics.fmean(values))
+    assert stats.std == pytest.approx(statistics.pstdev(values))
+    assert (stats.min, stats.max) == (min(values), max(values))
+
+
+def test_running_stats_reset():
+    stats = RunningStats()
+    stats.add(5.0)
+    stats.reset()
+
+    assert stats.count == 0
+    assert stats.std == 0.0
+    assert stats.min == math.inf
+
+
+def test_median_filter():
+    median = MedianFilter(3)
+
+    assert [median(value) for value in (1.0, 9.0, 2.0, 3.0)] == [1.0, 5.0, 2.0, 3.0]
+
+
+def test_ema_filter():
+    ema = EmaFilter(0.5)
+
+    assert [ema(value) for value in (2.0, 4.0, 4.0)] == [2.0, 3.0, 3.5]
+    with pytest.raises(ValueError):
+        EmaFilter(0)
+
+
+def test_outlier_filter_rejects_a_spike_and_follows_a_real_step():
+    outlier = OutlierFilter(sigma=3.0, warmup=5, max_rejected=2)
+    for value in (1.0, 1.01, 0.99, 1.0, 1.01, 0.99, 1.0):
+        assert outlier(value) == value
+
+    assert outlier(3.0) is None
+    assert outlier(1.0) == 1.0
+    # A lasting step is accepted after max_rejected samples
+    assert [outlier(2.0) for _ in range(3)] == [None, None, 2.0]
+
+
+def test_outlier_filter_accepts_one_adc_step_on_a_constant_signal():
+    outlier = OutlierFilter(warmup=3)
+    for _ in range(20):
+        outlier(1.0)
+
+    assert outlier(1.0 + code_to_voltage(1)) == 1.0 + code_to_voltage(1)
+    assert outlier(1.0 + code_to_voltage(5)) is None
+
+
+def test_filter_bank_chains_and_holds_rejected_samples():
+    bank = FilterBank({"lamda1": [{"type": "outlier", "warmup": 3, "max_rejected": 5}, {"type": "median", "size": 1}]})
+    for _ in range(5):
+        bank.apply("lamda1", 1.0)
+
+    assert bank.apply("lamda1", 4.0) is None
+    assert bank.apply("lamda1", 4.0, hold=True) == 1.0
+    assert bank.apply("temp1", 800.0) == 800.0
+
+
+def test_filter_bank_keeps_the_chains_of_an_invalid_configuration():
+    bank = FilterBank({"lamda1": {"type": "ema", "alpha": 0.5}})
+
+    with pytest.raises(ValueError):
+        bank.configure({"lamda1": {"type": "unknown"}})
+    assert bank.apply("lamda1", 2.0) == 2.0
+    assert bank.apply("lamda1", 4.0) == 3.0
@@ -0,0 +1,64 @@
+from mama.tasks.hub import AcquisitionHub
+from tests.clock import FakeClock
+
+
+def test_consumers_get_the_ticks_at_their_interval():
+    clock = FakeClock()
+    hub = AcquisitionHub(clock=clock)
+    every_tick, slow = [], []
+    hub.subscribe("every_tick", lambda timestamp_ms, sample: every_tick.append(timestamp_ms))
+    hub.subscribe("slow", lambda timestamp_ms, sample: slow.append(timestamp_ms), interval=3.0)
+
+    for tick in range(7):
+        hub.publish(1000 * tick, {"temp1": 800.0})
+        clock.now += 1.0
+
+    assert every_tick == [0, 1000, 2000, 3000, 4000, 5000, 6000]
+    assert slow == [0, 3000, 6000]
+    assert hub.latest == (6000, {"temp1": 800.0})
+
+
+def test_intervals_ignore_jumps_of_the_tick_timestamps():
+    clock = FakeClock()
+    hub = AcquisitionHub(clock=clock)
+    delivered = []
+    hub.subscribe("slow", lambda timestamp_ms, sample: delivered.append(timestamp_ms), interval=30.0)
+
+    hub.publish(1_700_000_000_000, {})
+    clock.now += 1.0
+    # The system time is set one hour ahead and then back
+    hub.publish(1_700_003_601_000, {})
+    clock.now += 1.0
+    hub.publish(1_699_996_402_000, {})
+    clock.now += 30.0
+    hub.publish(1_699_996_432_000, {})
+
+    assert delivered == [1_700_000_000_000, 1_699_996_432_000]
+
+
+def test_failing_consumer_does_not_affect_the_others():
+    hub = AcquisitionHub(clock=FakeClock())
+    delivered = []
+
+    def fail(timestamp_ms, sample):
+        raise RuntimeError("broken consumer")
+
+    hub.subscribe("broken", fail)
+    hub.subscribe("working", lambda timestamp_ms, sample: delivered.append(timestamp_ms))
+    hub.run([(1, {}), (2, {})])
+
+    stats = hub.get_stats()
+    assert delivered == [1, 2]
+    assert stats["ticks"] == 2
+    assert stats["consumers"]["broken"]["errors"] == 2
+    assert stats["consumers"]["working"]["deliveries"] == 2
+
+
+def test_unsubscribe():
+    hub = AcquisitionHub(clock=FakeClock())
+    delivered = []
+    hub.subscribe("consumer", lambda timestamp_ms, sample: delivered.append(timestamp_ms))
+    hub.unsubscribe("consumer")
+    hub.publish(1, {})
+
+    assert delivered == []
@@ -0,0 +1,63 @@
+from mama.tasks.live import LiveStream
+from mama.tasks.live import resolve_fields
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 100.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+class FakeSocketIO:
+    def __init__(self):
+        self.emitted = []
+
+    def emit(self, event, payload, to=None):
+        self.emitted.append((event, payload, to))
+
+
+def test_rated_stream_survives_a_backward_timestamp_jump():
+    clock = FakeClock()
+    socketio = FakeSocketIO()
+    stream = LiveStream("json", ("lamda1",), rate=1.0, clock=clock)
+
+    stream.publish(socketio, 1_700_000_000_000, {"lamda1": 1.0}, 1, batch_interval=0)
+    # The system time is set one hour back, the monotonic clock keeps running
+    clock.now += 1.0
+    stream.publish(socketio, 1_699_996_401_000, {"lamda1": 2.0}, 2, batch_interval=0)
+    clock.now += 0.5
+    stream.publish(socketio, 1_699_996_401_500, {"lamda1": 3.0}, 3, batch_interval=0)
+
+    assert [payload[0]["lamda1"] for _, payload, _ in socketio.emitted] == [1.0, 2.0]
+
+
+def test_rated_stream_ignores_a_forward_timestamp_jump():
+    clock = FakeClock()
+    socketio = FakeSocketIO()
+    stream = LiveStream("json", ("lamda1",), rate=1.0, clock=clock)
+
+    stream.publish(socketio, 1_700_000_000_000, {"lamda1": 1.0}, 1, batch_interval=0)
+    clock.now += 0.5
+    stream.publish(socketio, 1_700_003_600_000, {"lamda1": 2.0}, 2, batch_interval=0)
+
+    assert len(socketio.emitted) == 1
+
+
+def test_binary_batch_is_emitted_after_a_backward_timestamp_jump():
+    clock = FakeClock()
+    socketio = FakeSocketIO()
+    stream = LiveStream("float32", ("lamda1",), rate=0, clock=clock)
+
+    stream.publish(socketio, 1_700_000_000_000, {"lamda1": 1.0}, 1, batch_interval=1.0)
+    clock.now += 1.0
+    stream.publish(socketio, 1_699_996_401_000, {"lamda1": 2.0}, 2, batch_interval=1.0)
+
+    assert len(socketio.emitted) == 1
+    assert socketio.emitted[0][1][1:] == (stream.id, 2)
+
+
+def test_resolve_fields_keeps_the_sample_order_and_expands_groups():
+    assert resolve_fields(["temp2", "lamda1"]) == ("lamda1", "temp2")
+    assert set(resolve_fields(["temps"])) == {"temp1", "temp2", "temp1_voltage", "temp2_voltage"}
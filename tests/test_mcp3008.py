@@ -0,0 +1,51 @@
+import os
+
+from mama.sensors import mcp3008
+from mama.sensors.mcp3008 import _spi_ioc_message
+from mama.sensors.mcp3008 import MCP3008
+
+
+class FakeSpiDev:
+    """Answers every conversion with the channel number times 100, has no multi-transfer ioctl"""
+
+    def __init__(self):
+        self.frames = []
+        self._fd = os.open(os.devnull, os.O_RDONLY)
+
+    def fileno(self) -> int:
+        return self._fd
+
+    def xfer2(self, frame: list[int]) -> list[int]:
+        self.frames.append(frame)
+        code = ((frame[1] >> 4) - 8) * 100
+        return [0, code >> 8, code & 0xFF]
+
+    def close(self):
+        if self._fd >= 0:
+            os.close(self._fd)
+            self._fd = -1
+
+
+def test_spi_ioc_message_matches_the_kernel_header():
+    # SPI_IOC_MESSAGE(1) and SPI_IOC_MESSAGE(2) of linux/spi/spidev.h
+    assert _spi_ioc_message(1) == 0x40206B00
+    assert _spi_ioc_message(2) == 0x40406B00
+
+
+def test_read_many_frames_every_conversion_and_orders_sample_by_sample():
+    adc = MCP3008.__new__(MCP3008)
+    adc.spi = FakeSpiDev()
+
+    codes = adc.read_many([0, 3, 7], samples=2)
+
+    assert list(codes) == [0, 300, 700, 0, 300, 700]
+    assert adc.spi.frames[:3] == [[1, 0x80, 0], [1, 0xB0, 0], [1, 0xF0, 0]]
+
+
+def test_mock_adc_stays_in_range():
+    adc = mcp3008.TestMCP3008(min_value=100, max_value=200)
+
+    codes = adc.read_many([0, 1], samples=100)
+
+    assert len(codes) == 200
+    assert all(100 <= code <= 200 for code in codes)
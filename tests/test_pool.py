@@ -0,0 +1,57 @@
+import sqlite3
+
+import pytest
+
+from mama.models.pool import ReadConnectionPool
+
+
+@pytest.fixture
+def db_file(tmp_path):
+    path = tmp_path / "test.sqlite"
+    conn = sqlite3.connect(path)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("CREATE TABLE t (value INTEGER)")
+    conn.execute("INSERT INTO t VALUES (1)")
+    conn.commit()
+    yield path
+    conn.close()
+
+
+def test_connections_are_read_only(db_file):
+    pool = ReadConnectionPool(db_file, size=1)
+    with pool.connection() as conn:
+        assert conn.execute("SELECT value FROM t").fetchall() == [(1,)]
+        with pytest.raises(sqlite3.OperationalError):
+            conn.execute("INSERT INTO t VALUES (2)")
+    pool.close()
+
+
+def test_borrowing_from_an_exhausted_pool_times_out(db_file):
+    pool = ReadConnectionPool(db_file, size=1, timeout=0.01)
+    with pool.connection():
+        with pytest.raises(TimeoutError):
+            with pool.connection():
+                pass
+    with pool.connection(timeout=0.01):
+        pass
+
+    stats = pool.get_stats()
+    assert stats["timeouts"] == 1
+    assert stats["acquisitions"] == 2
+    assert stats["in_use"] == 0
+    pool.close()
+
+
+def test_open_read_transaction_is_rolled_back_on_return(db_file):
+    pool = ReadConnectionPool(db_file, size=1)
+    with pool.connection() as conn:
+        conn.execute("BEGIN")
+        conn.execute("SELECT value FROM t").fetchall()
+    with pool.connection() as conn:
+        assert not conn.in_transaction
+    pool.close()
+
+
+def test_pool_needs_a_connection(db_file):
+    with pytest.raises(ValueError):
+        ReadConnectionPool(db_file, size=0)
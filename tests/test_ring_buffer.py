@@ -0,0 +1,62 @@
+import pytest
+
+from mama.models.ring_buffer import SampleRingBuffer
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 100.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def tick(value: float) -> dict:
+    return {"lamda1": value, "lamda2": -value}
+
+
+def test_since_returns_the_ticks_after_a_sequence_number():
+    buffer = SampleRingBuffer(4, channels=("lamda1", "lamda2"))
+    for value in range(6):
+        buffer.append(1000 + value, tick(value))
+
+    columns = buffer.since(3)
+
+    assert columns["first_sequence"] == 4
+    assert columns["sequence"] == 6
+    assert columns["timestamps"] == [1003, 1004, 1005]
+    assert columns["lamda2"] == [-3.0, -4.0, -5.0]
+
+
+def test_since_is_limited_to_the_capacity():
+    buffer = SampleRingBuffer(4, channels=("lamda1", "lamda2"))
+    for value in range(10):
+        buffer.append(1000 + value, tick(value))
+
+    assert buffer.since(0)["lamda1"] == [6.0, 7.0, 8.0, 9.0]
+
+
+def test_window_follows_the_arrival_time_not_the_timestamps():
+    clock = FakeClock()
+    buffer = SampleRingBuffer(8, channels=("lamda1", "lamda2"), clock=clock)
+    for value in range(3):
+        buffer.append(1_700_000_000_000 + value * 1000, tick(value))
+        clock.now += 1.0
+    # The system time is set one hour back
+    for value in range(3, 5):
+        buffer.append(1_699_996_400_000 + value * 1000, tick(value))
+        clock.now += 1.0
+
+    assert buffer.window(2.5, ("lamda1",))["lamda1"] == [3.0, 4.0]
+    assert buffer.window(100)["lamda1"] == [0.0, 1.0, 2.0, 3.0, 4.0]
+
+
+def test_window_of_an_empty_buffer_is_empty():
+    buffer = SampleRingBuffer(4, channels=("lamda1", "lamda2"))
+
+    assert buffer.window(10)["timestamps"] == []
+
+
+def test_capacity_has_to_be_positive():
+    with pytest.raises(ValueError):
+        SampleRingBuffer(0)
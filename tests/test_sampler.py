@@ -0,0 +1,53 @@
+import pytest
+
+from mama.tasks.sampler import DeadlineSampler
+from tests.clock import FakeClock
+
+
+def test_samples_keep_absolute_deadlines_despite_the_read_time():
+    clock = FakeClock()
+    sampler = DeadlineSampler(0.01, clock=clock, sleep=clock.sleep)
+
+    times = []
+    for _ in range(5):
+        times.append(sampler.wait())
+        # Reading the sensor takes 3 ms
+        clock.now += 0.003
+
+    assert times == pytest.approx([100.0, 100.01, 100.02, 100.03, 100.04])
+    assert clock.sleeps == pytest.approx([0.007] * 4)
+
+
+def test_late_samples_catch_up_and_whole_missed_intervals_are_skipped():
+    clock = FakeClock()
+    sampler = DeadlineSampler(0.01, clock=clock, sleep=clock.sleep)
+    sampler.wait()
+
+    clock.now += 0.015
+    assert sampler.wait() == pytest.approx(100.015)
+    # The next deadline is still on the original schedule
+    assert sampler.next_deadline == pytest.approx(100.02)
+
+    clock.now += 0.05
+    sampler.wait()
+    stats = sampler.get_stats()
+    assert stats["late"] == 2
+    assert stats["skipped"] == 4
+    assert sampler.next_deadline == pytest.approx(100.07)
+
+
+def test_stats_report_the_effective_rate():
+    clock = FakeClock()
+    sampler = DeadlineSampler(0.1, clock=clock, sleep=clock.sleep)
+    for _ in range(11):
+        sampler.wait()
+
+    stats = sampler.get_stats()
+    assert stats["samples"] == 11
+    assert stats["effective_rate_hz"] == pytest.approx(10.0)
+    assert stats["jitter_max_ms"] == pytest.approx(0.0, abs=1e-6)
+
+
+def test_interval_has_to_be_positive():
+    with pytest.raises(ValueError):
+        DeadlineSampler(0)
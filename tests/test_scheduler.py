@@ -0,0 +1,54 @@
+import pytest
+
+from mama.config import ConfigSnapshot
+from mama.sensors.readings import channel_rates
+from mama.tasks.scheduler import ChannelScheduler
+from mama.tasks.scheduler import estimate_spi_load
+from tests.clock import FakeClock
+
+
+def run(scheduler: ChannelScheduler, seconds: float) -> dict[str, int]:
+    reads = {channel: 0 for channel in scheduler.rates}
+    end = scheduler.clock() + seconds
+    while due := scheduler.wait(until=end):
+        for channel in due:
+            reads[channel] += 1
+    return reads
+
+
+def test_every_channel_is_read_at_its_own_rate():
+    clock = FakeClock()
+    scheduler = ChannelScheduler({"lamda1": 100, "lamda2": 100, "temp1": 2}, clock=clock, sleep=clock.sleep)
+
+    reads = run(scheduler, 0.995)
+
+    assert reads == {"lamda1": 100, "lamda2": 100, "temp1": 2}
+    assert clock.now == pytest.approx(100.995)
+
+
+def test_channels_sharing_a_deadline_are_returned_together():
+    clock = FakeClock()
+    scheduler = ChannelScheduler({"lamda1": 10, "temp1": 5}, clock=clock, sleep=clock.sleep)
+
+    assert scheduler.wait() == ["lamda1", "temp1"]
+    assert scheduler.wait() == ["lamda1"]
+    assert scheduler.wait() == ["lamda1", "temp1"]
+
+
+def test_rates_have_to_be_positive():
+    with pytest.raises(ValueError):
+        ChannelScheduler({"lamda1": 0})
+
+
+def test_spi_load_estimate():
+    assert estimate_spi_load({"lamda1": 1000, "lamda2": 1000}) == pytest.approx(2000 * (24e-6 + 200e-6))
+
+
+def test_channel_rates_follow_the_intervals_and_overrides():
+    settings = ConfigSnapshot(0, {"MESSURE_INTERVAL": 0.01, "UPDATE_INTERVAL": 0.5, "CHANNEL_RATES": {"temp2": 10}})
+
+    assert channel_rates(settings) == {"lamda1": 100.0, "lamda2": 100.0, "temp1": 2.0, "temp2": 10.0}
+    with pytest.raises(ValueError):
+        channel_rates(ConfigSnapshot(0, {"MESSURE_INTERVAL": 0, "UPDATE_INTERVAL": 0.5, "CHANNEL_RATES": {}}))
+    with pytest.raises(ValueError):
+        channel_rates(ConfigSnapshot(0, {"MESSURE_INTERVAL": 0.01, "UPDATE_INTERVAL": 0.5, "CHANNEL_RATES": {"x": 1}}))
@@ -0,0 +1,57 @@
+from array import array
+
+from mama.tasks.scope import SCOPE_MAX_CLIENTS
+from mama.tasks.scope import SCOPE_MAX_IN_FLIGHT
+from mama.tasks.scope import SCOPE_QUEUE_FRAMES
+from mama.tasks.scope import ScopeStreamer
+
+
+class FakeSocketIO:
+    def __init__(self):
+        self.emitted = []
+
+    def emit(self, event, frame, to=None, callback=None):
+        self.emitted.append((to, callback))
+
+
+def window() -> dict:
+    return {"lamda1": (array("f", [0.0]), array("f", [2.5]), array("f", [1.0]))}
+
+
+def test_unacknowledged_frames_are_queued_and_the_client_is_decimated():
+    socketio = FakeSocketIO()
+    streamer = ScopeStreamer(socketio, clock=lambda: 0.0)
+    streamer.add_client("a")
+
+    for start in range(SCOPE_MAX_IN_FLIGHT + SCOPE_QUEUE_FRAMES + 1):
+        streamer.publish(start, window())
+
+    client = streamer.get_stats()["clients"]["a"]
+    assert len(socketio.emitted) == SCOPE_MAX_IN_FLIGHT
+    assert client["queued"] == SCOPE_QUEUE_FRAMES
+    assert client["dropped"] == 1
+    assert client["decimation"] == 2
+
+
+def test_acknowledgement_sends_the_next_queued_frame():
+    socketio = FakeSocketIO()
+    streamer = ScopeStreamer(socketio, clock=lambda: 0.0)
+    streamer.add_client("a")
+    for start in range(SCOPE_MAX_IN_FLIGHT + 1):
+        streamer.publish(start, window())
+
+    _, callback = socketio.emitted[0]
+    callback()
+
+    assert len(socketio.emitted) == SCOPE_MAX_IN_FLIGHT + 1
+    assert streamer.get_stats()["clients"]["a"]["queued"] == 0
+
+
+def test_number_of_scope_clients_is_limited():
+    streamer = ScopeStreamer(FakeSocketIO())
+    for client in range(SCOPE_MAX_CLIENTS):
+        assert streamer.add_client(str(client)) is not None
+
+    assert streamer.add_client("one too many") is None
+    streamer.remove_client("0")
+    assert streamer.add_client("one too many") is not None
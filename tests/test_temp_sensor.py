@@ -0,0 +1,10 @@
+from mama.sensors.temp_sensor import TypKTemperaturSensor
+
+
+def test_temperatures_are_truncated_to_whole_degrees():
+    sensor = TypKTemperaturSensor(0)
+
+    # Default curve 250 degrees per volt: 1.0038 V are 250.95 degrees
+    assert sensor.data_from_voltage(1.0038).temp == 250
+    # Raw value 3 is 3 / 1023 * 5 V, 3.67 degrees
+    assert [data.temp for data in sensor.data_from_codes([0, 3])] == [0, 3]
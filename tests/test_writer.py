@@ -0,0 +1,72 @@
+import sqlite3
+import threading
+
+import pytest
+
+from mama.models.writer import BufferedWriter
+
+
+@pytest.fixture
+def conn():
+    connection = sqlite3.connect(":memory:", check_same_thread=False)
+    connection.execute("CREATE TABLE values_table (sensorid INTEGER, value REAL)")
+    yield connection
+    connection.close()
+
+
+def rows(conn: sqlite3.Connection) -> list:
+    return conn.execute("SELECT sensorid, value FROM values_table ORDER BY rowid").fetchall()
+
+
+def test_rows_are_written_once_max_rows_are_queued(conn):
+    writer = BufferedWriter(conn, threading.RLock(), max_rows=3, max_delay=3600)
+
+    writer.add("values_table", (0, 1.0))
+    writer.add("values_table", (1, 2.0))
+    assert rows(conn) == []
+
+    writer.add("values_table", (0, 3.0))
+    assert rows(conn) == [(0, 1.0), (1, 2.0), (0, 3.0)]
+    assert writer.get_stats()["flushes"] == 1
+
+
+def test_failed_flush_requeues_the_rows(conn):
+    writer = BufferedWriter(conn, threading.RLock(), max_rows=100, max_delay=3600)
+    writer.add("values_table", (0, 1.0))
+    writer.add("missing_table", (0, 2.0))
+
+    with pytest.raises(sqlite3.Error):
+        writer.flush()
+    assert rows(conn) == []
+    assert writer.get_stats()["queue_depth"] == 2
+
+    conn.execute("CREATE TABLE missing_table (sensorid INTEGER, value REAL)")
+    writer.add("values_table", (1, 3.0))
+    writer.flush()
+
+    assert rows(conn) == [(0, 1.0), (1, 3.0)]
+    assert conn.execute("SELECT sensorid, value FROM missing_table").fetchall() == [(0, 2.0)]
+    assert writer.get_stats()["queue_depth"] == 0
+
+
+def test_flush_listener_runs_with_the_batches(conn):
+    writer = BufferedWriter(conn, threading.RLock(), max_rows=100, max_delay=3600)
+    seen = []
+    writer.add_flush_listener(lambda connection, batches: seen.append(dict(batches)))
+
+    writer.add("values_table", (0, 1.0))
+    writer.flush()
+    writer.flush()
+
+    assert seen == [{"values_table": [(0, 1.0)]}]
+
+
+def test_flush_if_due_waits_for_max_delay(conn):
+    writer = BufferedWriter(conn, threading.RLock(), max_rows=100, max_delay=3600)
+    writer.add("values_table", (0, 1.0))
+    assert not writer.flush_if_due()
+
+    writer.max_delay = 0
+    assert writer.flush_if_due()
+    assert rows(conn) == [(0, 1.0)]
+    assert not writer.flush_if_due()